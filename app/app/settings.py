@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -83,11 +84,28 @@ WSGI_APPLICATION = 'app.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.db.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        # Keep connections open for later requests for this many seconds.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        # Check a kept connection works before a request reuses it.
+        'CONN_HEALTH_CHECKS': True,
+        # Hand out connections from an in-process pool instead, returned
+        # to it at the end of each request.
+        'POOL': {
+            'ENABLED': os.environ.get('DB_POOL', '') == '1',
+            'MIN_SIZE': int(os.environ.get('DB_POOL_MIN_SIZE', 0)),
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            # Seconds to wait for a connection when all are in use.
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+            'MAX_IDLE': 300,
+            'MAX_LIFETIME': 3600,
+            # Idle seconds after which a connection is checked before use.
+            'CHECK_AFTER': 30,
+        },
     }
 }
 
@@ -114,6 +132,31 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+PASSWORD_HASHING = {
+    # 'argon2' or 'bcrypt' for new hashes. Hashes of the other hashers
+    # below still verify and are rehashed on the next login.
+    'HASHER': os.environ.get('PASSWORD_HASHER', 'argon2'),
+    # Tune with the benchmark_hashers command.
+    'ARGON2': {
+        'TIME_COST': int(os.environ.get('ARGON2_TIME_COST', 2)),
+        # KiB.
+        'MEMORY_COST': int(os.environ.get('ARGON2_MEMORY_COST', 19456)),
+        'PARALLELISM': int(os.environ.get('ARGON2_PARALLELISM', 1)),
+    },
+    'BCRYPT_ROUNDS': int(os.environ.get('BCRYPT_ROUNDS', 12)),
+}
+
+_HASHERS = {
+    'argon2': 'core.hashers.Argon2PasswordHasher',
+    'bcrypt': 'core.hashers.BCryptSHA256PasswordHasher',
+}
+PASSWORD_HASHERS = [
+    _HASHERS.pop(PASSWORD_HASHING['HASHER']),
+    *_HASHERS.values(),
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
@@ -146,7 +189,137 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema'
+    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'core.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.ORJSONParser',
+        'core.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'TEST_REQUEST_RENDERER_CLASSES': [
+        'rest_framework.renderers.MultiPartRenderer',
+        'core.renderers.ORJSONRenderer',
+        'core.renderers.MessagePackRenderer',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        # Token requests, counted before credentials are checked.
+        'login_ip': os.environ.get('LOGIN_RATE_IP', '60/min'),
+        'login_email': os.environ.get('LOGIN_RATE_EMAIL', '10/min'),
+    },
+    # Reverse proxies in front of the app. Throttles take the client
+    # address from X-Forwarded-For only as far as these appended it,
+    # with 0 it is REMOTE_ADDR and the header, set by clients, is unused.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+}
+
+# Cache shared by every worker process. Without REDIS_URL each process
+# has its own in-memory cache, which the response cache and token cache
+# invalidation can't rely on.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': int(os.environ.get('TOKEN_AUTH_CACHE_SIZE', 10000)),
+    'TTL': int(os.environ.get('TOKEN_AUTH_CACHE_TTL', 60)),
+    # Cache alias shared by the processes. Without it a deleted token or
+    # deactivated user stays accepted by other processes for up to TTL.
+    'SHARED_CACHE': os.environ.get(
+        'TOKEN_AUTH_SHARED_CACHE', 'default' if REDIS_URL else None),
+}
+
+RECIPE_RESPONSE_CACHE = {
+    # Off with per process caches, a write would only reach its own.
+    'ENABLED': os.environ.get(
+        'RECIPE_RESPONSE_CACHE_ENABLED', '1' if REDIS_URL else '') == '1',
+    'CACHE': os.environ.get('RECIPE_RESPONSE_CACHE', 'default'),
+    'TIMEOUT': int(os.environ.get('RECIPE_RESPONSE_CACHE_TIMEOUT', 300)),
+}
+
+RECIPE_TYPEAHEAD = {
+    # 'auto' uses pg_trgm when installed and the in-process index otherwise.
+    'BACKEND': os.environ.get('RECIPE_TYPEAHEAD_BACKEND', 'auto'),
+    'LIMIT': 10,
+    'MAX_LIMIT': 50,
+    'SIMILARITY': 0.3,
+    'INDEX_USERS': int(os.environ.get('RECIPE_TYPEAHEAD_INDEX_USERS', 1000)),
+    # Reuse in-process indexes on the response cache's change marker only
+    # when the processes share it, otherwise check the names every time.
+    'SHARED_VERSION': bool(REDIS_URL),
+}
+
+RECIPE_IMAGES = {
+    # 'sync', 'memory' (threads and a process pool in the web process) or
+    # 'database' (jobs run by the process_images command).
+    'BACKEND': os.environ.get('RECIPE_IMAGE_BACKEND', 'memory'),
+    'WORKERS': int(os.environ.get('RECIPE_IMAGE_WORKERS', 2)),
+    'SIZES': {'thumbnail': 200, 'medium': 800},
+    'QUALITY': 85,
+    'WEBP': True,
+    'MAX_ATTEMPTS': 3,
+    'LOCK_TIMEOUT': 300,
+    # Checked while the upload streams in.
+    'MAX_UPLOAD_SIZE': int(
+        os.environ.get('RECIPE_IMAGE_MAX_UPLOAD_SIZE', 10 * 1024 * 1024)),
+    'MAX_DIMENSION': 10000,
+    'MAX_PIXELS': 40_000_000,
+    'MAX_HEADER_SIZE': 256 * 1024,
+}
+
+# Build recipe lists from .values() rows with a reader compiled from
+# RecipeSerializer instead of serializing model instances.
+RECIPE_FAST_LIST = os.environ.get('RECIPE_FAST_LIST', '') == '1'
+
+RECIPE_EXPORT = {
+    # Recipes fetched from the server side cursor and written at a time.
+    'CHUNK_SIZE': int(os.environ.get('RECIPE_EXPORT_CHUNK_SIZE', 2000)),
+}
+
+RECIPE_IMPORT = {
+    # Records validated and written per transaction and checkpoint.
+    'BATCH_SIZE': int(os.environ.get('RECIPE_IMPORT_BATCH_SIZE', 1000)),
+    # Failed records kept with their errors on the import.
+    'MAX_ERRORS': 100,
+    # Seconds without a batch written after which a running import is
+    # taken for dead and can be resumed by another process.
+    'STALE_AFTER': 600,
+}
+
+PERF_INSTRUMENTATION = {
+    'ENABLED': os.environ.get('PERF_INSTRUMENTATION', '1') == '1',
+    # Share of requests measured, the rest only pay for a random().
+    'SAMPLE_RATE': float(os.environ.get('PERF_SAMPLE_RATE', 0.01)),
+    'SERVER_TIMING': True,
+    # Times one statement may run in a request before it is flagged.
+    'N_PLUS_ONE_THRESHOLD': 5,
+    # Bearer token for scraping /api/metrics/. Without it only staff
+    # sessions can read the metrics.
+    'METRICS_TOKEN': os.environ.get('METRICS_TOKEN'),
+}
+
+MEDIA_SERVING = {
+    # '' streams files from Django, 'x-accel-redirect' (nginx) or
+    # 'x-sendfile' (Apache, lighttpd) hand the transfer to the proxy.
+    'SENDFILE': os.environ.get('MEDIA_SENDFILE', ''),
+    # nginx internal location aliased to MEDIA_ROOT.
+    'ACCEL_PREFIX': os.environ.get('MEDIA_ACCEL_PREFIX', '/protected-media/'),
+    'MAX_AGE': 365 * 24 * 60 * 60,
 }
 
 SPECTACULAR_SETTINGS = {
@@ -1,6 +1,34 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from rest_framework.authtoken.models import Token
+
+        from core.authentication import (
+            invalidate_token,
+            invalidate_user_tokens,
+        )
+        from core.instrumentation import install_query_recorder
+        from core.models import Recipe
+        from core.storage import (
+            count_image_references,
+            release_image,
+            remember_image,
+        )
+
+        post_delete.connect(invalidate_token, sender=Token)
+        post_save.connect(
+            invalidate_user_tokens, sender=settings.AUTH_USER_MODEL)
+
+        connection_created.connect(install_query_recorder)
+
+        pre_save.connect(remember_image, sender=Recipe)
+        post_save.connect(count_image_references, sender=Recipe)
+        post_delete.connect(release_image, sender=Recipe)
@@ -0,0 +1,173 @@
+"""Authentication for the APIs."""
+
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class TokenCache:
+    """Bounded LRU of resolved tokens with an optional shared cache tier.
+
+    Entries live for `ttl` seconds in both tiers. The shared tier is any
+    Django cache alias and lets processes reuse each other's lookups. It
+    also holds a version per token, bumped on invalidation, that entries
+    are checked against, so an invalidation reaches every process.
+    Without it other processes keep their entries for up to `ttl`.
+    """
+
+    def __init__(self, max_size=None, ttl=None, shared_cache=None):
+        options = getattr(settings, 'TOKEN_AUTH_CACHE', {})
+        self.max_size = max_size or options.get('MAX_SIZE', 10000)
+        self.ttl = ttl or options.get('TTL', 60)
+        self.shared_cache = shared_cache or options.get('SHARED_CACHE')
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.shared_cache] if self.shared_cache else None
+
+    def _cache_key(self, key):
+        """Return the cache key for a token without exposing the token."""
+        return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    def _version(self, cache_key):
+        if self.shared is None:
+            return None
+        return self.shared.get(f'{cache_key}:version', 0)
+
+    def version(self, key):
+        """Return the version to cache a token's lookup under.
+
+        Read it before looking the token up, an invalidation in between
+        then makes the entry stale instead of caching the old state.
+        """
+        return self._version(self._cache_key(key))
+
+    def _store_local(self, cache_key, value):
+        with self._lock:
+            self._entries[cache_key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _get_entry(self, cache_key):
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(cache_key)
+                    return value
+                del self._entries[cache_key]
+
+        if self.shared is not None:
+            value = self.shared.get(cache_key)
+            if value is not None:
+                self._store_local(cache_key, value)
+                return value
+        return None
+
+    def get(self, key):
+        """Return a copy of the cached (user, token) pair for a token key.
+
+        Requests get their own instances, views may change them.
+        """
+        cache_key = self._cache_key(key)
+        entry = self._get_entry(cache_key)
+        if entry is None:
+            return None
+        if self.shared is not None and self._version(cache_key) != entry[2]:
+            with self._lock:
+                self._entries.pop(cache_key, None)
+            return None
+        user, token, _ = entry
+        user = copy.copy(user)
+        token = copy.copy(token)
+        token.user = user
+        return user, token
+
+    def set(self, key, value, version=None):
+        """Cache a (user, token) pair for a token key.
+
+        `version` is what version() returned before the lookup.
+        """
+        user, token = value
+        cache_key = self._cache_key(key)
+        if version is None:
+            version = self._version(cache_key)
+        entry = (copy.copy(user), copy.copy(token), version)
+        self._store_local(cache_key, entry)
+        if self.shared is not None:
+            self.shared.set(cache_key, entry, self.ttl)
+
+    def _bump(self, cache_keys):
+        for cache_key in cache_keys:
+            version_key = f'{cache_key}:version'
+            self.shared.add(version_key, 0, None)
+            try:
+                self.shared.incr(version_key)
+            except ValueError:
+                # Evicted since the add, a fresh version is as good.
+                self.shared.set(version_key, 1, None)
+
+    def delete(self, keys):
+        """Drop the entries of the given token keys in every process.
+
+        Versions move now and again after the transaction commits, so
+        lookups that read the data before the commit are not kept.
+        """
+        cache_keys = [self._cache_key(key) for key in keys]
+        with self._lock:
+            for cache_key in cache_keys:
+                self._entries.pop(cache_key, None)
+        if self.shared is not None and cache_keys:
+            self.shared.delete_many(cache_keys)
+            self._bump(cache_keys)
+            transaction.on_commit(partial(self._bump, cache_keys))
+
+    def delete_user(self, user):
+        """Drop every entry that belongs to a user, in every process."""
+        self.delete(list(Token.objects.filter(
+            user_id=user.pk).values_list('key', flat=True)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that caches resolved tokens."""
+    cache = token_cache
+
+    def authenticate_credentials(self, key):
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        version = self.cache.version(key)
+        user, token = super().authenticate_credentials(key)
+        self.cache.set(key, (user, token), version)
+        return user, token
+
+
+def invalidate_token(sender, instance, **kwargs):
+    """Drop a deleted token from the cache."""
+    token_cache.delete([instance.key])
+
+
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """Drop cached tokens of a user that changed or was deactivated."""
+    if not created:
+        token_cache.delete_user(instance)
@@ -0,0 +1,139 @@
+"""PostgreSQL backend with connection health checks and pooling.
+
+CONN_HEALTH_CHECKS checks a connection kept by CONN_MAX_AGE works before
+the first query of a request reuses it. With POOL['ENABLED'] connections
+come from an in-process pool instead and go back to it at the end of
+each request.
+"""
+
+import time
+from functools import partial
+
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions, extras
+
+from core.db.pool import ConnectionPool, PoolTimeout, close_pools, get_pool
+
+Database = base.Database
+
+
+def _open(conn_params, options):
+    """Open a connection set up like the stock backend does."""
+    connection = Database.connect(**conn_params)
+    isolation_level = options.get('isolation_level')
+    if (isolation_level is not None
+            and isolation_level != connection.isolation_level):
+        connection.set_session(isolation_level=isolation_level)
+    extras.register_default_jsonb(
+        conn_or_curs=connection, loads=lambda x: x)
+    return connection
+
+
+def _ping(connection):
+    """Return whether a connection answers a trivial query."""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        connection.rollback()
+    except Database.Error:
+        return False
+    return True
+
+
+def pool_label(alias, database):
+    return f'{alias}/{database}'
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Pooled connections would keep the test database in use.
+        close_pools(pool_label(self.connection.alias, test_database_name))
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+        self.pool = None
+
+    def get_pool(self, conn_params):
+        """Return the pool of the database, None when pooling is off."""
+        options = self.settings_dict.get('POOL') or {}
+        if not options.get('ENABLED') or self.alias == NO_DB_ALIAS:
+            return None
+        label = pool_label(self.alias, conn_params['database'])
+        key = (label, tuple(sorted(conn_params.items())))
+        return get_pool(key, partial(
+            ConnectionPool,
+            connect=partial(_open, conn_params, self.settings_dict['OPTIONS']),
+            check=_ping,
+            label=label,
+            min_size=options.get('MIN_SIZE', 0),
+            max_size=options.get('MAX_SIZE', 10),
+            timeout=options.get('TIMEOUT', 5),
+            max_idle=options.get('MAX_IDLE', 300),
+            max_lifetime=options.get('MAX_LIFETIME', 3600),
+            check_after=options.get('CHECK_AFTER', 30),
+        ))
+
+    def get_new_connection(self, conn_params):
+        # A new connection needs no check, connect() runs queries on it.
+        self.health_check_done = True
+        pool = self.get_pool(conn_params)
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        try:
+            connection = pool.acquire()
+        except PoolTimeout as e:
+            raise Database.OperationalError(str(e)) from e
+        self.pool = pool
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level)
+        return connection
+
+    def connect(self):
+        super().connect()
+        if self.pool is not None:
+            # Give the connection back when the request finishes.
+            self.close_at = time.monotonic()
+
+    def _close(self):
+        pool, self.pool = self.pool, None
+        if self.connection is None or pool is None:
+            return super()._close()
+        connection = self.connection
+        # A connection closed inside atomic() stays referenced by this
+        # wrapper until the block exits, so it can't be handed out again.
+        discard = bool(self.errors_occurred or connection.closed
+                       or self.in_atomic_block)
+        if (not discard and connection.info.transaction_status
+                != extensions.TRANSACTION_STATUS_IDLE):
+            try:
+                connection.rollback()
+            except Database.Error:
+                discard = True
+        pool.release(connection, discard=discard)
+
+    def close_if_health_check_failed(self):
+        """Close a reused connection that no longer works."""
+        if (self.connection is None or self.health_check_done
+                or not self.settings_dict.get('CONN_HEALTH_CHECKS')
+                or self.in_atomic_block):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def ensure_connection(self):
+        self.close_if_health_check_failed()
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # Check the kept connection again before the next request uses it.
+        self.health_check_done = False
@@ -0,0 +1,222 @@
+"""In-process pool of database connections."""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+
+logger = logging.getLogger(__name__)
+
+_pools = {}
+_pools_lock = threading.Lock()
+_close_registered = False
+
+
+class PoolTimeout(Exception):
+    """No connection was returned to the pool within the timeout."""
+
+
+class ConnectionPool:
+    """Bounded, thread safe pool of DB-API connections.
+
+    `connect` opens a new connection and `check` tells whether an idle
+    connection still works. Idle connections are handed out newest
+    first so the rest can age out after `max_idle` seconds, and only
+    connections idle for `check_after` seconds are checked. Callers
+    wait up to `timeout` seconds for a connection when `max_size` are
+    in use.
+    """
+
+    def __init__(self, connect, check=None, label='', min_size=0,
+                 max_size=10, timeout=5.0, max_idle=300, max_lifetime=3600,
+                 check_after=30):
+        self.connect = connect
+        self.check = check
+        self.label = label
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self.pid = os.getpid()
+        self.closed = False
+        self.metrics = Counter()
+        self._idle = deque()
+        self._opened_at = {}
+        self._size = 0
+        self._condition = threading.Condition()
+
+    def _reserve(self, deadline):
+        """Return an idle (released_at, connection), or None to open one."""
+        with self._condition:
+            waited = False
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.metrics['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'No connection free in pool {self.label} after '
+                        f'{self.timeout} seconds.')
+                if not waited:
+                    self.metrics['waits'] += 1
+                    waited = True
+                self._condition.wait(remaining)
+
+    def _open(self):
+        try:
+            connection = self.connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        self._opened_at[id(connection)] = time.monotonic()
+        self.metrics['opened'] += 1
+        return connection
+
+    def _usable(self, connection, released_at):
+        now = time.monotonic()
+        opened_at = self._opened_at.get(id(connection), now)
+        if (now - released_at > self.max_idle
+                or now - opened_at > self.max_lifetime):
+            return False
+        if self.check is None or now - released_at < self.check_after:
+            return True
+        if self.check(connection):
+            return True
+        self.metrics['failed_checks'] += 1
+        return False
+
+    def acquire(self):
+        """Return a connection, waiting for one when all are in use."""
+        started = time.monotonic()
+        while True:
+            entry = self._reserve(started + self.timeout)
+            if entry is None:
+                connection = self._open()
+                break
+            released_at, connection = entry
+            if self._usable(connection, released_at):
+                self.metrics['reused'] += 1
+                break
+            self._discard(connection)
+        self.metrics['acquired'] += 1
+        self.metrics['wait_seconds'] += time.monotonic() - started
+        return connection
+
+    def release(self, connection, discard=False):
+        """Return a connection to the pool, or close it when discard."""
+        if discard or self.closed:
+            self._discard(connection)
+            return
+        with self._condition:
+            self._idle.append((time.monotonic(), connection))
+            self._condition.notify()
+
+    def _discard(self, connection):
+        self._opened_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            logger.warning('Closing a pooled connection failed.',
+                           exc_info=True)
+        self.metrics['closed'] += 1
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def fill(self):
+        """Open connections until min_size are idle or in use."""
+        while self.size < self.min_size:
+            with self._condition:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            self.release(self._open())
+
+    def close(self):
+        """Close the idle connections, in use ones are closed on release."""
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+            self.closed = True
+        for _, connection in idle:
+            self._discard(connection)
+
+    @property
+    def size(self):
+        return self._size
+
+    def stats(self):
+        """Return the counters and current sizes of the pool."""
+        with self._condition:
+            idle = len(self._idle)
+            return {
+                **self.metrics,
+                'label': self.label,
+                'size': self._size,
+                'idle': idle,
+                'in_use': self._size - idle,
+                'max_size': self.max_size,
+            }
+
+
+def get_pool(key, factory):
+    """Return the pool for key, made by factory on first use.
+
+    A forked process gets pools of its own, connections opened by the
+    parent are left to it.
+    """
+    global _close_registered
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[key] = factory()
+            if not _close_registered:
+                atexit.register(close_pools)
+                _close_registered = True
+        return pool
+
+
+def close_pools(label=None):
+    """Close the pools, or only those of a database label."""
+    with _pools_lock:
+        pools = [
+            (key, pool) for key, pool in _pools.items()
+            if label is None or pool.label == label
+        ]
+        for key, _ in pools:
+            del _pools[key]
+    for _, pool in pools:
+        if pool.pid == os.getpid():
+            pool.close()
+
+
+def open_pools():
+    """Fill the pools of all configured databases to their minimum size.
+
+    Called by app/wsgi.py and app/asgi.py once the application is set up.
+    """
+    from django.db import connections
+
+    for alias in connections:
+        connection = connections[alias]
+        if hasattr(connection, 'get_pool'):
+            pool = connection.get_pool(connection.get_connection_params())
+            if pool is not None:
+                pool.fill()
+
+
+def stats():
+    """Return the stats of every pool of this process."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools if pool.pid == os.getpid()]
@@ -0,0 +1,38 @@
+"""Password hashers with their costs taken from settings.
+
+Django rehashes a password on the next successful login when its hash
+was made with another algorithm or with other costs, so changing
+PASSWORD_HASHING upgrades stored hashes as users log in.
+"""
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+def _options():
+    return getattr(settings, 'PASSWORD_HASHING', {})
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2id with the costs of PASSWORD_HASHING['ARGON2']."""
+
+    @property
+    def time_cost(self):
+        return _options().get('ARGON2', {}).get('TIME_COST', 2)
+
+    @property
+    def memory_cost(self):
+        """Memory in KiB."""
+        return _options().get('ARGON2', {}).get('MEMORY_COST', 19456)
+
+    @property
+    def parallelism(self):
+        return _options().get('ARGON2', {}).get('PARALLELISM', 1)
+
+
+class BCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+    """bcrypt with PASSWORD_HASHING['BCRYPT_ROUNDS'] rounds."""
+
+    @property
+    def rounds(self):
+        return _options().get('BCRYPT_ROUNDS', 12)
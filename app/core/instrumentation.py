@@ -0,0 +1,230 @@
+"""Per request performance measurements and their Prometheus export
+
+The middleware in core.middleware starts a RequestMetrics for sampled
+requests. Database queries, serializer.data and rendering add to the
+metrics of the current request, found through a context variable, so
+the hooks cost one lookup on requests that are not sampled.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Share of requests measured when SAMPLE_RATE is not set.
+DEFAULT_SAMPLE_RATE = 0.01
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+_current = ContextVar('request_metrics', default=None)
+_numbers = re.compile(r'\b\d+\b')
+
+
+def options():
+    return getattr(settings, 'PERF_INSTRUMENTATION', {})
+
+
+class RequestMetrics:
+    """Measurements of one request, only updated by its own thread."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view = ''
+        self.action = ''
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.spans = Counter()
+        self.statements = Counter()
+
+    def add_query(self, sql, seconds):
+        self.queries += 1
+        self.db_seconds += seconds
+        self.statements[_numbers.sub('?', sql)] += 1
+
+    def add_span(self, name, seconds):
+        self.spans[name] += seconds
+
+    def repeated_statement(self):
+        """Return the most repeated statement and its count."""
+        if not self.statements:
+            return None, 0
+        return self.statements.most_common(1)[0]
+
+
+def current():
+    """Return the metrics of the running request, None when unsampled."""
+    return _current.get()
+
+
+def start():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+@contextmanager
+def span(name):
+    """Time a block as part of the request, minus its database time."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    db_before = metrics.db_seconds
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.add_span(name, elapsed - (metrics.db_seconds - db_before))
+
+
+def record_query(execute, sql, params, many, context):
+    """Connection execute wrapper timing queries of sampled requests."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, time.perf_counter() - started)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """Signal receiver adding the query recorder to new connections."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedDataMixin:
+    """Serializer mixin timing serializer.data as the serialize span."""
+
+    @property
+    def data(self):
+        with span('serialize'):
+            return super().data
+
+
+class Registry:
+    """Aggregated request metrics per view and action of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._requests = defaultdict(lambda: {
+                'buckets': [0] * len(BUCKETS),
+                'count': 0,
+                'seconds': 0.0,
+                'queries': 0,
+                'db_seconds': 0.0,
+                'serialize_seconds': 0.0,
+                'render_seconds': 0.0,
+                'response_bytes': 0,
+                'n_plus_one': 0,
+            })
+
+    def observe(self, metrics, seconds, response_bytes, n_plus_one):
+        with self._lock:
+            entry = self._requests[(metrics.view, metrics.action)]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    entry['buckets'][i] += 1
+            entry['count'] += 1
+            entry['seconds'] += seconds
+            entry['queries'] += metrics.queries
+            entry['db_seconds'] += metrics.db_seconds
+            entry['serialize_seconds'] += metrics.spans['serialize']
+            entry['render_seconds'] += metrics.spans['render']
+            entry['response_bytes'] += response_bytes
+            entry['n_plus_one'] += n_plus_one
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                key: {**entry, 'buckets': list(entry['buckets'])}
+                for key, entry in self._requests.items()
+            }
+
+
+registry = Registry()
+
+COUNTERS = (
+    ('queries', 'app_request_db_queries_total',
+     'Database queries run by requests.'),
+    ('db_seconds', 'app_request_db_seconds_total',
+     'Seconds requests spent in database queries.'),
+    ('serialize_seconds', 'app_request_serialize_seconds_total',
+     'Seconds requests spent serializing, without database time.'),
+    ('render_seconds', 'app_request_render_seconds_total',
+     'Seconds requests spent rendering responses.'),
+    ('response_bytes', 'app_request_response_bytes_total',
+     'Bytes of response bodies.'),
+    ('n_plus_one', 'app_request_n_plus_one_total',
+     'Requests repeating a query per result.'),
+)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _labels(key, **extra):
+    view, action = key
+    pairs = {'view': view, 'action': action, **extra}
+    return ','.join(f'{name}="{_escape(str(value))}"'
+                    for name, value in pairs.items())
+
+
+def prometheus_text(pool_stats=()):
+    """Return the metrics in the Prometheus text exposition format."""
+    snapshot = sorted(registry.snapshot().items())
+    lines = [
+        '# HELP app_request_duration_seconds Wall time of requests.',
+        '# TYPE app_request_duration_seconds histogram',
+    ]
+    for key, entry in snapshot:
+        for bound, count in zip(BUCKETS, entry['buckets']):
+            lines.append(f'app_request_duration_seconds_bucket'
+                         f'{{{_labels(key, le=bound)}}} {count}')
+        lines.append(f'app_request_duration_seconds_bucket'
+                     f'{{{_labels(key, le="+Inf")}}} {entry["count"]}')
+        lines.append(f'app_request_duration_seconds_sum'
+                     f'{{{_labels(key)}}} {entry["seconds"]}')
+        lines.append(f'app_request_duration_seconds_count'
+                     f'{{{_labels(key)}}} {entry["count"]}')
+    for field, name, help_text in COUNTERS:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for key, entry in snapshot:
+            lines.append(f'{name}{{{_labels(key)}}} {entry[field]}')
+
+    lines.append('# HELP app_request_sample_rate Share of requests measured.')
+    lines.append('# TYPE app_request_sample_rate gauge')
+    rate = options().get('SAMPLE_RATE', DEFAULT_SAMPLE_RATE)
+    lines.append(f'app_request_sample_rate {rate}')
+
+    lines.append('# HELP app_db_pool_connections Pooled connections.')
+    lines.append('# TYPE app_db_pool_connections gauge')
+    for stats in pool_stats:
+        for state in ('idle', 'in_use'):
+            lines.append(f'app_db_pool_connections{{pool="{stats["label"]}",'
+                         f'state="{state}"}} {stats[state]}')
+    lines.append('# HELP app_db_pool_events_total Pool events.')
+    lines.append('# TYPE app_db_pool_events_total counter')
+    for stats in pool_stats:
+        for event in ('opened', 'closed', 'reused', 'waits', 'timeouts',
+                      'failed_checks'):
+            lines.append(f'app_db_pool_events_total{{pool="{stats["label"]}",'
+                         f'event="{event}"}} {stats.get(event, 0)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,71 @@
+"""Django command to compare single and bulk recipe writes."""
+
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from recipe.views import RecipeViewSet
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the bulk recipe endpoint."""
+    help = 'Compare recipe create throughput of single and bulk requests.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--tags', type=int, default=5)
+
+    def _payload(self, index, tags):
+        return {
+            'title': f'Benchmark recipe {index}',
+            'time_minutes': 10,
+            'price': '5.00',
+            'tags': [{'name': f'Tag {i}'} for i in range(tags)],
+            'ingradient': [{'name': f'Ingredient {i}'} for i in range(tags)],
+        }
+
+    def _post(self, view, data, token):
+        request = self.factory.post(
+            '/', data, format='json',
+            HTTP_AUTHORIZATION=f'Token {token.key}')
+        response = view(request)
+        assert response.status_code in (200, 201), response.data
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        count = options['count']
+        batch_size = options['batch_size']
+        payloads = [
+            self._payload(index, options['tags']) for index in range(count)]
+        self.factory = APIRequestFactory()
+        create = RecipeViewSet.as_view({'post': 'create'})
+        bulk = RecipeViewSet.as_view({'post': 'bulk'})
+
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                email=f'benchmark-{uuid.uuid4()}@example.com')
+            token = Token.objects.create(user=user)
+
+            start = time.perf_counter()
+            for payload in payloads:
+                self._post(create, payload, token)
+            single = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for index in range(0, count, batch_size):
+                self._post(bulk, payloads[index:index + batch_size], token)
+            batched = time.perf_counter() - start
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'single: {count / single:.1f} recipes/s')
+        self.stdout.write(
+            f'bulk (batch of {batch_size}): {count / batched:.1f} recipes/s')
+        self.stdout.write(self.style.SUCCESS(
+            f'Speedup: {single / batched:.1f}x'))
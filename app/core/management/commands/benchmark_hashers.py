@@ -0,0 +1,95 @@
+"""Django command to tune the costs of the password hashers."""
+
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from core.hashers import Argon2PasswordHasher, BCryptSHA256PasswordHasher
+
+PASSWORD = 'benchmark-password-123'
+
+
+class Command(BaseCommand):
+    """Django command to time password hashing at several costs."""
+    help = ('Time a password hash at several costs and recommend the '
+            'strongest within a target.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target-ms', type=float, default=100,
+            help='Longest acceptable hash of one login, in milliseconds.')
+        parser.add_argument('--runs', type=int, default=3)
+        parser.add_argument('--time-costs', type=int, nargs='+',
+                            default=[1, 2, 3, 4])
+        parser.add_argument('--memory-costs', type=int, nargs='+',
+                            default=[19456, 47104, 65536],
+                            help='Argon2 memory costs, in KiB.')
+        parser.add_argument('--parallelism', type=int, default=1)
+        parser.add_argument('--bcrypt-rounds', type=int, nargs='+',
+                            default=[10, 11, 12, 13])
+
+    def _time(self, hasher, runs):
+        timings = []
+        for _ in range(runs):
+            salt = hasher.salt()
+            start = time.perf_counter()
+            hasher.encode(PASSWORD, salt)
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def _report(self, label, median, target):
+        mark = '' if median <= target else '  over target'
+        self.stdout.write(f'  {label:<32} {median:9.2f} ms{mark}')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        target, runs = options['target_ms'], options['runs']
+        hashing = getattr(settings, 'PASSWORD_HASHING', {})
+
+        self.stdout.write(self.style.SUCCESS('argon2'))
+        fits = []
+        for memory_cost in options['memory_costs']:
+            for time_cost in options['time_costs']:
+                costs = {
+                    'TIME_COST': time_cost,
+                    'MEMORY_COST': memory_cost,
+                    'PARALLELISM': options['parallelism'],
+                }
+                with override_settings(
+                        PASSWORD_HASHING={**hashing, 'ARGON2': costs}):
+                    median = self._time(Argon2PasswordHasher(), runs)
+                self._report(f't={time_cost} m={memory_cost}KiB '
+                             f'p={options["parallelism"]}', median, target)
+                if median <= target:
+                    fits.append((time_cost * memory_cost, costs))
+
+        self.stdout.write(self.style.SUCCESS('bcrypt'))
+        best_rounds = None
+        for rounds in options['bcrypt_rounds']:
+            with override_settings(
+                    PASSWORD_HASHING={**hashing, 'BCRYPT_ROUNDS': rounds}):
+                median = self._time(BCryptSHA256PasswordHasher(), runs)
+            self._report(f'rounds={rounds}', median, target)
+            if median <= target:
+                best_rounds = max(best_rounds or rounds, rounds)
+
+        self.stdout.write(self.style.SUCCESS('pbkdf2 (previous default)'))
+        hasher = PBKDF2PasswordHasher()
+        self._report(f'iterations={hasher.iterations}',
+                     self._time(hasher, runs), target)
+
+        self.stdout.write(self.style.SUCCESS(f'Within {target:g} ms'))
+        if fits:
+            costs = max(fits, key=lambda fit: fit[0])[1]
+            self.stdout.write(
+                f'  ARGON2_TIME_COST={costs["TIME_COST"]} '
+                f'ARGON2_MEMORY_COST={costs["MEMORY_COST"]} '
+                f'ARGON2_PARALLELISM={costs["PARALLELISM"]}')
+        if best_rounds is not None:
+            self.stdout.write(f'  BCRYPT_ROUNDS={best_rounds}')
+        if not fits and best_rounds is None:
+            self.stdout.write('  No setting tried is fast enough.')
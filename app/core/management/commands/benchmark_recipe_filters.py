@@ -0,0 +1,95 @@
+"""Django command to benchmark recipe tag filtering."""
+
+import random
+import statistics
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.models import Recipe, Tags
+from recipe.filters import MATCH_ALL, MATCH_ANY, filter_by_related
+from recipe.serializers import bulk_create_recipes
+
+
+class Command(BaseCommand):
+    """Django command to compare join and EXISTS based tag filters."""
+    help = 'Seed recipes in a rolled back transaction and time tag filters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000000)
+        parser.add_argument('--tags', type=int, default=100)
+        parser.add_argument('--tags-per-recipe', type=int, default=3)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--runs', type=int, default=5)
+
+    def _seed(self, user, options):
+        Tags.objects.bulk_create([
+            Tags(user=user, name=f'Tag {i}') for i in range(options['tags'])
+        ])
+        tag_ids = [tag.id for tag in Tags.objects.filter(user=user)]
+        through = Recipe.tags.through
+        rng = random.Random(0)
+        for start in range(0, options['recipes'], options['batch_size']):
+            size = min(options['batch_size'], options['recipes'] - start)
+            recipes = [
+                Recipe(user=user, title=f'Recipe {start + i}',
+                       time_minutes=10, price=Decimal('5.00'))
+                for i in range(size)
+            ]
+            bulk_create_recipes(recipes)
+            # Skew the distribution so low tag ids are common.
+            through.objects.bulk_create([
+                through(recipe_id=recipe.id, tags_id=tag_id)
+                for recipe in recipes
+                for tag_id in set(rng.choices(
+                    tag_ids, weights=range(len(tag_ids), 0, -1),
+                    k=options['tags_per_recipe']))
+            ])
+            self.stdout.write(f'Seeded {start + size} recipes', ending='\r')
+        self.stdout.write('')
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE core_recipe, core_recipe_tags')
+        return tag_ids
+
+    def _time(self, queryset, runs):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            list(queryset.values_list('id', flat=True)[:100])
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                email=f'benchmark-{uuid.uuid4()}@example.com')
+            tag_ids = self._seed(user, options)
+            recipes = Recipe.objects.filter(user=user).order_by('-id')
+            cases = {
+                'common tags': tag_ids[:2],
+                'rare tags': tag_ids[-2:],
+            }
+            for label, ids in cases.items():
+                joined = recipes.filter(tags__id__in=ids).distinct()
+                joined_all = recipes
+                for tag_id in ids:
+                    joined_all = joined_all.filter(tags__id=tag_id)
+                queries = {
+                    'join + distinct (any)': joined,
+                    'exists (any)': filter_by_related(
+                        recipes, 'tags', ids, MATCH_ANY),
+                    'join per tag + distinct (all)': joined_all.distinct(),
+                    'exists (all)': filter_by_related(
+                        recipes, 'tags', ids, MATCH_ALL),
+                }
+                self.stdout.write(self.style.SUCCESS(label))
+                for name, queryset in queries.items():
+                    median = self._time(queryset, options['runs'])
+                    self.stdout.write(f'  {name:<32} {median:9.2f} ms')
+            transaction.set_rollback(True)
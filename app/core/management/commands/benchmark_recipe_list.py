@@ -0,0 +1,112 @@
+"""Django command to compare the serializer and fast recipe lists."""
+
+import statistics
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Ingradient, Recipe, Tags
+from recipe.fastpath import compile_reader
+from recipe.serializers import RecipeSerializer
+
+
+class Command(BaseCommand):
+    """Django command to time recipe list serialization."""
+    help = ('Seed recipes in a rolled back transaction and time listing '
+            'them with RecipeSerializer and with the fast path.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, nargs='+',
+                            default=[1000, 10000])
+        parser.add_argument('--tags', type=int, default=3)
+        parser.add_argument('--runs', type=int, default=3)
+
+    def _seed(self, user, count, tags):
+        Tags.objects.bulk_create(
+            [Tags(user=user, name=f'Tag {i}') for i in range(10)])
+        Ingradient.objects.bulk_create(
+            [Ingradient(user=user, name=f'Ingredient {i}')
+             for i in range(10)])
+        Recipe.objects.bulk_create([
+            Recipe(user=user, title=f'Recipe {i}', time_minutes=i % 120,
+                   price=Decimal(i % 10000) / 100,
+                   link=f'https://example.com/{i}')
+            for i in range(count)
+        ], batch_size=5000)
+        # Fetched again, bulk_create leaves ids unset on some backends.
+        tag_ids = list(Tags.objects.filter(
+            user=user).values_list('id', flat=True))
+        ingredient_ids = list(Ingradient.objects.filter(
+            user=user).values_list('id', flat=True))
+        recipe_ids = Recipe.objects.filter(
+            user=user).values_list('id', flat=True)
+        for field_name, ids in (('tags', tag_ids),
+                                ('ingradient', ingredient_ids)):
+            field = Recipe._meta.get_field(field_name)
+            through = field.remote_field.through
+            source = f'{field.m2m_field_name()}_id'
+            target = f'{field.m2m_reverse_field_name()}_id'
+            through.objects.bulk_create([
+                through(**{source: recipe_id,
+                           target: ids[(recipe_id + i) % len(ids)]})
+                for recipe_id in recipe_ids for i in range(tags)
+            ], batch_size=5000)
+
+    def _queryset(self, user):
+        return Recipe.objects.filter(user=user).order_by('-id')
+
+    def _serializer_list(self, user):
+        queryset = self._queryset(user).prefetch_related(*(
+            Prefetch(name, queryset=model.objects.only(
+                'id', 'name').order_by('id'))
+            for name, model in (('tags', Tags), ('ingradient', Ingradient))
+        ))
+        return JSONRenderer().render(
+            RecipeSerializer(queryset, many=True).data)
+
+    def _fast_list(self, user):
+        reader = compile_reader(RecipeSerializer())
+        return JSONRenderer().render(
+            reader.render(reader.rows(self._queryset(user))))
+
+    def _time(self, call, runs):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = call()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings), result
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        for count in options['recipes']:
+            with transaction.atomic():
+                user = get_user_model().objects.create_user(
+                    email=f'benchmark-{uuid.uuid4()}@example.com')
+                self._seed(user, count, options['tags'])
+                if connection.vendor == 'postgresql':
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            'ANALYZE core_recipe, core_recipe_tags, '
+                            'core_recipe_ingradient')
+
+                slow, slow_body = self._time(
+                    lambda: self._serializer_list(user), options['runs'])
+                fast, fast_body = self._time(
+                    lambda: self._fast_list(user), options['runs'])
+                transaction.set_rollback(True)
+            if slow_body != fast_body:
+                raise CommandError(
+                    f'Fast list differs from the serializer at {count}.')
+
+            self.stdout.write(self.style.SUCCESS(f'{count} recipes'))
+            self.stdout.write(f'  {"serializer":<12} {slow:10.2f} ms')
+            self.stdout.write(f'  {"fast path":<12} {fast:10.2f} ms')
+            self.stdout.write(f'  Speedup {slow / fast:.1f}x, '
+                              f'{len(fast_body)} identical bytes')
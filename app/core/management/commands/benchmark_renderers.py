@@ -0,0 +1,86 @@
+"""Django command to compare the response renderers and parsers."""
+
+import io
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.parsers import MessagePackParser, ORJSONParser
+from core.renderers import MessagePackRenderer, ORJSONRenderer
+
+FORMATS = (
+    ('json (drf)', JSONRenderer(), JSONParser()),
+    ('orjson', ORJSONRenderer(), ORJSONParser()),
+    ('msgpack', MessagePackRenderer(), MessagePackParser()),
+)
+
+
+class Command(BaseCommand):
+    """Django command to time rendering and parsing recipe payloads."""
+    help = 'Time rendering and parsing recipe list pages in each format.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, nargs='+',
+                            default=[100, 1000])
+        parser.add_argument('--runs', type=int, default=20)
+
+    def _payload(self, count):
+        """Return a recipe detail list page as the serializers render it."""
+        rng = random.Random(0)
+        words = ['tomato', 'basil', 'garlic', 'crème', 'brûlée', 'soup',
+                 'roast', 'lemon', 'chili', 'rice', 'noodle', 'pepper']
+        results = []
+        for i in range(count):
+            image = f'uploads/recipe/{i:064x}'
+            results.append({
+                'id': i + 1,
+                'title': ' '.join(rng.choices(words, k=3)).capitalize(),
+                'time_minutes': rng.randint(5, 240),
+                'price': str(Decimal(rng.randint(100, 99999)) / 100),
+                'link': f'https://example.com/recipes/{i}',
+                'tags': [{'id': rng.randint(1, 500), 'name': rng.choice(words)}
+                         for _ in range(rng.randint(0, 5))],
+                'ingradient': [
+                    {'id': rng.randint(1, 2000), 'name': rng.choice(words)}
+                    for _ in range(rng.randint(2, 12))],
+                'description': ' '.join(rng.choices(words, k=40)),
+                'image': f'http://testserver/static/media/{image}.jpg',
+                'image_status': 'ready',
+                'image_variants': {
+                    name: f'http://testserver/static/media/{image}.{name}.jpg'
+                    for name in ('thumbnail', 'medium')},
+            })
+        return {'next': None, 'previous': None, 'results': results}
+
+    def _time(self, call, runs):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        runs = options['runs']
+        for count in options['recipes']:
+            payload = self._payload(count)
+            self.stdout.write(self.style.SUCCESS(f'{count} recipes'))
+            self.stdout.write(f'  {"":<12} {"render":>10} {"parse":>10} '
+                              f'{"bytes":>10}')
+            baseline = None
+            for label, renderer, parser in FORMATS:
+                body = renderer.render(payload)
+                render = self._time(lambda: renderer.render(payload), runs)
+                parse = self._time(
+                    lambda: parser.parse(io.BytesIO(body)), runs)
+                baseline = baseline or render + parse
+                self.stdout.write(
+                    f'  {label:<12} {render:8.2f}ms {parse:8.2f}ms '
+                    f'{len(body):>10}  '
+                    f'{baseline / (render + parse):.1f}x')
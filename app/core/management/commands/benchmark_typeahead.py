@@ -0,0 +1,96 @@
+"""Django command to benchmark tag and ingredient typeahead."""
+
+import random
+import statistics
+import string
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from core.models import Ingradient
+from recipe import typeahead
+from recipe.caching import bump_version
+
+
+class Command(BaseCommand):
+    """Django command to time prefix and fuzzy name matching."""
+    help = 'Seed ingredients in a rolled back transaction and time typeahead.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ingredients', type=int, default=50000)
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--runs', type=int, default=20)
+
+    def _seed(self, user, count):
+        rng = random.Random(0)
+        names = set()
+        while len(names) < count:
+            words = rng.randint(1, 3)
+            names.add(' '.join(
+                ''.join(rng.choices(string.ascii_lowercase,
+                                    k=rng.randint(3, 9)))
+                for _ in range(words)).capitalize())
+        names = sorted(names)
+        Ingradient.objects.bulk_create(
+            [Ingradient(user=user, name=name) for name in names],
+            batch_size=10000)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE core_ingradient')
+        return names
+
+    def _time(self, call, runs):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        backends = [typeahead.BACKEND_MEMORY]
+        if connection.vendor == 'postgresql':
+            # Prefix queries do not need pg_trgm, fuzzy ones do.
+            backends.append(typeahead.BACKEND_TRIGRAM)
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                email=f'benchmark-{uuid.uuid4()}@example.com')
+            names = self._seed(user, options['ingredients'])
+            queryset = Ingradient.objects.filter(user=user)
+            sample = names[len(names) // 2]
+            cases = {
+                'prefix (2 chars)': {'prefix': sample[:2]},
+                'prefix (4 chars)': {'prefix': sample[:4]},
+                'fuzzy (typo)': {'text': sample[:-1] + 'x'},
+            }
+            for backend in backends:
+                self.stdout.write(self.style.SUCCESS(backend))
+                with override_settings(RECIPE_TYPEAHEAD={'BACKEND': backend}):
+                    if backend == typeahead.BACKEND_MEMORY:
+                        typeahead.index_cache.clear()
+                        build = self._time(lambda: typeahead.index_cache.get(
+                            Ingradient, user.pk), 1)
+                        bump_version(user.pk)
+                        check = self._time(lambda: typeahead.index_cache.get(
+                            Ingradient, user.pk), 1)
+                        self.stdout.write(f'  {"index build":<20} '
+                                          f'{build:9.2f} ms')
+                        self.stdout.write(f'  {"index recheck":<20} '
+                                          f'{check:9.2f} ms')
+                    for label, params in cases.items():
+                        if (backend == typeahead.BACKEND_TRIGRAM
+                                and 'text' in params
+                                and not typeahead.trigram_enabled()):
+                            self.stdout.write(
+                                f'  {label:<20} needs pg_trgm')
+                            continue
+                        median = self._time(lambda: typeahead.typeahead(
+                            queryset, user.pk, options['limit'], **params),
+                            options['runs'])
+                        self.stdout.write(f'  {label:<20} {median:9.2f} ms')
+            transaction.set_rollback(True)
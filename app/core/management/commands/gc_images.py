@@ -0,0 +1,35 @@
+"""Django command to delete unreferenced recipe images."""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Recipe
+from core.storage import collect_blobs, sweep_shards
+
+
+class Command(BaseCommand):
+    """Django command to garbage collect the image blob store."""
+    help = ('Delete image blobs no recipe references and walk a few shards '
+            'of the store for untracked files.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=3600,
+            help='Seconds a blob or file must be unused before deletion.')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--shards', type=int, default=16,
+            help='Shards of the 256 to walk, later runs continue the walk.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options['shards'] < 1:
+            raise CommandError('--shards must be at least 1.')
+        storage = Recipe._meta.get_field('image').storage
+        grace = timedelta(seconds=options['grace'])
+        blobs = collect_blobs(storage, grace, options['batch_size'])
+        shards, files = sweep_shards(storage, grace, options['shards'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {blobs} blobs, {files} untracked files in shards '
+            f'{shards[0]}-{shards[-1]}'))
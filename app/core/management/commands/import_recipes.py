@@ -0,0 +1,88 @@
+"""Django command to bulk import recipes from NDJSON or CSV."""
+
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import ImportStatus, RecipeImport
+from recipe.importer import READERS, ImportRunning, import_recipes
+
+
+class Command(BaseCommand):
+    """Django command to load a file of recipes for a user."""
+    help = ('Import recipes in the shape of the export for a user. An '
+            'interrupted import resumes after its last batch when run again.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True, help='Email of the user.')
+        parser.add_argument(
+            '--format', choices=sorted(READERS),
+            help='Input format, taken from the file extension by default.')
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument(
+            '--checkpoint',
+            help='Name of the import to resume, the file path by default.')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Import every record again instead of resuming.')
+
+    def _format(self, path, import_format):
+        if import_format:
+            return import_format
+        extension = os.path.splitext(path)[1].lstrip('.').lower()
+        if extension == 'jsonl':
+            return 'ndjson'
+        if extension not in READERS:
+            raise CommandError(
+                f'Cannot tell the format of {path}, pass --format.')
+        return extension
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        path = options['path']
+        import_format = self._format(path, options['format'])
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user {options["user"]}.')
+
+        key = options['checkpoint'] or os.path.abspath(path)
+        job, _ = RecipeImport.objects.get_or_create(user=user, key=key)
+        if options['restart']:
+            job.delete()
+            job = RecipeImport.objects.create(user=user, key=key)
+        elif job.status == ImportStatus.DONE:
+            self.stdout.write(
+                f'Import {key} already done, pass --restart to run it again.')
+            return
+        elif job.position:
+            self.stdout.write(f'Resuming after record {job.position}.')
+
+        started = time.perf_counter()
+        resumed_at = job.position
+
+        def progress(job):
+            rate = (job.position - resumed_at) / (
+                time.perf_counter() - started)
+            self.stdout.write(
+                f'{job.position} records, {job.imported} imported, '
+                f'{job.failed} failed, {rate:.0f} records/s')
+
+        try:
+            with open(path, 'rb') as stream:
+                job = import_recipes(
+                    job, stream, import_format, options['batch_size'],
+                    progress)
+        except ImportRunning as exc:
+            raise CommandError(exc)
+        except (OSError, ValueError) as exc:
+            raise CommandError(
+                f'Import stopped after record {job.position}: {exc}')
+
+        for error in job.errors:
+            self.stderr.write(f'Record {error["record"]}: {error["errors"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {job.imported} recipes, {job.failed} failed.'))
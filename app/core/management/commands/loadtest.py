@@ -0,0 +1,179 @@
+"""Django command to load test the recipe read endpoints."""
+
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from core.models import Ingradient, Recipe, Tags
+
+HOST = 'localhost'
+MODES = ('wsgi', 'asgi')
+
+
+def _percentile(timings, percent):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+class Command(BaseCommand):
+    """Django command to compare the WSGI and ASGI handlers under load."""
+    help = ('Seed a user, then send concurrent reads through the WSGI and '
+            'ASGI handlers in process and report requests/sec and p99.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--recipes', type=int, default=50)
+        parser.add_argument('--mode', choices=MODES, action='append')
+        parser.add_argument(
+            '--uncached', action='store_true',
+            help='Bypass the response cache so every read hits the DB.')
+
+    def _seed(self, count):
+        user = get_user_model().objects.create_user(
+            email=f'loadtest-{uuid.uuid4()}@example.com')
+        Tags.objects.bulk_create(
+            [Tags(user=user, name=f'Tag {i}') for i in range(10)])
+        Ingradient.objects.bulk_create(
+            [Ingradient(user=user, name=f'Ingredient {i}')
+             for i in range(20)])
+        Recipe.objects.bulk_create([
+            Recipe(user=user, title=f'Recipe {i}', time_minutes=i % 60,
+                   price=Decimal('5.00'))
+            for i in range(count)
+        ])
+        # Fetched again, bulk_create leaves ids unset on some databases.
+        tags = list(Tags.objects.filter(user=user))
+        ingredients = list(Ingradient.objects.filter(user=user))
+        recipes = list(Recipe.objects.filter(user=user).order_by('id'))
+        for i, recipe in enumerate(recipes):
+            recipe.tags.add(tags[i % len(tags)])
+            recipe.ingradient.add(*ingredients[i % 5:i % 5 + 3])
+        token = Token.objects.create(user=user)
+        return user, token.key, recipes[0].pk
+
+    def _paths(self, recipe_id):
+        return [
+            reverse('recipe:recipe-list'),
+            reverse('recipe:recipe-detail', args=[recipe_id]),
+            reverse('recipe:tags-list'),
+            reverse('recipe:ingradient-list'),
+        ]
+
+    def _run_wsgi(self, paths, token, total, concurrency):
+        handler = WSGIHandler()
+
+        def call(index):
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': paths[index % len(paths)],
+                'QUERY_STRING': '',
+                'SERVER_NAME': HOST,
+                'SERVER_PORT': '80',
+                'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': HOST,
+                'HTTP_AUTHORIZATION': f'Token {token}',
+                'wsgi.input': BytesIO(),
+                'wsgi.errors': sys.stderr,
+                'wsgi.url_scheme': 'http',
+            }
+            statuses = []
+            start = time.perf_counter()
+            body = handler(environ, lambda status, headers: statuses.append(
+                status))
+            b''.join(body)
+            body.close()
+            return statuses[0].split()[0], time.perf_counter() - start
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            return list(pool.map(call, range(total)))
+
+    def _run_asgi(self, paths, token, total, concurrency):
+        handler = ASGIHandler()
+
+        async def call(index):
+            scope = {
+                'type': 'http',
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': paths[index % len(paths)],
+                'query_string': b'',
+                'headers': [
+                    (b'host', HOST.encode()),
+                    (b'authorization', f'Token {token}'.encode()),
+                ],
+                'server': (HOST, 80),
+            }
+            statuses = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b''}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(str(message['status']))
+
+            start = time.perf_counter()
+            await handler(scope, receive, send)
+            return statuses[0], time.perf_counter() - start
+
+        async def worker(indexes, results):
+            for index in indexes:
+                results.append(await call(index))
+
+        async def main():
+            results = []
+            await asyncio.gather(*(
+                worker(range(i, total, concurrency), results)
+                for i in range(concurrency)))
+            return results
+
+        return asyncio.run(main())
+
+    def _report(self, mode, results, elapsed):
+        timings = [duration * 1000 for _, duration in results]
+        errors = sum(1 for code, _ in results if code != '200')
+        self.stdout.write(
+            f'{mode:<5} {len(results) / elapsed:10.1f} req/s  '
+            f'p50 {statistics.median(timings):8.2f} ms  '
+            f'p99 {_percentile(timings, 99):8.2f} ms  '
+            f'errors {errors}')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, HOST]}
+        if options['uncached']:
+            # Cached responses expire at once, the version markers stay.
+            overrides['RECIPE_RESPONSE_CACHE'] = {
+                **getattr(settings, 'RECIPE_RESPONSE_CACHE', {}),
+                'TIMEOUT': 0,
+            }
+        user, token, recipe_id = self._seed(options['recipes'])
+        try:
+            paths = self._paths(recipe_id)
+            with override_settings(**overrides):
+                for mode in options['mode'] or MODES:
+                    run = getattr(self, f'_run_{mode}')
+                    # Warm up connections, caches and lazy imports first.
+                    run(paths, token, len(paths), 1)
+                    start = time.perf_counter()
+                    results = run(paths, token, options['requests'],
+                                  options['concurrency'])
+                    self._report(mode, results, time.perf_counter() - start)
+        finally:
+            user.delete()
@@ -0,0 +1,44 @@
+"""Django command to process queued recipe images."""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipe import images
+
+
+class Command(BaseCommand):
+    """Django command to run image jobs of the database backend."""
+    help = 'Render variants of uploaded recipe images queued in the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit when the queue is empty.')
+        parser.add_argument(
+            '--batch-size', type=int, default=10,
+            help='Jobs claimed and rendered concurrently.')
+        parser.add_argument(
+            '--poll', type=float, default=1.0,
+            help='Seconds to wait when the queue is empty.')
+        parser.add_argument(
+            '--inline', action='store_true',
+            help='Render in this process instead of the process pool.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        pool = None if options['inline'] else images.get_pool()
+        processed = 0
+        try:
+            while True:
+                jobs = images.claim_jobs(options['batch_size'])
+                if jobs:
+                    images.run_jobs(jobs, pool)
+                    processed += len(jobs)
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['poll'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} jobs'))
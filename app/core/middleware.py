@@ -0,0 +1,91 @@
+"""Middleware of the app."""
+
+import logging
+import random
+import time
+
+from core import instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+def _view_name(view_func, request):
+    """Return the view and action names a request is recorded under."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}', request.method
+    actions = getattr(view_func, 'actions', None) or {}
+    return cls.__name__, actions.get(request.method.lower(), request.method)
+
+
+def _result_size(response):
+    data = getattr(response, 'data', None)
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        data = data['results']
+    return len(data) if isinstance(data, list) else None
+
+
+class PerformanceMiddleware:
+    """Measure sampled requests per view and action.
+
+    Wall, database, serialization and render times go into the
+    Server-Timing header and the Prometheus registry, and a statement
+    repeated N_PLUS_ONE_THRESHOLD times, like a query run per result, is
+    logged and counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = instrumentation.options()
+        if (not options.get('ENABLED', True)
+                or random.random() >= options.get(
+                    'SAMPLE_RATE', instrumentation.DEFAULT_SAMPLE_RATE)):
+            return self.get_response(request)
+
+        metrics, token = instrumentation.start()
+        request.perf_metrics = metrics
+        try:
+            response = self.get_response(request)
+        finally:
+            instrumentation.stop(token)
+        if not metrics.view:
+            # Not routed to a view, like a 404 or a redirect.
+            return response
+        seconds = time.perf_counter() - metrics.started
+        n_plus_one = self._check_repeats(metrics, response, options)
+        size = 0 if response.streaming else len(response.content)
+        instrumentation.registry.observe(metrics, seconds, size, n_plus_one)
+        if options.get('SERVER_TIMING', True):
+            response['Server-Timing'] = ', '.join([
+                f'total;dur={seconds * 1000:.1f}',
+                f'db;dur={metrics.db_seconds * 1000:.1f};'
+                f'desc="{metrics.queries} queries"',
+                f'serialize;dur={metrics.spans["serialize"] * 1000:.1f}',
+                f'render;dur={metrics.spans["render"] * 1000:.1f}',
+            ])
+        return response
+
+    def _check_repeats(self, metrics, response, options):
+        statement, repeats = metrics.repeated_statement()
+        if repeats < options.get('N_PLUS_ONE_THRESHOLD', 5):
+            return False
+        logger.warning(
+            'Possible N+1 queries in %s.%s: statement ran %s times for %s '
+            'results: %s', metrics.view, metrics.action, repeats,
+            _result_size(response), statement)
+        return True
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = getattr(request, 'perf_metrics', None)
+        if metrics is not None:
+            metrics.view, metrics.action = _view_name(view_func, request)
+
+    def process_template_response(self, request, response):
+        metrics = getattr(request, 'perf_metrics', None)
+        if metrics is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(lambda rendered: (
+                metrics.add_span('render', time.perf_counter() - started)))
+        return response
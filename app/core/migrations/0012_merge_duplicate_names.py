@@ -0,0 +1,42 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:39
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Merge tags and ingredients sharing a name for the same user."""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field_name in (('Tags', 'tags'),
+                                   ('Ingradient', 'ingradient')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, field_name).through
+        target = f'{field_name}_id'
+        duplicates = model.objects.values('user', 'name').annotate(
+            keep=Min('id'), total=Count('id')).filter(total__gt=1)
+        for duplicate in duplicates:
+            stale = list(model.objects.filter(
+                user=duplicate['user'], name=duplicate['name'],
+            ).exclude(id=duplicate['keep']).values_list('id', flat=True))
+            recipe_ids = set(through.objects.filter(**{
+                f'{target}__in': stale,
+            }).values_list('recipe_id', flat=True))
+            recipe_ids -= set(through.objects.filter(**{
+                target: duplicate['keep'],
+            }).values_list('recipe_id', flat=True))
+            through.objects.bulk_create([
+                through(**{'recipe_id': recipe_id, target: duplicate['keep']})
+                for recipe_id in recipe_ids
+            ])
+            model.objects.filter(id__in=stale).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+    ]
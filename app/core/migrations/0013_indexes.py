@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_merge_duplicate_names'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', '-id'], name='recipe_user_id_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingradient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='ingradient_user_name_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='tags',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='tags_user_name_unique'),
+        ),
+    ]
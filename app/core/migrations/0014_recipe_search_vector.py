@@ -0,0 +1,66 @@
+# Generated by Django 3.2.25 on 2026-10-18 04:52
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+RECIPE_VECTOR = """
+    setweight(to_tsvector('english', coalesce(r.title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(r.description, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce((
+        SELECT string_agg(t.name, ' ') FROM core_recipe_tags rt
+        JOIN core_tags t ON t.id = rt.tags_id WHERE rt.recipe_id = r.id
+    ), '')), 'C') ||
+    setweight(to_tsvector('english', coalesce((
+        SELECT string_agg(i.name, ' ') FROM core_recipe_ingradient ri
+        JOIN core_ingradient i ON i.id = ri.ingradient_id
+        WHERE ri.recipe_id = r.id
+    ), '')), 'C')
+"""
+
+
+def create_search_index(apps, schema_editor):
+    """Index and fill the search vectors, Postgres only."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX recipe_search_vector_idx ON core_recipe '
+        'USING gin (search_vector)')
+    schema_editor.execute(
+        f'UPDATE core_recipe r SET search_vector = {RECIPE_VECTOR}')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # The GIN index only exists on Postgres, the state declares it
+        # for every backend.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(create_search_index, drop_search_index),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='recipe',
+                    index=django.contrib.postgres.indexes.GinIndex(
+                        fields=['search_vector'],
+                        name='recipe_search_vector_idx'),
+                ),
+            ],
+        ),
+    ]
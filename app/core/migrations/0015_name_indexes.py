@@ -0,0 +1,72 @@
+from django.db import DatabaseError, migrations, transaction
+
+TRIGRAM_INDEXES = {
+    'tags_name_trgm_idx': 'core_tags',
+    'ingradient_name_trgm_idx': 'core_ingradient',
+}
+PREFIX_INDEXES = {
+    'tags_name_prefix_idx': 'core_tags',
+    'ingradient_name_prefix_idx': 'core_ingradient',
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """Install pg_trgm and index names, when the server provides it."""
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    try:
+        with transaction.atomic(using=connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DatabaseError:
+        # Not allowed to create extensions, typeahead uses the fallback.
+        return
+    for name, table in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} '
+            'USING gin (name gin_trgm_ops)')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+def create_prefix_indexes(apps, schema_editor):
+    """Index lowercased names for typeahead prefix queries, Postgres only.
+
+    The C collation lets the btree serve the prefix range and the order
+    by name whatever the database collation is.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table in PREFIX_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} '
+            '(user_id, (lower(name) COLLATE "C"), id)')
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in PREFIX_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
@@ -2,22 +2,38 @@
 
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin
 )
+
+from core.storage import ContentAddressedStorage
 import uuid
 import os
 
 
 def recipe_image_file_path(instance, filename):
-    """Return file path for new recipe image"""
+    """Return file path for new recipe image
+
+    The content addressed storage only keeps the extension of the path.
+    """
     ext = os.path.splitext(filename)[1]
     filename = f'{uuid.uuid4()}{ext}'
     return os.path.join('uploads', 'recipe', filename)
 
 
+class ImageStatus(models.TextChoices):
+    """Processing state of a recipe image."""
+    NONE = 'none'
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    READY = 'ready'
+    FAILED = 'failed'
+
+
 class UserManager(BaseUserManager):
     """Manager for users."""
     def create_user(self, email, password=None, **extra_fields):
@@ -62,7 +78,20 @@ class Recipe(models.Model):
     link = models.TextField(max_length=255, blank=True)
     tags = models.ManyToManyField('Tags')
     ingradient = models.ManyToManyField('Ingradient')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(
+        null=True, upload_to=recipe_image_file_path,
+        storage=ContentAddressedStorage())
+    image_status = models.CharField(
+        max_length=10, choices=ImageStatus.choices, default=ImageStatus.NONE)
+    image_variants = models.JSONField(default=dict, blank=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id'], name='recipe_user_id_idx'),
+            GinIndex(
+                fields=['search_vector'], name='recipe_search_vector_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -72,6 +101,13 @@ class Tags(models.Model):
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'], name='tags_user_name_unique'),
+        ]
 
     def __str__(self):
         return self.name
@@ -81,6 +117,80 @@ class Ingradient(models.Model):
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'], name='ingradient_user_name_unique'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class ImageBlob(models.Model):
+    """An image file shared by every recipe with the same content."""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refcount = models.IntegerField(default=0)
+    variants = models.JSONField(default=dict, blank=True)
+    # Blob of the same image without metadata, recipes move to it.
+    cleaned = models.CharField(max_length=255, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['updated_at'], name='imageblob_orphan_idx',
+                condition=models.Q(refcount__lte=0)),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class ImageJob(models.Model):
+    """Queued processing of a recipe image for the database backend."""
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    image = models.CharField(max_length=255)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    locked_until = models.DateTimeField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.image
+
+
+class ImportStatus(models.TextChoices):
+    """State of a recipe import."""
+    RUNNING = 'running'
+    DONE = 'done'
+
+
+class RecipeImport(models.Model):
+    """Checkpoint of a recipe import, to resume it after the last batch."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    status = models.CharField(
+        max_length=10, choices=ImportStatus.choices,
+        default=ImportStatus.RUNNING)
+    # Input records handled, imported or failed.
+    position = models.PositiveBigIntegerField(default=0)
+    imported = models.PositiveBigIntegerField(default=0)
+    failed = models.PositiveBigIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    # Set while a process imports, which updated_at shows is alive.
+    running_since = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'key'], name='recipeimport_user_key_unique'),
+        ]
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,65 @@
+"""Renderers for the APIs."""
+
+import decimal
+
+import msgpack
+import orjson
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+_encoder = JSONEncoder()
+# Escaped by DRF so the JSON is also valid JavaScript.
+_LINE_SEPARATORS = (('\u2028'.encode(), b'\\u2028'),
+                    ('\u2029'.encode(), b'\\u2029'))
+
+
+def default(obj):
+    """Encode the types the fast encoders leave to DRF.
+
+    Decimals become strings, as serializers render them, instead of the
+    floats of DRF's encoder, so no precision is lost.
+    """
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    return _encoder.default(obj)
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """JSON renderer using orjson, with the output of DRF's renderer.
+
+    Data orjson refuses, like dicts with keys other than strings, and
+    indents other than 2, the only one orjson has, are rendered by
+    DRF's renderer.
+    """
+    options = orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent not in (None, 2):
+            return super().render(data, accepted_media_type, renderer_context)
+        options = self.options
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        try:
+            ret = orjson.dumps(data, default=default, option=options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80' in ret:
+            for raw, escaped in _LINE_SEPARATORS:
+                ret = ret.replace(raw, escaped)
+        return ret
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """MessagePack renderer, chosen with Accept: application/msgpack."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=default, use_bin_type=True)
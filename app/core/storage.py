@@ -0,0 +1,201 @@
+"""Content addressed storage of recipe images"""
+
+import hashlib
+import itertools
+import os
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIR = 'blobs'
+# Uploads wait here, never served, until a copy without metadata is
+# stored under BLOB_DIR.
+INCOMING_DIR = 'incoming'
+CURSOR_FILE = '.gc-cursor'
+SHARDS = [f'{i:02x}' for i in range(256)]
+
+
+def blob_name(digest, extension, directory=BLOB_DIR):
+    """Return the storage name of the blob with a SHA-256 digest."""
+    return f'{directory}/{digest[:2]}/{digest}{extension.lower()}'
+
+
+def _digest_of(file_name):
+    """Return the digest a blob or one of its variants is named after."""
+    return file_name.split('.', 1)[0].split('_', 1)[0]
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming files by the SHA-256 of their content.
+
+    Identical files share one blob, tracked by an ImageBlob row whose
+    refcount follows the recipes pointing at it. Uploads are stored
+    under INCOMING_DIR, the image pipeline adds their cleaned copies
+    under BLOB_DIR.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # An existing name holds the same content, no suffix needed.
+        return name
+
+    def _digest(self, content):
+        digest = getattr(content, 'sha256', None)
+        if digest is None:
+            sha256 = hashlib.sha256()
+            content.seek(0)
+            for chunk in content.chunks():
+                sha256.update(chunk)
+            content.seek(0)
+            digest = sha256.hexdigest()
+        return digest
+
+    def _save(self, name, content):
+        from core.models import ImageBlob
+
+        name = blob_name(
+            self._digest(content), os.path.splitext(name)[1], INCOMING_DIR)
+        full_path = self.path(name)
+        if not os.path.exists(full_path):
+            directory = os.path.dirname(full_path)
+            os.makedirs(directory, exist_ok=True)
+            # Identical uploads racing for a name write the same bytes, so
+            # the last atomic rename simply wins.
+            if hasattr(content, 'temporary_file_path'):
+                file_move_safe(
+                    content.temporary_file_path(), full_path,
+                    allow_overwrite=True)
+            else:
+                with tempfile.NamedTemporaryFile(
+                        dir=directory, prefix='.upload-',
+                        delete=False) as file:
+                    for chunk in content.chunks():
+                        file.write(chunk)
+                os.replace(file.name, full_path)
+            if self.file_permissions_mode is not None:
+                os.chmod(full_path, self.file_permissions_mode)
+        blob, created = ImageBlob.objects.get_or_create(
+            name=name, defaults={'size': content.size})
+        if not created:
+            # Restart the grace period of a blob about to be referenced.
+            blob.save(update_fields=['updated_at'])
+        return name
+
+
+def _change_refcount(name, delta):
+    from core.models import ImageBlob
+
+    if name:
+        ImageBlob.objects.filter(name=name).update(
+            refcount=F('refcount') + delta, updated_at=timezone.now())
+
+
+def remember_image(sender, instance, raw=False, update_fields=None,
+                   **kwargs):
+    """Signal receiver storing the image a recipe had before saving."""
+    if raw or (update_fields is not None and 'image' not in update_fields):
+        instance._stored_image = None
+    elif instance._state.adding:
+        instance._stored_image = ''
+    else:
+        instance._stored_image = sender.objects.filter(
+            pk=instance.pk).values_list('image', flat=True).first() or ''
+
+
+def count_image_references(sender, instance, created, raw=False,
+                           **kwargs):
+    """Signal receiver moving a reference from the old image to the new."""
+    old_name = getattr(instance, '_stored_image', None)
+    if raw or old_name is None:
+        return
+    new_name = instance.image.name or ''
+    if new_name != old_name:
+        _change_refcount(new_name, 1)
+        _change_refcount(old_name, -1)
+    instance._stored_image = new_name
+
+
+def release_image(sender, instance, **kwargs):
+    """Signal receiver dropping the reference of a deleted recipe."""
+    _change_refcount(instance.image.name, -1)
+
+
+def _delete_blob_files(storage, blob):
+    for name in [blob.name, *blob.variants.values()]:
+        storage.delete(name)
+
+
+def collect_blobs(storage, grace, batch_size=100):
+    """Delete unreferenced blobs older than grace, return how many.
+
+    Each blob is locked and checked again before it is deleted, so a
+    recipe picking it up concurrently keeps it.
+    """
+    from core.models import ImageBlob
+
+    cutoff = timezone.now() - grace
+    orphans = ImageBlob.objects.filter(refcount__lte=0, updated_at__lt=cutoff)
+    deleted = 0
+    last_id = 0
+    while True:
+        ids = list(orphans.filter(id__gt=last_id).order_by(
+            'id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        last_id = ids[-1]
+        for blob_id in ids:
+            with transaction.atomic():
+                blob = orphans.select_for_update().filter(pk=blob_id).first()
+                if blob is None:
+                    continue
+                blob.delete()
+                transaction.on_commit(
+                    lambda blob=blob: _delete_blob_files(storage, blob))
+            deleted += 1
+
+
+def sweep_shards(storage, grace, shards):
+    """Walk the next shards of the store and delete untracked files.
+
+    Files of the blob and incoming stores whose digest has no ImageBlob
+    row, like leftovers of interrupted uploads, are deleted once older
+    than grace. The walk resumes where the last one stopped. Returns
+    the shards walked and the number of files deleted.
+    """
+    from core.models import ImageBlob
+
+    cursor_path = storage.path(f'{BLOB_DIR}/{CURSOR_FILE}')
+    try:
+        with open(cursor_path) as file:
+            start = SHARDS.index(file.read().strip())
+    except (OSError, ValueError):
+        start = 0
+    cutoff = (timezone.now() - grace).timestamp()
+    walked = [SHARDS[(start + i) % len(SHARDS)]
+              for i in range(min(shards, len(SHARDS)))]
+    deleted = 0
+    for shard, root in itertools.product(walked, (BLOB_DIR, INCOMING_DIR)):
+        directory = storage.path(f'{root}/{shard}')
+        if not os.path.isdir(directory):
+            continue
+        live = {
+            _digest_of(os.path.basename(name))
+            for name in ImageBlob.objects.filter(
+                name__startswith=f'{root}/{shard}/',
+            ).values_list('name', flat=True)
+        }
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if (entry.is_file() and _digest_of(entry.name) not in live
+                        and entry.stat().st_mtime < cutoff):
+                    os.remove(entry.path)
+                    deleted += 1
+    os.makedirs(os.path.dirname(cursor_path), exist_ok=True)
+    with open(cursor_path, 'w') as file:
+        file.write(SHARDS[(start + len(walked)) % len(SHARDS)])
+    return walked, deleted
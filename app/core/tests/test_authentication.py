@@ -0,0 +1,142 @@
+"""
+Tests for cached token authentication.
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+
+from core.authentication import (
+    CachedTokenAuthentication,
+    TokenCache,
+    token_cache,
+)
+
+
+def create_user(email='user@example.com', password='test123'):
+    return get_user_model().objects.create_user(email, password)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test resolving tokens through the cache."""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = create_user()
+        self.token = Token.objects.create(user=self.user)
+        self.auth = CachedTokenAuthentication()
+
+    def test_token_is_cached(self):
+        """Test a resolved token does not hit the database again."""
+        user, token = self.auth.authenticate_credentials(self.token.key)
+
+        with self.assertNumQueries(0):
+            cached_user, cached_token = self.auth.authenticate_credentials(
+                self.token.key)
+
+        self.assertEqual(user, self.user)
+        self.assertEqual(cached_user, self.user)
+        self.assertEqual(cached_token, self.token)
+
+    def test_deleted_token_is_invalidated(self):
+        """Test deleting a token drops it from the cache."""
+        key = self.token.key
+        self.auth.authenticate_credentials(key)
+        self.token.delete()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate_credentials(key)
+
+    def test_deactivated_user_is_invalidated(self):
+        """Test deactivating a user drops their tokens from the cache."""
+        self.auth.authenticate_credentials(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+
+class TokenCacheTests(TestCase):
+    """Test the token cache tiers."""
+
+    def setUp(self):
+        self.user = create_user()
+
+    def pair(self, key):
+        return self.user, Token(key=key, user=self.user)
+
+    def test_least_recently_used_is_evicted(self):
+        """Test the cache keeps at most max_size entries."""
+        cache = TokenCache(max_size=2, ttl=60)
+        cache.set('a', self.pair('a'))
+        cache.set('b', self.pair('b'))
+        cache.get('a')
+        cache.set('c', self.pair('c'))
+
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+
+    @patch('core.authentication.time.monotonic')
+    def test_entries_expire(self, patched_monotonic):
+        """Test entries are dropped after the ttl."""
+        patched_monotonic.return_value = 100
+        cache = TokenCache(max_size=10, ttl=60)
+        cache.set('a', self.pair('a'))
+
+        patched_monotonic.return_value = 161
+
+        self.assertIsNone(cache.get('a'))
+
+    def test_shared_tier(self):
+        """Test entries are shared between caches using the same alias."""
+        token = Token.objects.create(user=self.user)
+        first = TokenCache(max_size=10, ttl=60, shared_cache='default')
+        second = TokenCache(max_size=10, ttl=60, shared_cache='default')
+        first.set(token.key, (self.user, token))
+
+        self.assertEqual(second.get(token.key), (self.user, token))
+
+        second.delete_user(self.user)
+
+        self.assertIsNone(first.get(token.key))
+
+    def test_deleted_token_is_invalidated_in_other_caches(self):
+        """Test deleting a token drops the entries of other processes."""
+        token = Token.objects.create(user=self.user)
+        first = TokenCache(max_size=10, ttl=60, shared_cache='default')
+        second = TokenCache(max_size=10, ttl=60, shared_cache='default')
+        first.set(token.key, (self.user, token))
+        first.get(token.key)
+
+        second.delete([token.key])
+
+        self.assertIsNone(first.get(token.key))
+
+    def test_invalidation_during_lookup_is_not_cached(self):
+        """Test a lookup raced by an invalidation is not kept."""
+        token = Token.objects.create(user=self.user)
+        first = TokenCache(max_size=10, ttl=60, shared_cache='default')
+        second = TokenCache(max_size=10, ttl=60, shared_cache='default')
+        version = first.version(token.key)
+        second.delete_user(self.user)
+
+        first.set(token.key, (self.user, token), version)
+
+        self.assertIsNone(first.get(token.key))
+        self.assertIsNone(second.get(token.key))
+
+    def test_cached_instances_are_copies(self):
+        """Test changes to a returned user do not reach the cache."""
+        cache = TokenCache(max_size=10, ttl=60)
+        cache.set('a', self.pair('a'))
+
+        user, token = cache.get('a')
+        user.name = 'Changed'
+
+        cached_user, cached_token = cache.get('a')
+        self.assertNotEqual(cached_user.name, 'Changed')
+        self.assertIs(cached_token.user, cached_user)
@@ -1,10 +1,13 @@
+from io import StringIO
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2OpError
 
 from django.core.management import call_command
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
+
+from core.models import Ingradient, Recipe
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -22,3 +25,58 @@ class CommandTest(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class BenchmarkCommandTest(TestCase):
+    def test_benchmark_bulk(self):
+        """Test the bulk benchmark runs and leaves no data behind."""
+        out = StringIO()
+        call_command('benchmark_bulk', count=4, batch_size=2, stdout=out)
+
+        self.assertIn('Speedup', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_recipe_filters(self):
+        """Test the filter benchmark runs and leaves no data behind."""
+        out = StringIO()
+        call_command(
+            'benchmark_recipe_filters', recipes=20, tags=4, batch_size=10,
+            runs=1, stdout=out)
+
+        self.assertIn('exists (all)', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_typeahead(self):
+        """Test the typeahead benchmark runs and leaves no data behind."""
+        out = StringIO()
+        call_command('benchmark_typeahead', ingredients=20, runs=1, stdout=out)
+
+        self.assertIn('fuzzy (typo)', out.getvalue())
+        self.assertFalse(Ingradient.objects.exists())
+
+    def test_benchmark_hashers(self):
+        """Test the hasher benchmark recommends costs within the target."""
+        out = StringIO()
+        call_command(
+            'benchmark_hashers', target_ms=10000, runs=1, time_costs=[1],
+            memory_costs=[8192], bcrypt_rounds=[4], stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('ARGON2_TIME_COST=1 ARGON2_MEMORY_COST=8192', output)
+        self.assertIn('BCRYPT_ROUNDS=4', output)
+
+    def test_benchmark_recipe_list(self):
+        """Test the list benchmark compares identical output."""
+        out = StringIO()
+        call_command('benchmark_recipe_list', recipes=[5], runs=1, stdout=out)
+
+        self.assertIn('identical bytes', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_renderers(self):
+        """Test the renderer benchmark times every format."""
+        out = StringIO()
+        call_command('benchmark_renderers', recipes=[3], runs=1, stdout=out)
+
+        for label in ('json (drf)', 'orjson', 'msgpack'):
+            self.assertIn(label, out.getvalue())
@@ -0,0 +1,66 @@
+"""
+Tests for the password hashers.
+"""
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.test import TestCase, override_settings
+
+from core.hashers import BCryptSHA256PasswordHasher
+
+ARGON2 = {'TIME_COST': 1, 'MEMORY_COST': 8192, 'PARALLELISM': 1}
+
+
+@override_settings(PASSWORD_HASHING={'ARGON2': ARGON2})
+class HasherTests(TestCase):
+    """Test passwords are hashed with the configured costs."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'pass12345')
+
+    def test_new_passwords_use_argon2(self):
+        """Test new hashes are Argon2 with the configured costs."""
+        self.assertTrue(self.user.password.startswith('argon2$argon2id$'))
+        self.assertIn('m=8192,t=1,p=1', self.user.password)
+
+    def test_pbkdf2_rehashed_on_login(self):
+        """Test a PBKDF2 hash is replaced with Argon2 at login."""
+        self.user.password = make_password('pass12345', hasher='pbkdf2_sha256')
+        self.user.save()
+
+        user = authenticate(username='user@example.com', password='pass12345')
+
+        self.assertEqual(user, self.user)
+        self.user.refresh_from_db()
+        self.assertEqual(identify_hasher(self.user.password).algorithm,
+                         'argon2')
+
+    def test_cost_change_rehashed_on_login(self):
+        """Test hashes are upgraded when the costs are raised."""
+        costs = {**ARGON2, 'TIME_COST': 2}
+        with override_settings(PASSWORD_HASHING={'ARGON2': costs}):
+            authenticate(username='user@example.com', password='pass12345')
+
+        self.user.refresh_from_db()
+        self.assertIn('m=8192,t=2,p=1', self.user.password)
+
+    def test_wrong_password_not_rehashed(self):
+        """Test a failed login leaves the hash alone."""
+        password = self.user.password
+        with override_settings(PASSWORD_HASHING={'ARGON2': {
+                **ARGON2, 'TIME_COST': 2}}):
+            authenticate(username='user@example.com', password='wrong')
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password, password)
+
+    @override_settings(PASSWORD_HASHING={'BCRYPT_ROUNDS': 4})
+    def test_bcrypt_rounds(self):
+        """Test bcrypt uses the configured rounds."""
+        hasher = BCryptSHA256PasswordHasher()
+
+        encoded = hasher.encode('pass12345', hasher.salt())
+
+        self.assertIn('$2b$04$', encoded)
+        self.assertTrue(hasher.verify('pass12345', encoded))
+        self.assertFalse(hasher.must_update(encoded))
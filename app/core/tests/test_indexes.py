@@ -0,0 +1,75 @@
+"""
+Tests that hot queries are served by indexes.
+"""
+import re
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+
+from core import models
+from recipe.typeahead import prefix_matches
+
+
+class QueryPlanTests(TestCase):
+    """Test query plans of the hot recipe API queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            'test@example.com', 'test123')
+        for i in range(20):
+            models.Recipe.objects.create(
+                user=cls.user, title=f'Recipe {i}', time_minutes=5,
+                price=Decimal('1.00'))
+            models.Tags.objects.create(user=cls.user, name=f'Tag {i}')
+            models.Ingradient.objects.create(
+                user=cls.user, name=f'Ingredient {i}')
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables are cheaper to scan and sort, so make the
+            # planner pick an index whenever one can serve the query.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_sort = off')
+
+    def assertIndexed(self, queryset):
+        """Assert the query plan has no table scan and no sort."""
+        plan = queryset.explain()
+        if connection.vendor == 'postgresql':
+            bad = re.search(r'Seq Scan|Sort\b', plan)
+        elif connection.vendor == 'sqlite':
+            bad = re.search(r'\bSCAN\b|TEMP B-TREE', plan)
+        else:
+            self.skipTest(f'No plan check for {connection.vendor}.')
+        self.assertIsNone(bad, f'Query is not indexed:\n{plan}')
+
+    def test_recipe_list_is_indexed(self):
+        """Test listing a user's recipes by -id uses an index."""
+        self.assertIndexed(models.Recipe.objects.filter(
+            user=self.user).order_by('-id')[:100])
+
+    def test_tag_list_is_indexed(self):
+        """Test listing a user's tags by -name uses an index."""
+        self.assertIndexed(models.Tags.objects.filter(
+            user=self.user).order_by('-name')[:100])
+
+    def test_ingredient_list_is_indexed(self):
+        """Test listing a user's ingredients by -name uses an index."""
+        self.assertIndexed(models.Ingradient.objects.filter(
+            user=self.user).order_by('-name')[:100])
+
+    def test_name_prefix_is_indexed(self):
+        """Test typeahead prefix matches are read from an index in order."""
+        if connection.vendor != 'postgresql':
+            self.skipTest('Prefix queries only run on Postgres.')
+        for model in (models.Tags, models.Ingradient):
+            self.assertIndexed(prefix_matches(
+                model.objects.filter(user=self.user), 'tag 1')[:10])
+
+    def test_name_lookup_is_indexed(self):
+        """Test looking tags up by user and name uses an index."""
+        self.assertIndexed(models.Tags.objects.filter(
+            user=self.user, name__in=['Tag 1', 'Tag 2']))
@@ -0,0 +1,127 @@
+"""
+Tests for request performance instrumentation.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.urls import path, reverse
+from rest_framework.test import APIClient
+
+from core.instrumentation import registry
+from core.models import Recipe, Tags
+
+PERF = {'ENABLED': True, 'SAMPLE_RATE': 1.0, 'N_PLUS_ONE_THRESHOLD': 5}
+
+
+def tag_per_row(request):
+    for pk in range(6):
+        Tags.objects.filter(pk=pk).exists()
+    return HttpResponse('ok')
+
+
+urlpatterns = [
+    path('per-row/', tag_per_row),
+]
+
+
+@override_settings(PERF_INSTRUMENTATION=PERF)
+class InstrumentationTests(TestCase):
+    """Test requests are measured per view and action."""
+
+    def setUp(self):
+        registry.clear()
+        self.addCleanup(registry.clear)
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'test123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        tag = Tags.objects.create(user=self.user, name='Vegan')
+        for i in range(6):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Soup {i}', time_minutes=5,
+                price=Decimal('1.00'))
+            recipe.tags.add(tag)
+
+    def test_server_timing(self):
+        """Test responses carry their timings in Server-Timing."""
+        res = self.client.get(reverse('recipe:recipe-list'))
+
+        timing = res['Server-Timing']
+        for name in ('total;dur=', 'db;dur=', 'serialize;dur=',
+                     'render;dur='):
+            self.assertIn(name, timing)
+        self.assertRegex(timing, r'desc="[1-9]\d* queries"')
+
+    def test_recorded_per_view_and_action(self):
+        """Test measurements are aggregated per view and action."""
+        res = self.client.get(reverse('recipe:recipe-list'))
+
+        entry = registry.snapshot()[('RecipeViewSet', 'list')]
+        self.assertEqual(entry['count'], 1)
+        self.assertGreater(entry['queries'], 0)
+        self.assertEqual(entry['response_bytes'], len(res.content))
+        self.assertEqual(entry['n_plus_one'], 0)
+
+    @override_settings(PERF_INSTRUMENTATION={**PERF, 'METRICS_TOKEN': 's3'})
+    def test_prometheus_endpoint(self):
+        """Test the metrics are exported in the Prometheus format."""
+        self.client.get(reverse('recipe:recipe-list'))
+
+        res = self.client.get(reverse('metrics'),
+                              HTTP_AUTHORIZATION='Bearer s3')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        body = res.content.decode()
+        self.assertIn('# TYPE app_request_duration_seconds histogram', body)
+        self.assertIn(
+            'app_request_duration_seconds_count'
+            '{view="RecipeViewSet",action="list"} 1', body)
+        self.assertIn('app_request_db_queries_total{view="RecipeViewSet"',
+                      body)
+
+    @override_settings(PERF_INSTRUMENTATION={**PERF, 'METRICS_TOKEN': 's3'})
+    def test_prometheus_token(self):
+        """Test a configured token is required to scrape."""
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+
+        res = self.client.get(reverse('metrics'),
+                              HTTP_AUTHORIZATION='Bearer s4')
+        self.assertEqual(res.status_code, 401)
+
+        res = self.client.get(reverse('metrics'),
+                              HTTP_AUTHORIZATION='Bearer s3')
+        self.assertEqual(res.status_code, 200)
+
+    def test_prometheus_without_token_staff_only(self):
+        """Test without a token set only staff sessions can scrape."""
+        res = self.client.get(reverse('metrics'),
+                              HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(res.status_code, 401)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    @override_settings(PERF_INSTRUMENTATION={**PERF, 'SAMPLE_RATE': 0})
+    def test_unsampled_requests_untouched(self):
+        """Test requests outside the sample are not measured."""
+        res = self.client.get(reverse('recipe:recipe-list'))
+
+        self.assertNotIn('Server-Timing', res)
+        self.assertEqual(registry.snapshot(), {})
+
+    @override_settings(ROOT_URLCONF=__name__)
+    def test_repeated_queries_flagged(self):
+        """Test a statement run per result is logged and counted."""
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.client.get('/per-row/')
+
+        self.assertIn('Possible N+1 queries', logs.output[0])
+        entry = registry.snapshot()[(f'{__name__}.tag_per_row', 'GET')]
+        self.assertEqual(entry['n_plus_one'], 1)
@@ -0,0 +1,168 @@
+"""
+Tests for serving uploaded media.
+"""
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.views import byte_range
+
+DIGEST = 'ab' + '0' * 62
+ORIGINAL = f'blobs/ab/{DIGEST}.jpg'
+THUMBNAIL = f'blobs/ab/{DIGEST}_thumbnail.jpg'
+
+
+def media_url(name):
+    return reverse('media', args=[name])
+
+
+class ByteRangeTests(TestCase):
+    """Test parsing Range headers."""
+
+    def test_ranges(self):
+        """Test single ranges are clamped to the file."""
+        self.assertEqual(byte_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(byte_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(byte_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(byte_range('bytes=50-500', 100), (50, 99))
+
+    def test_whole_file(self):
+        """Test missing, malformed and multiple ranges send everything."""
+        for header in (None, 'bytes=-', 'items=0-1', 'bytes=0-1,5-6',
+                       'bytes=9-1'):
+            self.assertIsNone(byte_range(header, 100))
+
+    def test_unsatisfiable(self):
+        """Test ranges past the end of the file are refused."""
+        for header in ('bytes=100-', 'bytes=-0'):
+            with self.assertRaises(ValueError):
+                byte_range(header, 100)
+
+
+class ServeMediaTests(TestCase):
+    """Test the media view."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.write(ORIGINAL, b'0123456789')
+        self.write(THUMBNAIL, b'thumbnail')
+
+    def write(self, name, content):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(content)
+
+    def test_serve_file(self):
+        """Test a file is streamed with validators and its type."""
+        res = self.client.get(media_url(ORIGINAL))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b''.join(res.streaming_content), b'0123456789')
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['Content-Length'], '10')
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertIn('ETag', res)
+        self.assertIn('Last-Modified', res)
+
+    def test_serve_range(self):
+        """Test a byte range is served as partial content."""
+        res = self.client.get(media_url(ORIGINAL), HTTP_RANGE='bytes=2-5')
+
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(b''.join(res.streaming_content), b'2345')
+        self.assertEqual(res['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(res['Content-Length'], '4')
+
+    def test_unsatisfiable_range(self):
+        """Test a range past the end of the file is refused."""
+        res = self.client.get(media_url(ORIGINAL), HTTP_RANGE='bytes=10-')
+
+        self.assertEqual(res.status_code, 416)
+        self.assertEqual(res['Content-Range'], 'bytes */10')
+
+    def test_stale_if_range_sends_file(self):
+        """Test a range is ignored when If-Range no longer matches."""
+        res = self.client.get(
+            media_url(ORIGINAL), HTTP_RANGE='bytes=2-5',
+            HTTP_IF_RANGE='"stale"')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b''.join(res.streaming_content), b'0123456789')
+
+    def test_not_modified(self):
+        """Test a matching If-None-Match gets an empty 304."""
+        etag = self.client.get(media_url(ORIGINAL))['ETag']
+
+        res = self.client.get(media_url(ORIGINAL), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_cache_headers(self):
+        """Test blobs and their variants are immutable, other files not."""
+        res = self.client.get(media_url(ORIGINAL))
+        self.assertIn('immutable', res['Cache-Control'])
+        self.assertIn('max-age=31536000', res['Cache-Control'])
+
+        res = self.client.get(media_url(THUMBNAIL))
+        self.assertIn('immutable', res['Cache-Control'])
+
+        self.write('uploads/recipe/photo.jpg', b'photo')
+        res = self.client.get(media_url('uploads/recipe/photo.jpg'))
+        self.assertIn('no-cache', res['Cache-Control'])
+
+    def test_webp_negotiated(self):
+        """Test clients accepting WebP get the WebP copy of an image."""
+        self.write(f'blobs/ab/{DIGEST}_thumbnail.webp', b'webp')
+
+        res = self.client.get(media_url(THUMBNAIL), HTTP_ACCEPT='image/webp')
+        self.assertEqual(b''.join(res.streaming_content), b'webp')
+        self.assertEqual(res['Content-Type'], 'image/webp')
+        self.assertEqual(res['Vary'], 'Accept')
+
+        res = self.client.get(media_url(THUMBNAIL), HTTP_ACCEPT='image/*')
+        self.assertEqual(b''.join(res.streaming_content), b'thumbnail')
+
+    @override_settings(MEDIA_SERVING={
+        'SENDFILE': 'x-accel-redirect', 'ACCEL_PREFIX': '/protected/'})
+    def test_accel_redirect(self):
+        """Test the transfer is handed to nginx with X-Accel-Redirect."""
+        res = self.client.get(media_url(ORIGINAL))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['X-Accel-Redirect'], f'/protected/{ORIGINAL}')
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res.content, b'')
+
+    @override_settings(MEDIA_SERVING={'SENDFILE': 'x-sendfile'})
+    def test_sendfile(self):
+        """Test the transfer is handed to the server with X-Sendfile."""
+        res = self.client.get(media_url(ORIGINAL))
+
+        self.assertEqual(
+            res['X-Sendfile'], os.path.join(self.media_root, ORIGINAL))
+
+    def test_hidden_and_missing_files(self):
+        """Test hidden, unprocessed, missing and escaping paths 404."""
+        self.write('blobs/.gc-cursor', b'00')
+
+        self.write(f'incoming/ab/{DIGEST}.jpg', b'with exif')
+
+        for name in ('blobs/.gc-cursor', 'blobs/ab/missing.jpg',
+                     '../etc/passwd', 'blobs', f'incoming/ab/{DIGEST}.jpg'):
+            res = self.client.get(media_url(name))
+            self.assertEqual(res.status_code, 404)
+
+    def test_post_not_allowed(self):
+        """Test media is read only."""
+        res = self.client.post(media_url(ORIGINAL))
+
+        self.assertEqual(res.status_code, 405)
@@ -97,3 +97,13 @@ class MotelTest(TestCase):
 
         exp_path = f'uploads/recipe/{uuid}.jpg'
         self.assertEqual(file_path, exp_path)
+
+    def test_updated_at_changes_on_save(self):
+        """Test tags record when they were last modified."""
+        tag = models.Tags.objects.create(user=create_user(), name='Tag')
+        created = tag.updated_at
+
+        tag.name = 'New name'
+        tag.save()
+
+        self.assertGreater(tag.updated_at, created)
@@ -0,0 +1,151 @@
+"""
+Tests for database connection reuse and pooling.
+"""
+import threading
+from unittest import skipUnless
+
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase
+
+from core.db.pool import ConnectionPool, PoolTimeout, close_pools
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """Test the connection pool."""
+
+    def make_pool(self, **kwargs):
+        return ConnectionPool(FakeConnection, **kwargs)
+
+    def test_connections_reused(self):
+        """Test released connections are handed out again."""
+        pool = self.make_pool()
+        first = pool.acquire()
+        pool.release(first)
+
+        self.assertIs(pool.acquire(), first)
+        stats = pool.stats()
+        self.assertEqual(stats['opened'], 1)
+        self.assertEqual(stats['reused'], 1)
+        self.assertEqual(stats['in_use'], 1)
+
+    def test_timeout_when_exhausted(self):
+        """Test callers give up once max_size are in use too long."""
+        pool = self.make_pool(max_size=1, timeout=0.01)
+        pool.acquire()
+
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_waiters_get_released_connections(self):
+        """Test a waiting caller gets the connection released next."""
+        pool = self.make_pool(max_size=1, timeout=5)
+        held = pool.acquire()
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(
+            pool.acquire()))
+        waiter.start()
+        while not pool.stats()['waits']:
+            threading.Event().wait(0.001)
+
+        pool.release(held)
+        waiter.join()
+
+        self.assertEqual(acquired, [held])
+
+    def test_idle_connections_checked(self):
+        """Test connections failing their check are replaced."""
+        pool = self.make_pool(check=lambda conn: False, check_after=0)
+        broken = pool.acquire()
+        pool.release(broken)
+
+        replacement = pool.acquire()
+
+        self.assertIsNot(replacement, broken)
+        self.assertTrue(broken.closed)
+        self.assertEqual(pool.stats()['failed_checks'], 1)
+        self.assertEqual(pool.size, 1)
+
+    def test_old_connections_closed(self):
+        """Test connections past max_idle are closed instead of reused."""
+        pool = self.make_pool(max_idle=-1)
+        old = pool.acquire()
+        pool.release(old)
+
+        self.assertIsNot(pool.acquire(), old)
+        self.assertTrue(old.closed)
+
+    def test_discard_frees_slot(self):
+        """Test discarded connections are closed and free their slot."""
+        pool = self.make_pool(max_size=1, timeout=0.01)
+        broken = pool.acquire()
+        pool.release(broken, discard=True)
+
+        self.assertTrue(broken.closed)
+        self.assertIsNot(pool.acquire(), broken)
+
+    def test_fill_and_close(self):
+        """Test fill opens min_size connections and close drops them."""
+        pool = self.make_pool(min_size=2)
+        pool.fill()
+        self.assertEqual(pool.stats()['idle'], 2)
+
+        in_use = pool.acquire()
+        pool.close()
+        pool.release(in_use)
+
+        self.assertEqual(pool.size, 0)
+        self.assertTrue(in_use.closed)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'PostgreSQL only.')
+class BackendTests(TestCase):
+    """Test the PostgreSQL backend reuses connections."""
+
+    def make_wrapper(self, **settings):
+        default = connections['default']
+        wrapper = type(default)(
+            {**default.settings_dict, **settings}, alias='pool-test')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_pooled_connection_returned(self):
+        """Test closing returns the connection to the pool."""
+        wrapper = self.make_wrapper(POOL={'ENABLED': True, 'MAX_SIZE': 1})
+        self.addCleanup(close_pools)
+        wrapper.ensure_connection()
+        raw = wrapper.connection
+
+        wrapper.close_if_unusable_or_obsolete()
+        self.assertIsNone(wrapper.connection)
+        self.assertFalse(raw.closed)
+
+        wrapper.ensure_connection()
+        self.assertIs(wrapper.connection, raw)
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            self.assertEqual(cursor.fetchone(), (1,))
+
+    def test_broken_connection_replaced(self):
+        """Test a kept connection failing its health check is replaced."""
+        wrapper = self.make_wrapper(
+            CONN_MAX_AGE=60, CONN_HEALTH_CHECKS=True, POOL=None)
+        wrapper.ensure_connection()
+        broken = wrapper.connection
+        wrapper.close_if_unusable_or_obsolete()
+        self.assertIs(wrapper.connection, broken)
+
+        broken.close()
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+        self.assertIsNot(wrapper.connection, broken)
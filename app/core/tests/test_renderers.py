@@ -0,0 +1,149 @@
+"""
+Tests for the orjson and MessagePack renderers and parsers.
+"""
+import datetime
+import io
+from decimal import Decimal
+
+import msgpack
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.parsers import MessagePackParser, ORJSONParser
+from core.renderers import MessagePackRenderer, ORJSONRenderer
+
+PAYLOAD = {
+    'id': 1,
+    'title': 'Crème brûlée\u2028',
+    'price': '5.25',
+    'tags': [{'id': 2, 'name': 'Dessert'}],
+    'link': None,
+    'ratio': 0.5,
+    'updated_at': datetime.datetime(
+        2021, 5, 1, 12, 30, tzinfo=datetime.timezone.utc),
+    'day': datetime.date(2021, 5, 1),
+    'label': gettext_lazy('Recipe'),
+}
+
+
+class RendererTests(SimpleTestCase):
+    """Test the renderers match DRF's output."""
+
+    def test_json_matches_drf(self):
+        """Test orjson renders the same bytes as DRF's JSONRenderer."""
+        self.assertEqual(ORJSONRenderer().render(PAYLOAD),
+                         JSONRenderer().render(PAYLOAD))
+
+    def test_json_decimal_as_string(self):
+        """Test decimals keep every digit."""
+        rendered = ORJSONRenderer().render({'price': Decimal('12.10')})
+
+        self.assertEqual(rendered, b'{"price":"12.10"}')
+
+    def test_json_indent(self):
+        """Test an indent in the media type pretty prints."""
+        rendered = ORJSONRenderer().render(
+            {'id': 1}, 'application/json; indent=2')
+
+        self.assertEqual(rendered, b'{\n  "id": 1\n}')
+
+    def test_json_other_indents_use_drf(self):
+        """Test indents orjson lacks are rendered by DRF."""
+        for indent in (0, 4):
+            media_type = f'application/json; indent={indent}'
+            self.assertEqual(ORJSONRenderer().render(PAYLOAD, media_type),
+                             JSONRenderer().render(PAYLOAD, media_type))
+        self.assertIn(b'\n    "id": 1', ORJSONRenderer().render(
+            {'id': 1}, 'application/json; indent=4'))
+
+    def test_json_falls_back_to_drf(self):
+        """Test data orjson refuses is rendered by DRF."""
+        self.assertEqual(ORJSONRenderer().render({1: 'one'}), b'{"1":"one"}')
+
+    def test_msgpack_round_trip(self):
+        """Test MessagePack renders what JSON renders."""
+        rendered = MessagePackRenderer().render(PAYLOAD)
+
+        self.assertEqual(msgpack.unpackb(rendered),
+                         ORJSONParser().parse(io.BytesIO(
+                             ORJSONRenderer().render(PAYLOAD))))
+
+    def test_msgpack_decimal_as_string(self):
+        """Test decimals are packed as strings."""
+        rendered = MessagePackRenderer().render({'price': Decimal('12.10')})
+
+        self.assertEqual(msgpack.unpackb(rendered), {'price': '12.10'})
+
+
+class ParserTests(SimpleTestCase):
+    """Test the parsers."""
+
+    def test_json_parse(self):
+        """Test JSON bodies are parsed."""
+        data = ORJSONParser().parse(io.BytesIO(b'{"price": 5.25, "a": [1]}'))
+
+        self.assertEqual(data, {'price': 5.25, 'a': [1]})
+
+    def test_json_other_encoding(self):
+        """Test the request charset is honoured."""
+        data = ORJSONParser().parse(
+            io.BytesIO('{"name": "Crème"}'.encode('latin-1')),
+            parser_context={'encoding': 'latin-1'})
+
+        self.assertEqual(data, {'name': 'Crème'})
+
+    def test_invalid_bodies(self):
+        """Test malformed bodies are parse errors."""
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"price": NaN}'))
+        with self.assertRaises(ParseError):
+            MessagePackParser().parse(io.BytesIO(b'\xc1'))
+
+
+class NegotiationTests(TestCase):
+    """Test clients pick the format with Accept and Content-Type."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'test123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_msgpack_request_and_response(self):
+        """Test recipes are created and listed in MessagePack."""
+        url = reverse('recipe:recipe-list')
+        res = self.client.post(
+            url, {'title': 'Soup', 'time_minutes': 5, 'price': '2.50'},
+            format='msgpack', HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(res.content)['price'], '2.50')
+        self.assertTrue(Recipe.objects.filter(title='Soup').exists())
+
+        res = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+
+        body = msgpack.unpackb(res.content)
+        self.assertEqual(body['results'][0]['title'], 'Soup')
+
+    def test_json_is_default(self):
+        """Test JSON stays the default format."""
+        res = self.client.get(reverse('recipe:recipe-list'))
+
+        self.assertEqual(res['Content-Type'], 'application/json')
+
+    def test_token_accepts_msgpack(self):
+        """Test the token endpoint parses every configured format."""
+        res = APIClient().post(
+            reverse('user:token'),
+            {'email': 'user@example.com', 'password': 'test123'},
+            format='msgpack')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('token', res.data)
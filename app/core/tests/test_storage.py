@@ -0,0 +1,112 @@
+"""
+Tests for the content addressed image storage.
+"""
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core.models import ImageBlob, Recipe
+from core.storage import BLOB_DIR, INCOMING_DIR
+
+
+class ContentAddressedStorageTests(TestCase):
+    """Test deduplication and reference counting of recipe images."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'test123')
+
+    def create_recipe(self, content=None):
+        recipe = Recipe(user=self.user, title='Soup', time_minutes=5,
+                        price=Decimal('1.00'))
+        if content is not None:
+            recipe.image.save('photo.JPG', ContentFile(content), save=False)
+        recipe.save()
+        return recipe
+
+    def refcount(self, recipe):
+        return ImageBlob.objects.get(name=recipe.image.name).refcount
+
+    def gc(self, *args):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('gc_images', '--grace', '0', *args,
+                         stdout=StringIO())
+
+    def test_same_content_stored_once(self):
+        """Test identical images share one blob named by their hash."""
+        first = self.create_recipe(b'same bytes')
+        second = self.create_recipe(b'same bytes')
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(
+            first.image.name,
+            rf'^{INCOMING_DIR}/[0-9a-f]{{2}}/[0-9a-f]{{64}}\.jpg$')
+        self.assertEqual(self.refcount(first), 2)
+        self.assertEqual(len(os.listdir(os.path.dirname(first.image.path))), 1)
+
+    def test_references_follow_changes(self):
+        """Test replacing and deleting images releases references."""
+        recipe = self.create_recipe(b'old bytes')
+        old_name = recipe.image.name
+
+        recipe.image.save('photo.jpg', ContentFile(b'new bytes'))
+        self.assertEqual(ImageBlob.objects.get(name=old_name).refcount, 0)
+        self.assertEqual(self.refcount(recipe), 1)
+
+        recipe.title = 'Renamed'
+        recipe.save()
+        self.assertEqual(self.refcount(recipe), 1)
+
+        new_name = recipe.image.name
+        recipe.delete()
+        self.assertEqual(ImageBlob.objects.get(name=new_name).refcount, 0)
+
+    def test_gc_deletes_unreferenced_blobs(self):
+        """Test gc_images deletes orphaned blobs and their variants."""
+        kept = self.create_recipe(b'kept bytes')
+        dropped = self.create_recipe(b'dropped bytes')
+        dropped_path = dropped.image.path
+        variant = f'{os.path.splitext(dropped.image.name)[0]}_thumbnail.jpg'
+        variant_path = dropped.image.storage.path(variant)
+        open(variant_path, 'wb').close()
+        ImageBlob.objects.filter(name=dropped.image.name).update(
+            variants={'thumbnail': variant})
+        dropped.delete()
+
+        self.gc()
+
+        self.assertFalse(ImageBlob.objects.filter(
+            name=dropped.image.name).exists())
+        self.assertFalse(os.path.exists(dropped_path))
+        self.assertFalse(os.path.exists(variant_path))
+        self.assertTrue(os.path.exists(kept.image.path))
+        self.assertEqual(self.refcount(kept), 1)
+
+    def test_gc_walks_shards_incrementally(self):
+        """Test untracked files are swept a few shards per run."""
+        recipe = self.create_recipe(b'tracked bytes')
+        shard = os.path.join(self.media_root, BLOB_DIR, '00')
+        os.makedirs(shard, exist_ok=True)
+        stray = os.path.join(shard, '.upload-interrupted.jpg')
+        open(stray, 'wb').close()
+        os.utime(stray, (0, 0))
+
+        self.gc('--shards', '1')
+        self.assertFalse(os.path.exists(stray))
+        with open(os.path.join(self.media_root, BLOB_DIR, '.gc-cursor')) as f:
+            self.assertEqual(f.read(), '01')
+
+        self.gc('--shards', '256')
+        self.assertTrue(os.path.exists(recipe.image.path))
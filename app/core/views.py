@@ -0,0 +1,220 @@
+"""
+Views for serving uploaded media.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from core import instrumentation
+from core.db import pool
+from core.storage import BLOB_DIR, INCOMING_DIR
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+NEGOTIABLE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+SENDFILE_ACCEL = 'x-accel-redirect'
+SENDFILE_APACHE = 'x-sendfile'
+
+
+def _options():
+    return getattr(settings, 'MEDIA_SERVING', {})
+
+
+class FileRange:
+    """File-like view of a byte range of an open file.
+
+    The file is positioned at the start of the range and reads stop at
+    its end, so a WSGI file_wrapper can sendfile() the range straight
+    from the descriptor and plain iteration reads only the range.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def byte_range(header, size):
+    """Return the (start, end) of a Range header, inclusive.
+
+    Returns None when the whole file should be sent, for missing,
+    malformed or multiple ranges. Raises ValueError when the range
+    starts past the end of the file.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        if int(last) == 0:
+            raise ValueError('Empty suffix range.')
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        raise ValueError('Range starts past the end of the file.')
+    if end < start:
+        return None
+    return start, end
+
+
+def _negotiate(request, name):
+    """Return the name to serve, a WebP copy when the client takes one."""
+    base, extension = posixpath.splitext(name)
+    if ('image/webp' in request.META.get('HTTP_ACCEPT', '')
+            and extension.lower() in NEGOTIABLE_EXTENSIONS):
+        webp = f'{base}.webp'
+        if os.path.isfile(safe_join(settings.MEDIA_ROOT, webp)):
+            return webp
+    return name
+
+
+def _is_immutable(name):
+    """Return whether a stored file never changes under its name.
+
+    Blobs are named by their content, and variants are rendered from
+    it the same way every time.
+    """
+    return name.startswith(f'{BLOB_DIR}/')
+
+
+def _cache_headers(response, immutable, negotiable):
+    if immutable:
+        patch_cache_control(
+            response, public=True, immutable=True,
+            max_age=_options().get('MAX_AGE', 365 * 24 * 60 * 60))
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    if negotiable:
+        patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def _offload(name, path, content_type):
+    """Return an empty response handing the transfer to the proxy."""
+    mode = _options().get('SENDFILE', '')
+    if mode == SENDFILE_ACCEL:
+        response = HttpResponse(content_type=content_type)
+        prefix = _options().get('ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(name)
+        return response
+    if mode == SENDFILE_APACHE:
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+        return response
+    return None
+
+
+def _stream(request, path, size, etag, last_modified):
+    """Return a FileResponse for the file or the requested byte range."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    header = request.META.get('HTTP_RANGE')
+    if if_range and if_range not in (etag, last_modified):
+        header = None
+    try:
+        requested = byte_range(header, size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file = open(path, 'rb')
+    if requested is None:
+        response = FileResponse(file)
+    else:
+        start, end = requested
+        response = FileResponse(FileRange(file, start, end - start + 1))
+        response.status_code = 206
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve an uploaded file with caching headers and byte ranges.
+
+    With MEDIA_SERVING['SENDFILE'] set the file is left to the proxy
+    through X-Accel-Redirect or X-Sendfile, which then handles ranges.
+    """
+    name = posixpath.normpath(path).lstrip('/')
+    # Uploads keep their metadata until they are processed.
+    if (any(part.startswith('.') for part in name.split('/'))
+            or name.startswith(f'{INCOMING_DIR}/')):
+        raise Http404('Not found.')
+    negotiable = (name.startswith(f'{BLOB_DIR}/') and
+                  name.lower().endswith(NEGOTIABLE_EXTENSIONS))
+    if negotiable:
+        name = _negotiate(request, name)
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, name)
+        stat = os.stat(full_path)
+    except (OSError, SuspiciousFileOperation):
+        raise Http404('Not found.')
+    if not os.path.isfile(full_path) or name.endswith('.tmp'):
+        raise Http404('Not found.')
+
+    etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    last_modified = http_date(stat.st_mtime)
+    immutable = _is_immutable(name)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        content_type = mimetypes.guess_type(full_path)[0]
+        response = _offload(
+            name, full_path, content_type or 'application/octet-stream')
+    if response is None:
+        response = _stream(request, full_path, stat.st_size, etag,
+                           last_modified)
+    if response.status_code in (200, 206, 304):
+        response['ETag'] = etag
+        response['Last-Modified'] = last_modified
+    return _cache_headers(response, immutable, negotiable)
+
+
+@require_safe
+def metrics(request):
+    """Return request and connection pool metrics for Prometheus.
+
+    Scrapes must send PERF_INSTRUMENTATION['METRICS_TOKEN'] as a bearer
+    token, or come from a staff session. With no token set only staff
+    can read them. Each process reports its own metrics.
+    """
+    token = instrumentation.options().get('METRICS_TOKEN')
+    authorized = token and constant_time_compare(
+        request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorized and not request.user.is_staff:
+        return HttpResponse(status=401)
+    return HttpResponse(
+        instrumentation.prometheus_text(pool.stats()),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,6 +1,36 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
 
 
 class RecipeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipe'
+
+    def ready(self):
+        from core.models import Recipe, Tags, Ingradient
+        from recipe import search
+        from recipe.caching import invalidate_owner, invalidate_new_user
+
+        for model in (Recipe, Tags, Ingradient):
+            post_save.connect(invalidate_owner, sender=model)
+            post_delete.connect(invalidate_owner, sender=model)
+        m2m_changed.connect(invalidate_owner, sender=Recipe.tags.through)
+        m2m_changed.connect(
+            invalidate_owner, sender=Recipe.ingradient.through)
+        post_save.connect(
+            invalidate_new_user, sender=settings.AUTH_USER_MODEL)
+
+        post_save.connect(search.update_recipe, sender=Recipe)
+        for model in (Tags, Ingradient):
+            post_save.connect(search.update_recipes_of_item, sender=model)
+            pre_delete.connect(search.remember_recipes_of_item, sender=model)
+            post_delete.connect(search.update_recipes_of_item, sender=model)
+        for through in (Recipe.tags.through, Recipe.ingradient.through):
+            m2m_changed.connect(
+                search.update_recipes_of_relation, sender=through)
@@ -0,0 +1,143 @@
+"""Per user response caching for recipe APIs"""
+
+import hashlib
+import threading
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import quote_etag
+from rest_framework.response import Response
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def _options():
+    return getattr(settings, 'RECIPE_RESPONSE_CACHE', {})
+
+
+def _cache():
+    return caches[_options().get('CACHE', 'default')]
+
+
+def _version_key(user_id):
+    return f'recipe-api:version:{user_id}'
+
+
+def get_version(user_id):
+    """Return the change marker of a user's recipe data.
+
+    The marker is a millisecond timestamp of the last change, so a marker
+    lost to eviction is recreated with a value never handed out before.
+    """
+    cache = _cache()
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        cache.add(_version_key(user_id), int(time.time() * 1000), None)
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+def bump_version(user_id):
+    """Move the change marker of a user forward."""
+    cache = _cache()
+    previous = cache.get(_version_key(user_id)) or 0
+    version = max(int(time.time() * 1000), previous + 1)
+    cache.set(_version_key(user_id), version, None)
+    return version
+
+
+def invalidate_user(user_id):
+    """Invalidate cached responses of a user now and after commit.
+
+    The second bump drops responses cached by readers that ran while the
+    write transaction was still open.
+    """
+    bump_version(user_id)
+    transaction.on_commit(partial(bump_version, user_id))
+
+
+def invalidate_owner(sender, instance, **kwargs):
+    """Signal receiver invalidating the cache of an object's owner."""
+    invalidate_user(instance.user_id)
+
+
+def invalidate_new_user(sender, instance, created, **kwargs):
+    """Signal receiver starting a fresh cache namespace for new users."""
+    if created:
+        bump_version(instance.pk)
+
+
+def _record(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def cache_stats():
+    """Return the response cache hit and miss counters."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+class CachedResponseMixin:
+    """Cache successful read responses per user and query.
+
+    Responses carry an ETag taken from the user's change marker, so
+    conditional requests are answered with a 304 before any query or
+    serialization runs. There is no Last-Modified: its whole seconds
+    can't tell apart a read and a write made in the same second.
+    """
+
+    def _response_cache_key(self, request):
+        params = sorted(request.query_params.lists())
+        raw = (
+            f'{request.get_host()}:{self.basename}:{self.action}:'
+            f'{self.kwargs}:{params}:{request.accepted_media_type}'
+        )
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _set_validators(self, response, etag):
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Accept', 'Authorization'])
+        return response
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        """Return a cached response or call handler and cache its data."""
+        if not _options().get('ENABLED', True):
+            return handler(request, *args, **kwargs)
+        user_id = request.user.pk
+        version = get_version(user_id)
+        digest = self._response_cache_key(request)
+        etag = quote_etag(f'{version}-{digest[:16]}')
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return self._set_validators(not_modified, etag)
+
+        cache = _cache()
+        key = f'recipe-api:response:{user_id}:{version}:{digest}'
+        data = cache.get(key)
+        if data is not None:
+            _record('hits')
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return self._set_validators(response, etag)
+
+        _record('misses')
+        response = handler(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        cache.set(key, response.data, _options().get('TIMEOUT', 300))
+        response['X-Cache'] = 'MISS'
+        return self._set_validators(response, etag)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
@@ -0,0 +1,95 @@
+"""Streaming export of a user's recipes
+
+Recipes are read through a server side cursor in chunks. Each chunk is
+rendered by the fast path reader, which loads the tags and ingredients
+of the whole chunk with one query each, and written out before the next
+one is fetched. Memory use depends on the chunk size, not on the number
+of recipes.
+"""
+
+import csv
+import io
+
+import orjson
+from django.conf import settings
+
+from core.renderers import ORJSONRenderer, default
+from recipe.fastpath import compile_reader
+from recipe.serializers import RecipeExportSerializer
+
+# Separator of the tag and ingredient names in a CSV cell.
+NAME_SEPARATOR = '|'
+
+
+def _options():
+    return getattr(settings, 'RECIPE_EXPORT', {})
+
+
+class NDJSONRenderer(ORJSONRenderer):
+    """Export format of one JSON object per line.
+
+    Exports are streamed by the view, only error responses are rendered,
+    as JSON.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class CSVRenderer(ORJSONRenderer):
+    """Export format of one CSV row per recipe, errors are JSON."""
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+def _chunks(queryset, chunk_size):
+    """Yield the rendered recipes of a queryset, chunk_size at a time."""
+    reader = compile_reader(RecipeExportSerializer())
+    rows = reader.rows(queryset).iterator(chunk_size=chunk_size)
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield reader.render(chunk)
+            chunk = []
+    if chunk:
+        yield reader.render(chunk)
+
+
+def ndjson(queryset, chunk_size):
+    """Yield recipes as lines of JSON, a chunk per item."""
+    for recipes in _chunks(queryset, chunk_size):
+        yield b''.join(
+            orjson.dumps(recipe, default=default) + b'\n'
+            for recipe in recipes)
+
+
+def csv_rows(queryset, chunk_size):
+    """Yield recipes as CSV rows under a header, a chunk per item.
+
+    Tags and ingredients are cells of names joined by NAME_SEPARATOR.
+    """
+    fields = list(RecipeExportSerializer.Meta.fields)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fields)
+    writer.writeheader()
+    for recipes in _chunks(queryset, chunk_size):
+        for recipe in recipes:
+            for name in ('tags', 'ingradient'):
+                recipe[name] = NAME_SEPARATOR.join(
+                    item['name'] for item in recipe[name])
+            writer.writerow(recipe)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Nothing to export, only the header was written.
+        yield buffer.getvalue().encode()
+
+
+WRITERS = {'ndjson': ndjson, 'csv': csv_rows}
+
+
+def export_recipes(queryset, export_format):
+    """Return the chunks of the recipes of a queryset in a format."""
+    chunk_size = _options().get('CHUNK_SIZE', 2000)
+    return WRITERS[export_format](queryset, chunk_size)
@@ -0,0 +1,165 @@
+"""Fast read path for recipe lists
+
+A ModelSerializer builds a model instance per row and walks its field
+objects, and the nested serializers, for every one of them. The reader
+here is compiled once per request from the same serializer: rows come
+from .values(), relations from one query each, and every field is
+turned into its representation by a converter picked in advance. The
+output is the same as the serializer's.
+"""
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+from core.instrumentation import span
+
+
+def enabled():
+    return getattr(settings, 'RECIPE_FAST_LIST', False)
+
+
+def _converter(field):
+    """Return a function giving the representation of a non null value."""
+    kind = type(field)
+    if kind is serializers.CharField:
+        return str
+    if kind is serializers.IntegerField:
+        return int
+    if kind is serializers.BooleanField:
+        return bool
+    if kind is serializers.FloatField:
+        return float
+    if kind is serializers.DecimalField:
+        return field.to_representation
+    return None
+
+
+def _column(model, field):
+    """Return the concrete column name a field reads, None otherwise."""
+    try:
+        model_field = model._meta.get_field(field.source)
+    except FieldDoesNotExist:
+        return None
+    if not model_field.concrete or model_field.is_relation:
+        return None
+    return model_field.attname
+
+
+def _compile_fields(model, serializer_fields):
+    """Return (name, column, converter) of fields, None if unsupported."""
+    compiled = []
+    for field in serializer_fields:
+        column = _column(model, field)
+        convert = _converter(field)
+        if column is None or convert is None:
+            return None
+        compiled.append((field.field_name, column, convert))
+    return compiled
+
+
+class Relation:
+    """Loader of one many to many relation as lists of dicts or ids."""
+
+    def __init__(self, model, field, child_fields=None):
+        model_field = model._meta.get_field(field.source)
+        self.related_model = model_field.related_model
+        self.lookup = model_field.related_query_name()
+        self.fields = child_fields
+
+    def load(self, ids):
+        """Return the representations of the related rows per owner id."""
+        columns = ['id'] if self.fields is None else [
+            column for _, column, _ in self.fields]
+        rows = self.related_model.objects.filter(
+            **{f'{self.lookup}__in': ids}
+        ).order_by('id').values_list(self.lookup, *columns)
+        groups = defaultdict(list)
+        if self.fields is None:
+            for owner, pk in rows:
+                groups[owner].append(pk)
+            return groups
+        fields = [(name, convert) for name, _, convert in self.fields]
+        for owner, *values in rows:
+            groups[owner].append({
+                name: None if value is None else convert(value)
+                for (name, convert), value in zip(fields, values)
+            })
+        return groups
+
+
+def _relation(model, field):
+    if isinstance(field, serializers.ManyRelatedField):
+        child = field.child_relation
+        if type(child) is not serializers.PrimaryKeyRelatedField:
+            return None
+        return Relation(model, field)
+    child = field.child
+    if not isinstance(child, serializers.ModelSerializer):
+        return None
+    child_fields = _compile_fields(
+        child.Meta.model, list(child._readable_fields))
+    if child_fields is None:
+        return None
+    return Relation(model, field, child_fields)
+
+
+class ListReader:
+    """Representations of many rows, compiled from a model serializer."""
+
+    def __init__(self, model, fields):
+        # (name, column, converter) or (name, None, Relation) in order.
+        self.model = model
+        self.fields = fields
+        self.columns = list(dict.fromkeys(
+            ['id'] + [column for _, column, _ in fields if column]))
+
+    def rows(self, queryset):
+        """Return the queryset as the rows the reader renders."""
+        return queryset.prefetch_related(None).values(*self.columns)
+
+    def render(self, rows):
+        """Return the representation of the rows."""
+        with span('serialize'):
+            rows = list(rows)
+            ids = [row['id'] for row in rows]
+            loaded = {
+                name: relation.load(ids)
+                for name, column, relation in self.fields if column is None
+            }
+            data = []
+            for row in rows:
+                item = {}
+                for name, column, convert in self.fields:
+                    if column is None:
+                        item[name] = loaded[name].get(row['id'], [])
+                        continue
+                    value = row[column]
+                    item[name] = None if value is None else convert(value)
+                data.append(item)
+            return data
+
+
+def compile_reader(serializer):
+    """Return a ListReader for a serializer, None when it is unsupported.
+
+    Supported are model fields with plain conversions and many to many
+    relations rendered by model serializers or as ids.
+    """
+    model = serializer.Meta.model
+    fields = []
+    for field in serializer._readable_fields:
+        if isinstance(field, (serializers.ListSerializer,
+                              serializers.ManyRelatedField)):
+            relation = _relation(model, field)
+            if relation is None:
+                return None
+            fields.append((field.field_name, None, relation))
+            continue
+        compiled = _compile_fields(model, [field])
+        if compiled is None:
+            return None
+        fields.extend(compiled)
+    return ListReader(model, fields)
@@ -0,0 +1,51 @@
+"""Filters for recipe APIs"""
+
+from django.db.models import Count, Exists, OuterRef
+
+from core.models import Recipe
+
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+
+
+def filter_by_related(queryset, field_name, ids, match=MATCH_ANY):
+    """Filter recipes by related ids with an EXISTS subquery.
+
+    With `match='any'` recipes linked to at least one of `ids` are kept,
+    with `match='all'` only recipes linked to every one of them. Unlike
+    a join the subquery never repeats a recipe, so no distinct() is
+    needed before ordering.
+    """
+    ids = set(ids)
+    field = Recipe._meta.get_field(field_name)
+    through = field.remote_field.through
+    source = f'{field.m2m_field_name()}_id'
+    target = f'{field.m2m_reverse_field_name()}_id'
+
+    def linked_to(target_ids):
+        return Exists(through.objects.filter(
+            **{source: OuterRef('pk'), f'{target}__in': target_ids}))
+
+    if match == MATCH_ALL:
+        # One semi-join per id lets the planner start from the rarest.
+        for target_id in ids:
+            queryset = queryset.filter(linked_to([target_id]))
+        return queryset
+    return queryset.filter(linked_to(ids))
+
+
+def filter_assigned(queryset, field_name):
+    """Keep tags or ingredients used by at least one recipe."""
+    field = Recipe._meta.get_field(field_name)
+    target = f'{field.m2m_reverse_field_name()}_id'
+    return queryset.filter(Exists(field.remote_field.through.objects.filter(
+        **{target: OuterRef('pk')})))
+
+
+def annotate_recipe_count(queryset):
+    """Annotate tags or ingredients with the number of recipes using them.
+
+    The count is one grouped aggregate over the through table, the
+    recipe table itself is never joined.
+    """
+    return queryset.annotate(recipe_count=Count('recipe'))
@@ -0,0 +1,227 @@
+"""Background processing of uploaded recipe images"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.models import ImageBlob, ImageJob, ImageStatus, Recipe
+from core.storage import BLOB_DIR
+from recipe.imaging import render_variants, webp_supported
+
+logger = logging.getLogger(__name__)
+
+BACKEND_SYNC = 'sync'
+BACKEND_MEMORY = 'memory'
+BACKEND_DATABASE = 'database'
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _options():
+    return getattr(settings, 'RECIPE_IMAGES', {})
+
+
+def get_pool():
+    """Return the process pool rendering image variants."""
+    with _pools_lock:
+        if 'render' not in _pools:
+            _pools['render'] = ProcessPoolExecutor(
+                max_workers=_options().get('WORKERS', 2))
+        return _pools['render']
+
+
+def _get_dispatcher():
+    """Return the threads waiting on renders for the memory backend."""
+    with _pools_lock:
+        if 'dispatch' not in _pools:
+            _pools['dispatch'] = ThreadPoolExecutor(
+                max_workers=_options().get('WORKERS', 2),
+                thread_name_prefix='recipe-images')
+        return _pools['dispatch']
+
+
+def _render_call(source):
+    """Return the render_variants call for a source file."""
+    webp = _options().get('WEBP', True) and webp_supported()
+    return partial(
+        render_variants, source,
+        _options().get('SIZES', {'thumbnail': 200, 'medium': 800}),
+        _options().get('QUALITY', 85), webp, _storage().path(BLOB_DIR))
+
+
+def _storage():
+    return Recipe._meta.get_field('image').storage
+
+
+def _storage_names(paths):
+    location = _storage().location
+    return {
+        key: os.path.relpath(path, location) for key, path in paths.items()
+    }
+
+
+def rendered_variants(image_name):
+    """Return the variants rendered before for the same image blob.
+
+    For uploads processed before, `original` names the blob of their
+    copy without metadata.
+    """
+    blob = ImageBlob.objects.filter(name=image_name).values(
+        'variants', 'cleaned').first()
+    if blob is None:
+        return None
+    if blob['cleaned']:
+        variants = rendered_variants(blob['cleaned'])
+        return variants and {'original': blob['cleaned'], **variants}
+    return blob['variants'] or None
+
+
+def _set_status(recipe, status, variants=None):
+    recipe.image_status = status
+    recipe.image_variants = dict(variants or {})
+    fields = ['image_status', 'image_variants']
+    original = recipe.image_variants.pop('original', None)
+    if original:
+        # The reference moves from the upload to the stripped copy.
+        recipe.image = original
+        fields.append('image')
+    # save() keeps the response cache invalidation signals firing.
+    recipe.save(update_fields=fields)
+
+
+def start(recipe_id, image_name):
+    """Mark an image as processing and return its path.
+
+    Returns None when the recipe is gone or has a newer image since.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id, image=image_name).first()
+    if recipe is None:
+        return None
+    _set_status(recipe, ImageStatus.PROCESSING)
+    return _storage().path(image_name)
+
+
+def finish(recipe_id, image_name, variants=None):
+    """Record the variants of an image blob and its recipe, or a failure.
+
+    Variants stay with the blob when the recipe moved on, other recipes
+    with the same image reuse them. The copy without metadata becomes a
+    blob of its own that has the variants, the upload only points to it.
+    """
+    if variants:
+        original = variants['original']
+        rendered = {
+            name: path for name, path in variants.items()
+            if name != 'original'
+        }
+        ImageBlob.objects.update_or_create(name=original, defaults={
+            'size': _storage().size(original), 'variants': rendered})
+        ImageBlob.objects.filter(name=image_name).update(cleaned=original)
+    with transaction.atomic():
+        recipe = Recipe.objects.select_for_update().filter(
+            pk=recipe_id, image=image_name).first()
+        if recipe is not None:
+            status = ImageStatus.READY
+            if variants is None:
+                status = ImageStatus.FAILED
+            _set_status(recipe, status, variants)
+
+
+def process(recipe_id, image_name, pool=None):
+    """Render the variants of an image, in pool when given."""
+    source = start(recipe_id, image_name)
+    if source is None:
+        return
+    render = _render_call(source)
+    try:
+        paths = render() if pool is None else pool.submit(render).result()
+    except Exception:
+        logger.exception('Processing image %s failed.', image_name)
+        paths = None
+    finish(recipe_id, image_name, paths and _storage_names(paths))
+
+
+def _process_in_thread(recipe_id, image_name):
+    try:
+        process(recipe_id, image_name, get_pool())
+    finally:
+        connection.close()
+
+
+def enqueue(recipe):
+    """Queue processing of a recipe's newly saved image.
+
+    An image stored before is ready right away with the variants of its
+    blob. Otherwise the sync backend renders right away, the memory
+    backend after the transaction commits on threads of this process,
+    and the database backend leaves an ImageJob for process_images.
+    """
+    variants = rendered_variants(recipe.image.name)
+    if variants:
+        _set_status(recipe, ImageStatus.READY, variants)
+        return
+    backend = _options().get('BACKEND', BACKEND_MEMORY)
+    if backend == BACKEND_DATABASE:
+        ImageJob.objects.create(recipe=recipe, image=recipe.image.name)
+    elif backend == BACKEND_MEMORY:
+        transaction.on_commit(lambda: _get_dispatcher().submit(
+            _process_in_thread, recipe.pk, recipe.image.name))
+    else:
+        process(recipe.pk, recipe.image.name)
+
+
+def claim_jobs(limit):
+    """Lock up to limit queued jobs for this worker and return them."""
+    now = timezone.now()
+    timeout = timedelta(seconds=_options().get('LOCK_TIMEOUT', 300))
+    with transaction.atomic():
+        jobs = list(ImageJob.objects.select_for_update(
+            skip_locked=True,
+        ).filter(
+            Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+        ).order_by('id')[:limit])
+        ImageJob.objects.filter(id__in=[job.id for job in jobs]).update(
+            locked_until=now + timeout, attempts=F('attempts') + 1)
+    for job in jobs:
+        job.attempts += 1
+    return jobs
+
+
+def run_jobs(jobs, pool=None):
+    """Process claimed jobs, rendering concurrently in pool when given.
+
+    Failed renders are retried by later claims until MAX_ATTEMPTS.
+    """
+    running = []
+    for job in jobs:
+        source = start(job.recipe_id, job.image)
+        variants = source and rendered_variants(job.image)
+        if source is None or variants:
+            if variants:
+                finish(job.recipe_id, job.image, variants)
+            job.delete()
+            continue
+        render = _render_call(source)
+        running.append((job, render if pool is None else pool.submit(render)))
+
+    max_attempts = _options().get('MAX_ATTEMPTS', 3)
+    for job, render in running:
+        try:
+            paths = render() if pool is None else render.result()
+        except Exception:
+            logger.exception('Processing image %s failed.', job.image)
+            if job.attempts < max_attempts:
+                ImageJob.objects.filter(pk=job.pk).update(locked_until=None)
+                continue
+            paths = None
+        finish(job.recipe_id, job.image, paths and _storage_names(paths))
+        job.delete()
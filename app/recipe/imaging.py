@@ -0,0 +1,102 @@
+"""Pillow rendering of recipe image variants
+
+Nothing here touches Django, so the functions can run in a process pool.
+"""
+
+import hashlib
+import os
+import shutil
+
+from PIL import Image, ImageOps, features
+
+ORIGINAL_QUALITY = 90
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+
+
+def webp_supported():
+    """Return whether Pillow was built with WebP support."""
+    return features.check('webp')
+
+
+def _save(image, path, image_format, quality):
+    """Save image without metadata other than the color profile."""
+    params = {'exif': b''}
+    if image_format == 'JPEG':
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        params.update(quality=quality, optimize=True, progressive=True)
+    elif image_format == 'WEBP':
+        params.update(quality=quality, method=4)
+    else:
+        params.update(optimize=True)
+    if 'icc_profile' in image.info:
+        params['icc_profile'] = image.info['icc_profile']
+    # Variants of a shared blob may be read while they are rendered again,
+    # so they are replaced atomically.
+    temporary = f'{path}.{os.getpid()}.tmp'
+    image.save(temporary, format=image_format, **params)
+    os.replace(temporary, path)
+
+
+def _store_blob(temporary, root, extension):
+    """Move a file into root as a blob named by its SHA-256.
+
+    Blobs are sharded by the first two digits of their digest.
+    """
+    sha256 = hashlib.sha256()
+    with open(temporary, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 16), b''):
+            sha256.update(chunk)
+    digest = sha256.hexdigest()
+    directory = os.path.join(root, digest[:2])
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, digest + extension)
+    os.replace(temporary, path)
+    return path
+
+
+def render_variants(source, sizes, quality=85, webp=True, root=None):
+    """Write a copy of an uploaded image without EXIF and its variants.
+
+    The source is left as it is, its name is the hash of its content.
+    The copy, turned upright and without metadata, is a blob of its own
+    in root, the directory of the source's shard by default, returned
+    as `original`, and the variants are written beside it. Formats that
+    can't be rewritten, which carry no EXIF, are copied as they are.
+
+    `sizes` maps variant names to the longest side in pixels. JPEG
+    sources give JPEG variants, anything else PNG. With `webp` every
+    variant and the full size image also get a WebP copy. Returns a
+    dict of variant name to file path.
+    """
+    with Image.open(source) as opened:
+        # Phone cameras write multi picture JPEGs, keep the first frame.
+        source_format = 'JPEG' if opened.format == 'MPO' else opened.format
+        image = ImageOps.exif_transpose(opened)
+        image.load()
+
+    image_format = 'JPEG' if source_format == 'JPEG' else 'PNG'
+    root = root or os.path.dirname(os.path.dirname(source))
+    temporary = f'{os.path.splitext(source)[0]}.{os.getpid()}.original.tmp'
+    if source_format in EXTENSIONS:
+        _save(image, temporary, source_format, ORIGINAL_QUALITY)
+        extension = EXTENSIONS[source_format]
+    else:
+        shutil.copyfile(source, temporary)
+        extension = os.path.splitext(source)[1].lower()
+    original = _store_blob(temporary, root, extension)
+    variants = {'original': original}
+    base, extension = os.path.splitext(original)
+
+    if webp and extension != '.webp':
+        variants['webp'] = f'{base}.webp'
+        _save(image, variants['webp'], 'WEBP', quality)
+    for name, size in sizes.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), reducing_gap=3.0)
+        variants[name] = f'{base}_{name}{EXTENSIONS[image_format]}'
+        _save(resized, variants[name], image_format, quality)
+        if webp:
+            variants[f'{name}_webp'] = f'{base}_{name}.webp'
+            _save(resized, variants[f'{name}_webp'], 'WEBP', quality)
+    return variants
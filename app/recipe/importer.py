@@ -0,0 +1,307 @@
+"""Bulk import of recipes
+
+Records have the shape of the export, as NDJSON or CSV. They are
+validated a batch at a time by one serializer, and each batch is written
+in a transaction with the checkpoint of its import, so an interrupted
+import resumes after the last batch written. An import is claimed on its
+locked row, so one checkpoint is only run by one process at a time.
+
+Tags and ingredients are upserted by (user, name). On Postgres, recipes
+and their relations are loaded with COPY, into ids taken from the
+sequence beforehand; other backends use bulk_create_recipes and
+bulk_create.
+"""
+
+import csv
+import datetime
+import io
+
+import orjson
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from core.models import (
+    ImageStatus,
+    ImportStatus,
+    Ingradient,
+    Recipe,
+    RecipeImport,
+    Tags,
+)
+from recipe.caching import invalidate_user
+from recipe.export import NAME_SEPARATOR
+from recipe.search import update_search_vectors
+from recipe.serializers import (
+    RecipeExportSerializer,
+    TagsSerializer,
+    bulk_create_recipes,
+    resolve_names,
+)
+
+RELATIONS = {'tags': Tags, 'ingradient': Ingradient}
+NAME_CACHE_SIZE = 10000
+COPY_COLUMNS = (
+    'id', 'user_id', 'title', 'time_minutes', 'price', 'description',
+    'link', 'image_status', 'image_variants')
+
+
+class ImportRunning(Exception):
+    """The import is already being run by another process."""
+
+
+def _options():
+    return getattr(settings, 'RECIPE_IMPORT', {})
+
+
+def _uses_copy():
+    return connection.vendor == 'postgresql'
+
+
+def _split(data):
+    """Split the relation cells of a CSV row into lists of names."""
+    for name in RELATIONS:
+        value = data.get(name)
+        if isinstance(value, str):
+            data[name] = value.split(NAME_SEPARATOR) if value else []
+    return data
+
+
+def read_ndjson(stream):
+    """Yield (record, error) of the lines of a binary stream."""
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield orjson.loads(line), None
+        except orjson.JSONDecodeError as exc:
+            yield None, f'Invalid JSON: {exc}'
+
+
+def read_csv(stream):
+    """Yield (record, error) of the rows of a binary CSV stream."""
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    reader = csv.DictReader(text)
+    while True:
+        # Rows too long or malformed fail alone, the reader goes on.
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as exc:
+            yield None, f'Invalid CSV: {exc}'
+            continue
+        if None in row:
+            yield None, 'More cells than columns.'
+            continue
+        yield _split(row), None
+
+
+READERS = {'ndjson': read_ndjson, 'csv': read_csv}
+
+
+def _copy(cursor, table, columns, rows):
+    """Load rows into a table with COPY."""
+    buffer = io.StringIO()
+    # Every value quoted, unquoted empty values would be NULL.
+    csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(rows)
+    buffer.seek(0)
+    quote = connection.ops.quote_name
+    cursor.copy_expert(
+        f'COPY {quote(table)} ({", ".join(map(quote, columns))}) '
+        f'FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+class RecipeImporter:
+    """Import records for a user, checkpointed in a RecipeImport."""
+
+    def __init__(self, job, batch_size=None, progress=None):
+        options = _options()
+        self.job = job
+        self.user = job.user
+        self.batch_size = batch_size or options.get('BATCH_SIZE', 1000)
+        self.max_errors = options.get('MAX_ERRORS', 100)
+        self.progress = progress
+        # Relations are checked name by name, nested serializers would
+        # cost more than the rest of the validation.
+        self.serializer = RecipeExportSerializer(fields=[
+            name for name in RecipeExportSerializer.Meta.fields
+            if name not in RELATIONS])
+        # Tag and ingredient names have the same rules.
+        self.name_field = TagsSerializer().fields['name']
+        self._valid_names = {}
+
+    def run(self, records):
+        """Import (record, error) pairs after the checkpoint."""
+        if not self._claim():
+            return self.job
+        try:
+            batch = []
+            for number, (record, error) in enumerate(records, 1):
+                if number <= self.job.position:
+                    continue
+                batch.append((number, record, error))
+                if len(batch) == self.batch_size:
+                    self._write(batch)
+                    batch = []
+            if batch:
+                self._write(batch)
+            self.job.status = ImportStatus.DONE
+        finally:
+            self.job.running_since = None
+            self.job.save(
+                update_fields=['status', 'running_since', 'updated_at'])
+        return self.job
+
+    def _claim(self):
+        """Mark the import as running, False when it is already done.
+
+        The row is locked and read again, so of two processes resuming
+        the same checkpoint the second one sees the first one's claim.
+        """
+        stale = timezone.now() - datetime.timedelta(
+            seconds=_options().get('STALE_AFTER', 600))
+        with transaction.atomic():
+            # Read again under the lock, another process may have
+            # claimed or advanced the import since it was loaded.
+            list(RecipeImport.objects.select_for_update().filter(
+                pk=self.job.pk).values_list('pk'))
+            self.job.refresh_from_db()
+            if self.job.status == ImportStatus.DONE:
+                return False
+            if (self.job.running_since is not None
+                    and self.job.updated_at > stale):
+                raise ImportRunning(
+                    f'Import {self.job.key} is already running.')
+            self.job.running_since = timezone.now()
+            self.job.save()
+        return True
+
+    def _validate_names(self, items):
+        """Return the names of relation items, strings or name objects."""
+        if not isinstance(items, list):
+            raise serializers.ValidationError(['Expected a list of items.'])
+        names = []
+        for item in items:
+            name = item.get('name') if isinstance(item, dict) else item
+            # Names repeat across recipes, valid ones are checked once.
+            if isinstance(name, str) and name in self._valid_names:
+                names.append(self._valid_names[name])
+                continue
+            try:
+                valid = self.name_field.run_validation(name)
+            except serializers.ValidationError as exc:
+                raise serializers.ValidationError([{'name': exc.detail}])
+            if len(self._valid_names) >= NAME_CACHE_SIZE:
+                self._valid_names.clear()
+            self._valid_names[name] = valid
+            names.append(valid)
+        return names
+
+    def _validate_record(self, record):
+        data = self.serializer.run_validation(record)
+        errors = {}
+        for name in RELATIONS:
+            try:
+                data[name] = self._validate_names(record.get(name) or [])
+            except serializers.ValidationError as exc:
+                errors[name] = exc.detail
+        if errors:
+            raise serializers.ValidationError(errors)
+        return data
+
+    def _validate(self, batch):
+        items, errors = [], []
+        for number, record, error in batch:
+            if error is None:
+                try:
+                    items.append(self._validate_record(record))
+                    continue
+                except serializers.ValidationError as exc:
+                    error = exc.detail
+            errors.append({'record': number, 'errors': error})
+        return items, errors
+
+    def _write(self, batch):
+        items, errors = self._validate(batch)
+        with transaction.atomic():
+            if items:
+                self._insert(items)
+            self.job.position = batch[-1][0]
+            self.job.imported += len(items)
+            self.job.failed += len(errors)
+            room = self.max_errors - len(self.job.errors)
+            self.job.errors += errors[:max(room, 0)]
+            self.job.save()
+            if items:
+                invalidate_user(self.user.pk)
+        if self.progress is not None:
+            self.progress(self.job)
+
+    def _insert(self, items):
+        names = {
+            name: resolve_names(model, self.user, list(dict.fromkeys(
+                relation for item in items for relation in item[name])))
+            for name, model in RELATIONS.items()
+        }
+        if _uses_copy():
+            ids = self._copy_recipes(items)
+        else:
+            ids = self._create_recipes(items)
+        for name in RELATIONS:
+            field = Recipe._meta.get_field(name)
+            rows = [
+                (recipe_id, target_id)
+                for recipe_id, item in zip(ids, items)
+                for target_id in dict.fromkeys(
+                    names[name][relation] for relation in item[name])
+            ]
+            if rows:
+                self._insert_relations(field, rows)
+        update_search_vectors(ids)
+
+    def _copy_recipes(self, items):
+        table = Recipe._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) '
+                'FROM generate_series(1, %s)', [table, 'id', len(items)])
+            ids = [row[0] for row in cursor.fetchall()]
+            _copy(cursor, table, COPY_COLUMNS, (
+                (recipe_id, self.user.pk, item['title'],
+                 item['time_minutes'], item['price'],
+                 item.get('description', ''), item.get('link', ''),
+                 ImageStatus.NONE, '{}')
+                for recipe_id, item in zip(ids, items)))
+        return ids
+
+    def _create_recipes(self, items):
+        recipes = [
+            Recipe(user=self.user, **{
+                field: value for field, value in item.items()
+                if field not in RELATIONS
+            })
+            for item in items
+        ]
+        bulk_create_recipes(recipes)
+        return [recipe.id for recipe in recipes]
+
+    def _insert_relations(self, field, rows):
+        through = field.remote_field.through
+        source = field.m2m_column_name()
+        target = field.m2m_reverse_name()
+        if _uses_copy():
+            with connection.cursor() as cursor:
+                _copy(cursor, through._meta.db_table, (source, target), rows)
+            return
+        through.objects.bulk_create(
+            [through(**{source: recipe_id, target: target_id})
+             for recipe_id, target_id in rows])
+
+
+def import_recipes(job, stream, import_format, batch_size=None,
+                   progress=None):
+    """Import a binary stream of NDJSON or CSV records into a job."""
+    importer = RecipeImporter(job, batch_size, progress)
+    return importer.run(READERS[import_format](stream))
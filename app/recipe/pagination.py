@@ -0,0 +1,48 @@
+"""Pagination for recipe APIs"""
+
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class RecipePageNumberPagination(PageNumberPagination):
+    """Offset pagination for clients that need page numbers."""
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Cursor pagination, switching to page numbers when `page` is sent."""
+    ordering = '-id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    page_number_class = RecipePageNumberPagination
+
+    def __init__(self):
+        self.page_number = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.page_number_class.page_query_param in request.query_params:
+            self.page_number = self.page_number_class()
+            return self.page_number.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.page_number is not None:
+            return self.page_number.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        page_number = self.page_number_class()
+        return parameters + [
+            parameter
+            for parameter in page_number.get_schema_operation_parameters(view)
+            if parameter['name'] == page_number.page_query_param
+        ]
+
+
+class NameCursorPagination(RecipeCursorPagination):
+    """Cursor pagination for tags and ingredients."""
+    ordering = '-name'
@@ -0,0 +1,155 @@
+"""Full text search for recipes"""
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db import connection
+from django.db.models import (
+    Case,
+    Exists,
+    F,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+    When,
+)
+
+from core.models import Recipe, Tags, Ingradient
+
+# Weights of the fields of a recipe, used for ranking with and without
+# Postgres.
+WEIGHTS = {'title': 'A', 'description': 'B', 'tags': 'C', 'ingradient': 'C'}
+FALLBACK_SCORES = {'A': 4, 'B': 2, 'C': 1}
+
+
+def _config():
+    return getattr(settings, 'RECIPE_SEARCH_CONFIG', 'english')
+
+
+def _uses_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def _related_names(field_name):
+    """Return a subquery of the space separated related names."""
+    through = Recipe._meta.get_field(field_name).remote_field.through
+    return Subquery(through.objects.filter(
+        recipe_id=OuterRef('pk'),
+    ).values('recipe_id').annotate(
+        names=StringAgg(f'{field_name}__name', ' '),
+    ).values('names'))
+
+
+def search_vector():
+    """Return the expression computing the search vector of a recipe."""
+    config = _config()
+    vector = SearchVector('title', weight=WEIGHTS['title'], config=config)
+    vector += SearchVector(
+        'description', weight=WEIGHTS['description'], config=config)
+    for field_name in ('tags', 'ingradient'):
+        vector += SearchVector(
+            _related_names(field_name), weight=WEIGHTS[field_name],
+            config=config)
+    return vector
+
+
+def update_search_vectors(recipe_ids):
+    """Recompute the stored search vectors of recipes.
+
+    `recipe_ids` is a list or a queryset of ids. The vectors are only
+    stored on Postgres, other backends search with the fallback.
+    """
+    if _uses_postgres():
+        Recipe.objects.filter(id__in=recipe_ids).update(
+            search_vector=search_vector())
+
+
+def _fallback_search(queryset, text):
+    """Search with LIKE queries where tsvector is not available."""
+    rank = Value(0)
+    for term in text.split():
+        conditions = {
+            'A': Q(title__icontains=term),
+            'B': Q(description__icontains=term),
+            'C': Q(Exists(Tags.objects.filter(
+                recipe=OuterRef('pk'), name__icontains=term))) | Q(Exists(
+                    Ingradient.objects.filter(
+                        recipe=OuterRef('pk'), name__icontains=term))),
+        }
+        match = Q()
+        for weight, condition in conditions.items():
+            match |= condition
+            rank = rank + Case(
+                When(condition, then=Value(FALLBACK_SCORES[weight])),
+                default=Value(0), output_field=IntegerField(),
+            )
+        queryset = queryset.filter(match)
+    return queryset.annotate(rank=rank)
+
+
+def search_recipes(queryset, text):
+    """Filter recipes matching text, annotated with and ordered by rank."""
+    if _uses_postgres():
+        query = SearchQuery(text, config=_config(), search_type='websearch')
+        queryset = queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query))
+    else:
+        queryset = _fallback_search(queryset, text)
+    return queryset.order_by('-rank', '-id')
+
+
+def defer_search_vector(recipe):
+    """Skip the vector update of the next save of a recipe.
+
+    For writers that set relations after the save and update the vector
+    once they are set.
+    """
+    recipe._search_vector_deferred = True
+
+
+def update_recipe(sender, instance, created, raw=False, update_fields=None,
+                  **kwargs):
+    """Signal receiver updating the vector of a saved recipe."""
+    if instance.__dict__.pop('_search_vector_deferred', False):
+        return
+    if update_fields is not None and not {'title', 'description'} & set(
+            update_fields):
+        return
+    if not raw:
+        update_search_vectors([instance.pk])
+
+
+def remember_recipes_of_item(sender, instance, **kwargs):
+    """Signal receiver storing recipes of a tag or ingredient to update."""
+    instance._search_recipe_ids = list(
+        instance.recipe_set.values_list('id', flat=True))
+
+
+def update_recipes_of_item(sender, instance, created=False, **kwargs):
+    """Signal receiver updating vectors of recipes of a tag or ingredient."""
+    if created:
+        return
+    recipe_ids = getattr(instance, '_search_recipe_ids', None)
+    if recipe_ids is None:
+        recipe_ids = instance.recipe_set.values_list('id', flat=True)
+    update_search_vectors(recipe_ids)
+
+
+def update_recipes_of_relation(sender, instance, action, reverse, pk_set,
+                               **kwargs):
+    """Signal receiver updating vectors when recipe relations change."""
+    if not reverse:
+        if action.startswith('post_'):
+            update_search_vectors([instance.pk])
+    elif action == 'pre_clear':
+        remember_recipes_of_item(sender, instance)
+    elif action == 'post_clear':
+        update_recipes_of_item(sender, instance)
+    elif action in ('post_add', 'post_remove'):
+        update_search_vectors(pk_set)
@@ -1,28 +1,233 @@
 """Serializers for recipe API"""
 
 
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
 from rest_framework import serializers
 
-from core.models import Recipe, Tags, Ingradient
+from core.instrumentation import TimedDataMixin
+from core.models import Recipe, RecipeImport, Tags, Ingradient
+from core.storage import INCOMING_DIR
+from recipe.caching import invalidate_user
+from recipe.search import defer_search_vector, update_search_vectors
 
 
-class TagsSerializer(serializers.ModelSerializer):
+def resolve_names(model, user, names):
+    """Return ids for user's `model` rows by name, creating missing ones."""
+    ids = dict(model.objects.filter(
+        user=user, name__in=names).values_list('name', 'id'))
+    missing = [name for name in names if name not in ids]
+    if missing:
+        # The unique (user, name) constraint makes this an insert on
+        # conflict do nothing, so concurrent writes can't add duplicates.
+        model.objects.bulk_create(
+            [model(user=user, name=name) for name in missing],
+            ignore_conflicts=True,
+        )
+        ids.update(model.objects.filter(
+            user=user, name__in=missing).values_list('name', 'id'))
+    return ids
+
+
+def bulk_create_recipes(recipes):
+    """Insert recipes and set their ids, batched where ids can be known.
+
+    Callers update the search vectors once relations are set.
+    """
+    with transaction.atomic():
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+        elif connection.vendor == 'sqlite':
+            Recipe.objects.bulk_create(recipes)
+            # Ids are not returned. SQLite holds the database write lock
+            # since the insert, so the new rows have the highest ids, in
+            # insertion order.
+            ids = Recipe.objects.order_by('-id').values_list(
+                'id', flat=True)[:len(recipes)]
+            for recipe, pk in zip(recipes, reversed(list(ids))):
+                recipe.id = pk
+        else:
+            # Other writers' rows can interleave with a batch, so each
+            # row is inserted on its own to learn its id.
+            for recipe in recipes:
+                defer_search_vector(recipe)
+                recipe.save(force_insert=True)
+    return recipes
+
+
+def set_recipe_relations(recipes, field_name, user, created=False):
+    """Set a many to many relation for many recipes at once.
+
+    `recipes` maps recipe ids to lists of `{'name': ...}` dicts. Through
+    rows are diffed against the current ones, so every call costs one
+    select, one delete and one insert at most. Pass `created=True` for
+    recipes that have no rows yet to skip the select and delete.
+    """
+    field = Recipe._meta.get_field(field_name)
+    through = field.remote_field.through
+    source = f'{field.m2m_field_name()}_id'
+    target = f'{field.m2m_reverse_field_name()}_id'
+
+    names = list(dict.fromkeys(
+        item['name'] for items in recipes.values() for item in items))
+    ids = resolve_names(field.related_model, user, names) if names else {}
+    wanted = {
+        (recipe_id, ids[item['name']])
+        for recipe_id, items in recipes.items() for item in items
+    }
+
+    current = {}
+    if not created:
+        current = {
+            (recipe_id, target_id): pk
+            for pk, recipe_id, target_id in through.objects.filter(
+                **{f'{source}__in': list(recipes)}
+            ).values_list('pk', source, target)
+        }
+        stale = [pk for key, pk in current.items() if key not in wanted]
+        if stale:
+            through.objects.filter(pk__in=stale).delete()
+
+    through.objects.bulk_create([
+        through(**{source: recipe_id, target: target_id})
+        for recipe_id, target_id in wanted if (recipe_id, target_id)
+        not in current
+    ], ignore_conflicts=True)
+    invalidate_user(user.pk)
+
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    """List serializer timing its representation."""
+
+
+def nested_fields(serializer):
+    """Return the names of the nested object relations of a serializer."""
+    return [
+        name for name, field in serializer.fields.items()
+        if isinstance(field, serializers.ListSerializer)
+    ]
+
+
+class FieldSelectionMixin:
+    """Serializer mixin rendering a subset of the fields.
+
+    `fields` lists the fields to render, all of them when None. `expand`
+    lists the nested relations rendered as objects, the others are
+    rendered as lists of ids; all are expanded when None. Unknown names
+    are a validation error.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if expand is not None:
+            nested = nested_fields(self)
+            self._check_names('expand', expand, nested)
+            for name in nested:
+                if name in expand:
+                    continue
+                source = self.fields[name].source
+                self.fields[name] = serializers.PrimaryKeyRelatedField(
+                    many=True, read_only=True,
+                    **({'source': source} if source != name else {}))
+        if fields is not None:
+            self._check_names('fields', fields, self.fields)
+            for name in list(self.fields):
+                if name not in fields:
+                    self.fields.pop(name)
+
+    def _check_names(self, param, names, known):
+        unknown = sorted(set(names) - set(known))
+        if unknown:
+            raise serializers.ValidationError(
+                {param: f'Unknown fields: {", ".join(unknown)}.'})
+
+
+class TagsSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     """Serializer for tags"""
     class Meta:
         model = Tags
         fields = ['id', 'name']
         read_only_fields = ['id']
+        list_serializer_class = TimedListSerializer
 
 
-class IngradientSerializer(serializers.ModelSerializer):
+class IngradientSerializer(FieldSelectionMixin,
+                           serializers.ModelSerializer):
     """serializer for Ingradient"""
     class Meta:
         model = Ingradient
         fields = ['id', 'name']
         read_only_fields = ['id']
+        list_serializer_class = TimedListSerializer
+
+
+class TagsCountSerializer(TagsSerializer):
+    """Serializer for tags with the number of recipes using them"""
+    recipe_count = serializers.IntegerField(read_only=True)
+
+    class Meta(TagsSerializer.Meta):
+        fields = TagsSerializer.Meta.fields + ['recipe_count']
+
+
+class IngradientCountSerializer(IngradientSerializer):
+    """Serializer for ingradient with the number of recipes using them"""
+    recipe_count = serializers.IntegerField(read_only=True)
+
+    class Meta(IngradientSerializer.Meta):
+        fields = IngradientSerializer.Meta.fields + ['recipe_count']
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(TimedDataMixin, serializers.ListSerializer):
+    """Write many recipes with batched queries."""
+
+    def _set_relations(self, recipes, items, user, created=False):
+        for field_name in ('tags', 'ingradient'):
+            relations = {
+                recipe.id: item[field_name]
+                for recipe, item in zip(recipes, items) if field_name in item
+            }
+            if relations:
+                set_recipe_relations(
+                    relations, field_name, user, created=created)
+
+    def create(self, validated_data):
+        user = self.context['request'].user
+        recipes = [
+            Recipe(**{
+                field: value for field, value in item.items()
+                if field not in ('tags', 'ingradient')
+            })
+            for item in validated_data
+        ]
+        with transaction.atomic():
+            bulk_create_recipes(recipes)
+            self._set_relations(recipes, validated_data, user, created=True)
+            update_search_vectors([recipe.id for recipe in recipes])
+            invalidate_user(user.pk)
+
+        return recipes
+
+    def update(self, instances, validated_data):
+        user = self.context['request'].user
+        fields = set()
+        for instance, item in zip(instances, validated_data):
+            for field, value in item.items():
+                if field not in ('tags', 'ingradient'):
+                    setattr(instance, field, value)
+                    fields.add(field)
+
+        with transaction.atomic():
+            if fields:
+                Recipe.objects.bulk_update(instances, sorted(fields))
+            self._set_relations(instances, validated_data, user)
+            update_search_vectors([instance.id for instance in instances])
+            invalidate_user(user.pk)
+
+        return instances
+
+
+class RecipeSerializer(TimedDataMixin, FieldSelectionMixin,
+                       serializers.ModelSerializer):
     """Serializer for recipe"""
     tags = TagsSerializer(many=True, required=False)
     ingradient = IngradientSerializer(many=True, required=False)
@@ -33,24 +238,22 @@ class RecipeSerializer(serializers.ModelSerializer):
             'id', 'title', 'time_minutes', 'price',
             'link', 'tags', 'ingradient']
         read_only_fields = ['id']
+        list_serializer_class = RecipeListSerializer
 
     def create(self, validated_data):
-        res = validated_data.pop('tags', [])
-        res2 = validated_data.pop('ingradient', [])
-        recipe = Recipe.objects.create(**validated_data)
+        tags = validated_data.pop('tags', [])
+        ingradients = validated_data.pop('ingradient', [])
         auth_user = self.context['request'].user
-        for tag in res:
-            tag_obj, created = Tags.objects.get_or_create(
-                user=auth_user,
-                **tag,
-            )
-            recipe.tags.add(tag_obj)
-        for ingredient in res2:
-            ingredient_obj, created = Ingradient.objects.get_or_create(
-                user=auth_user,
-                **ingredient,
-            )
-            recipe.ingradient.add(ingredient_obj)
+        recipe = Recipe(**validated_data)
+        defer_search_vector(recipe)
+        with transaction.atomic():
+            recipe.save()
+            set_recipe_relations(
+                {recipe.id: tags}, 'tags', auth_user, created=True)
+            set_recipe_relations(
+                {recipe.id: ingradients}, 'ingradient', auth_user,
+                created=True)
+            update_search_vectors([recipe.id])
 
         return recipe
 
@@ -60,42 +263,91 @@ class RecipeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 "You do not havepermission to update this recipe.")
 
-        # Update fields based on validated_data
+        tags = validated_data.pop('tags', None)
+        ingradients = validated_data.pop('ingradient', None)
         for field, value in validated_data.items():
-            if field != 'tags' and field != 'ingradient':
-                setattr(instance, field, value)
+            setattr(instance, field, value)
+        relations_changed = tags is not None or ingradients is not None
+        if relations_changed:
+            defer_search_vector(instance)
 
-        instance.save()
+        with transaction.atomic():
+            instance.save()
+            # Relations left out of the payload are kept as they are.
+            if tags is not None:
+                set_recipe_relations(
+                    {instance.id: tags}, 'tags', instance.user)
+            if ingradients is not None:
+                set_recipe_relations(
+                    {instance.id: ingradients}, 'ingradient', instance.user)
+            if relations_changed:
+                update_search_vectors([instance.id])
 
-        # Update the associated tags
-        tags_data = validated_data.get('tags', [])
-        ingradient_data = validated_data.get('ingradient', [])
-        instance.tags.set([])  # Clear existing tags
-        instance.ingradient.set([])  # Clear existing ingredients
+        return instance
 
-        for ingredient_data in ingradient_data:
-            ingredient, created = Ingradient.objects.get_or_create(
-                name=ingredient_data['name'],
-                user=instance.user)
-            instance.ingradient.add(ingredient)
 
-        for tag_data in tags_data:
-            tag, created = Tags.objects.get_or_create(name=tag_data['name'],
-                                                      user=instance.user)
-            instance.tags.add(tag)
+class RecipeExportSerializer(RecipeSerializer):
+    """Serializer for recipe exports, and imports of the same shape"""
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ['description']
 
-        return instance
+
+class RecipeImportSerializer(serializers.ModelSerializer):
+    """Serializer for the progress of recipe imports"""
+
+    class Meta:
+        model = RecipeImport
+        fields = ['key', 'status', 'position', 'imported', 'failed',
+                  'errors', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+
+class RecipeImportUploadSerializer(serializers.Serializer):
+    """Serializer for the files of recipe imports"""
+    file = serializers.FileField()
+    format = serializers.ChoiceField(['ndjson', 'csv'], required=False)
+    checkpoint = serializers.CharField(max_length=255, required=False)
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Image variant names rendered as URLs."""
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        urls = {}
+        for name, path in value.items():
+            url = default_storage.url(path)
+            urls[name] = request.build_absolute_uri(url) if request else url
+        return urls
+
+
+class RecipeImageField(serializers.ImageField):
+    """Recipe image, without a URL until the upload is processed."""
+
+    def to_representation(self, value):
+        if value and value.name.startswith(f'{INCOMING_DIR}/'):
+            return None
+        return super().to_representation(value)
 
 
 class RecipeDetailSerializer(RecipeSerializer):
+    image = RecipeImageField(allow_null=True, required=False)
+    image_variants = ImageVariantsField()
+
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description'] + ['image']
+        fields = RecipeSerializer.Meta.fields + [
+            'description', 'image', 'image_status', 'image_variants']
+        read_only_fields = RecipeSerializer.Meta.read_only_fields + [
+            'image_status']
 
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeImageSerializer(TimedDataMixin, serializers.ModelSerializer):
     """Serializer for uploading images to recipes"""
+    image = RecipeImageField()
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ['id', 'image']
-        read_only_fields = ['id']
-        extra_kwargs = {'image': {'required': True}}
+        fields = ['id', 'image', 'image_status', 'image_variants']
+        read_only_fields = ['id', 'image_status']
@@ -0,0 +1,24 @@
+"""
+Helpers shared by the recipe API tests.
+"""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def assert_fixed_query_count(testcase, url, create_item, sizes=(1, 10)):
+    """Assert GET url runs the same number of queries for every size."""
+    query_counts = []
+    created = 0
+    for size in sizes:
+        while created < size:
+            create_item()
+            created += 1
+        with CaptureQueriesContext(connection) as queries:
+            res = testcase.client.get(url)
+        testcase.assertEqual(res.status_code, 200)
+        query_counts.append(len(queries))
+
+    testcase.assertEqual(
+        len(set(query_counts)), 1,
+        f'Query count changed with result size: {query_counts}',
+    )
@@ -0,0 +1,185 @@
+"""
+Tests for the recipe API response cache.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tags
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tags-list')
+CACHE_STATS_URL = reverse('recipe:cache-stats')
+
+
+def create_user(email='user@example.com', password='test123', **params):
+    """Create and return a new user."""
+    return get_user_model().objects.create_user(email, password, **params)
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+@override_settings(RECIPE_RESPONSE_CACHE={'ENABLED': True})
+class ResponseCacheTests(TestCase):
+    """Test caching of recipe API reads."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def test_list_is_cached(self):
+        """Test a repeated list request is served from the cache."""
+        create_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(RECIPES_URL)
+
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.data, res.data)
+
+    def test_query_params_are_part_of_key(self):
+        """Test different filters are cached separately."""
+        tag = Tags.objects.create(user=self.user, name='Vegan')
+        create_recipe(user=self.user).tags.add(tag)
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(RECIPES_URL, {'tags': tag.id})
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_api_write_invalidates(self):
+        """Test creating a recipe through the API invalidates the list."""
+        self.client.get(RECIPES_URL)
+        payload = {'title': 'Soup', 'time_minutes': 5, 'price': '1.00'}
+        self.client.post(RECIPES_URL, payload)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_relation_write_invalidates(self):
+        """Test changing recipe tags invalidates the tag list."""
+        recipe = create_recipe(user=self.user)
+        self.client.get(TAGS_URL)
+
+        url = reverse('recipe:recipe-detail', args=[recipe.id])
+        self.client.patch(url, {'tags': [{'name': 'New'}]}, format='json')
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'][0]['name'], 'New')
+
+    def test_cache_is_per_user(self):
+        """Test cached responses are not shared between users."""
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        other_user = create_user(email='other@example.com')
+        self.client.force_authenticate(other_user)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'], [])
+
+    def test_cache_stats_admin_only(self):
+        """Test the cache counters are only exposed to staff."""
+        res = self.client.get(CACHE_STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = create_user(email='admin@example.com', is_staff=True)
+        self.client.force_authenticate(admin)
+        res = self.client.get(CACHE_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('hits', res.data)
+        self.assertIn('misses', res.data)
+
+    @override_settings(RECIPE_RESPONSE_CACHE={'ENABLED': False})
+    def test_disabled_cache_is_bypassed(self):
+        """Test reads run every time when the cache is off."""
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn('X-Cache', res)
+        self.assertNotIn('ETag', res)
+        self.assertEqual(len(res.data['results']), 1)
+
+
+@override_settings(RECIPE_RESPONSE_CACHE={'ENABLED': True})
+class ConditionalGetTests(TestCase):
+    """Test ETag handling of recipe API reads."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def test_validators_are_sent(self):
+        """Test read responses carry an ETag and no Last-Modified."""
+        res = self.client.get(TAGS_URL)
+
+        self.assertIn('ETag', res)
+        self.assertNotIn('Last-Modified', res)
+
+    def test_if_none_match_returns_not_modified(self):
+        """Test a matching ETag gets a 304 without running queries."""
+        recipe = create_recipe(user=self.user)
+        url = reverse('recipe:recipe-detail', args=[recipe.id])
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_change_invalidates_etag(self):
+        """Test a write makes the old ETag stale."""
+        etag = self.client.get(RECIPES_URL)['ETag']
+        create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_if_modified_since_sees_writes_in_the_same_second(self):
+        """Test If-Modified-Since never hides a write."""
+        self.client.get(RECIPES_URL)
+        create_recipe(user=self.user)
+
+        res = self.client.get(
+            RECIPES_URL, HTTP_IF_MODIFIED_SINCE=http_date())
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_etags_are_per_query(self):
+        """Test ETags differ between queries."""
+        first = self.client.get(RECIPES_URL)['ETag']
+        second = self.client.get(RECIPES_URL, {'tags': '1'})['ETag']
+
+        self.assertNotEqual(first, second)
@@ -0,0 +1,113 @@
+"""
+Tests for the recipe export.
+"""
+import csv
+import io
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Ingradient, Recipe, Tags
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def read(response):
+    return b''.join(response.streaming_content).decode()
+
+
+@override_settings(RECIPE_EXPORT={'CHUNK_SIZE': 2})
+class ExportTests(TestCase):
+    """Test recipes are exported in chunks."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'test123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tag = Tags.objects.create(user=self.user, name='Vegan')
+        self.ingredient = Ingradient.objects.create(
+            user=self.user, name='Salt, fine')
+        self.recipes = []
+        for i in range(5):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Soup {i}', time_minutes=i,
+                price=Decimal('1.50'), description='Hot\nand "good"')
+            recipe.tags.add(self.tag)
+            if i % 2:
+                recipe.ingradient.add(self.ingredient)
+            self.recipes.append(recipe)
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'test123')
+        Recipe.objects.create(
+            user=other, title='Other', time_minutes=1, price=Decimal('1'))
+
+    def test_export_ndjson(self):
+        """Test recipes are streamed as lines of JSON."""
+        res = self.client.get(EXPORT_URL)
+
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        self.assertIn('recipes.ndjson', res['Content-Disposition'])
+        lines = [json.loads(line) for line in read(res).splitlines()]
+        self.assertEqual([line['id'] for line in lines],
+                         [recipe.id for recipe in self.recipes])
+        self.assertEqual(lines[1]['price'], '1.50')
+        self.assertEqual(lines[1]['description'], 'Hot\nand "good"')
+        self.assertEqual(lines[1]['tags'],
+                         [{'id': self.tag.id, 'name': 'Vegan'}])
+        self.assertEqual(lines[1]['ingradient'],
+                         [{'id': self.ingredient.id, 'name': 'Salt, fine'}])
+        self.assertEqual(lines[0]['ingradient'], [])
+
+    def test_export_csv(self):
+        """Test recipes are streamed as CSV rows, picked with Accept."""
+        res = self.client.get(EXPORT_URL, HTTP_ACCEPT='text/csv')
+
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(read(res))))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[1]['title'], 'Soup 1')
+        self.assertEqual(rows[1]['description'], 'Hot\nand "good"')
+        self.assertEqual(rows[1]['tags'], 'Vegan')
+        self.assertEqual(rows[1]['ingradient'], 'Salt, fine')
+
+    def test_export_filters(self):
+        """Test the list filters apply to the export."""
+        res = self.client.get(EXPORT_URL, {
+            'format': 'csv', 'ingredients': str(self.ingredient.id)})
+
+        rows = list(csv.DictReader(io.StringIO(read(res))))
+        self.assertEqual([row['title'] for row in rows], ['Soup 1', 'Soup 3'])
+
+    def test_relations_resolved_per_chunk(self):
+        """Test tags and ingredients are loaded once per chunk."""
+        with CaptureQueriesContext(connection) as queries:
+            read(self.client.get(EXPORT_URL))
+
+        relation_queries = [
+            query for query in queries if 'core_recipe_' in query['sql']]
+        # 5 recipes in chunks of 2, one query per relation and chunk.
+        self.assertEqual(len(relation_queries), 3 * 2)
+
+    def test_export_empty(self):
+        """Test an empty CSV export still has its header."""
+        Recipe.objects.filter(user=self.user).delete()
+
+        res = self.client.get(EXPORT_URL, {'format': 'csv'})
+
+        self.assertEqual(read(res).splitlines()[0],
+                         'id,title,time_minutes,price,link,tags,ingradient,'
+                         'description')
+
+    def test_export_auth_required(self):
+        """Test exports need an authenticated user."""
+        res = APIClient().get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, 401)
@@ -0,0 +1,98 @@
+"""
+Tests for the fast recipe list path.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Ingradient, Recipe, Tags
+from recipe.fastpath import compile_reader
+from recipe.serializers import RecipeDetailSerializer, RecipeSerializer
+from recipe.tests.helpers import assert_fixed_query_count
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+@override_settings(RECIPE_FAST_LIST=True)
+class FastListTests(TestCase):
+    """Test the fast list matches the serializer output."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'test123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tags = [
+            Tags.objects.create(user=self.user, name=f'Tag {i}')
+            for i in range(3)]
+        self.ingredient = Ingradient.objects.create(
+            user=self.user, name='Salt')
+
+    def _create_recipe(self, index=0):
+        recipe = Recipe.objects.create(
+            user=self.user, title=f'Recipe {index}', time_minutes=index,
+            price=Decimal('10') / (index + 3), link='' if index % 2 else
+            f'https://example.com/{index}')
+        recipe.tags.add(*self.tags[:index % 4])
+        if index % 3:
+            recipe.ingradient.add(self.ingredient)
+        return recipe
+
+    def _slow_bytes(self, serializer_class=RecipeSerializer, **kwargs):
+        # Relations in id order, as the list view prefetches them.
+        recipes = Recipe.objects.filter(user=self.user).order_by(
+            '-id').prefetch_related(
+                Prefetch('tags', queryset=Tags.objects.order_by('id')),
+                Prefetch('ingradient',
+                         queryset=Ingradient.objects.order_by('id')))
+        data = serializer_class(recipes, many=True, **kwargs).data
+        return JSONRenderer().render(data)
+
+    def test_output_is_identical(self):
+        """Test the fast list renders the same bytes as the serializer."""
+        for index in range(8):
+            self._create_recipe(index)
+
+        res = self.client.get(RECIPES_URL, {'format': 'json'})
+
+        self.assertEqual(
+            JSONRenderer().render(res.data['results']), self._slow_bytes())
+
+    def test_sparse_fields_identical(self):
+        """Test field selection gives the same output on both paths."""
+        for index in range(4):
+            self._create_recipe(index)
+
+        res = self.client.get(
+            RECIPES_URL, {'fields': 'title,price,tags,ingradient',
+                          'expand': 'ingradient'})
+
+        self.assertEqual(
+            JSONRenderer().render(res.data['results']),
+            self._slow_bytes(fields=['title', 'price', 'tags', 'ingradient'],
+                             expand=['ingradient']))
+
+    def test_query_count_is_fixed(self):
+        """Test relations are loaded with one query each."""
+        assert_fixed_query_count(self, RECIPES_URL, self._create_recipe)
+
+    def test_pagination(self):
+        """Test the fast list pages with cursors."""
+        recipes = [self._create_recipe(index) for index in range(3)]
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+        ids = [item['id'] for item in res.data['results']]
+        res = self.client.get(res.data['next'])
+        ids += [item['id'] for item in res.data['results']]
+
+        self.assertEqual(ids, [recipe.id for recipe in reversed(recipes)])
+
+    def test_unsupported_serializer(self):
+        """Test serializers with custom fields are not compiled."""
+        self.assertIsNone(compile_reader(RecipeDetailSerializer()))
+        self.assertIsNotNone(compile_reader(RecipeSerializer()))
@@ -0,0 +1,320 @@
+"""
+Tests for the recipe image pipeline.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ImageBlob, ImageJob, ImageStatus, Recipe
+from recipe.imaging import render_variants, webp_supported
+
+SIZES = {'thumbnail': 20, 'medium': 40}
+ORIENTATION = 0x0112
+
+
+def image_upload_url(recipe_id):
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def jpeg_with_exif(size=(80, 60), color='red'):
+    """Return JPEG bytes rotated by EXIF and carrying a camera tag."""
+    exif = Image.Exif()
+    exif[ORIENTATION] = 6
+    exif[0x010F] = 'Phone maker'
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG', exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+class RenderVariantsTests(SimpleTestCase):
+    """Test rendering variants with Pillow."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, data):
+        # Sources sit in a shard directory, like blobs.
+        path = os.path.join(self.directory, 'ab', name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(data)
+        return path
+
+    def test_strips_exif_and_applies_orientation(self):
+        """Test the original loses its EXIF and is turned upright."""
+        source = self.write('photo.jpg', jpeg_with_exif())
+
+        variants = render_variants(source, SIZES, webp=False)
+
+        with Image.open(variants['original']) as image:
+            self.assertEqual(image.size, (60, 80))
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_source_is_left_unchanged(self):
+        """Test the stripped original is a new blob named by its hash."""
+        data = jpeg_with_exif()
+        source = self.write('photo.jpg', data)
+
+        variants = render_variants(source, SIZES, webp=False)
+
+        with open(source, 'rb') as file:
+            self.assertEqual(file.read(), data)
+        with open(variants['original'], 'rb') as file:
+            digest = hashlib.sha256(file.read()).hexdigest()
+        self.assertEqual(
+            variants['original'],
+            os.path.join(self.directory, digest[:2], f'{digest}.jpg'))
+        self.assertEqual(
+            variants['thumbnail'],
+            os.path.join(self.directory, digest[:2],
+                         f'{digest}_thumbnail.jpg'))
+        self.assertEqual(sorted(os.listdir(os.path.dirname(source))),
+                         ['photo.jpg'])
+
+    def test_resizes_variants(self):
+        """Test variants fit their size and keep the source format."""
+        source = self.write('photo.jpg', jpeg_with_exif())
+
+        variants = render_variants(source, SIZES, webp=False)
+
+        self.assertEqual(set(variants), {'original', 'thumbnail', 'medium'})
+        with Image.open(variants['thumbnail']) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (15, 20))
+            self.assertEqual(len(image.getexif()), 0)
+        with Image.open(variants['medium']) as image:
+            self.assertEqual(image.size, (30, 40))
+
+    def test_png_variants(self):
+        """Test non JPEG sources get PNG variants."""
+        buffer = BytesIO()
+        Image.new('RGBA', (50, 50)).save(buffer, 'PNG')
+        source = self.write('drawing.png', buffer.getvalue())
+
+        variants = render_variants(source, SIZES, webp=False)
+
+        self.assertTrue(variants['thumbnail'].endswith('_thumbnail.png'))
+
+    def test_gif_copied_as_original(self):
+        """Test formats that are not rewritten are copied as they are."""
+        buffer = BytesIO()
+        Image.new('P', (50, 50)).save(buffer, 'GIF')
+        source = self.write('drawing.gif', buffer.getvalue())
+
+        variants = render_variants(source, SIZES, webp=False)
+
+        digest = hashlib.sha256(buffer.getvalue()).hexdigest()
+        self.assertEqual(
+            variants['original'],
+            os.path.join(self.directory, digest[:2], f'{digest}.gif'))
+        self.assertTrue(variants['thumbnail'].endswith('_thumbnail.png'))
+
+    @skipUnless(webp_supported(), 'Pillow is built without WebP.')
+    def test_webp_variants(self):
+        """Test every variant and the original get a WebP copy."""
+        source = self.write('photo.jpg', jpeg_with_exif())
+
+        variants = render_variants(source, SIZES, webp=True)
+
+        self.assertEqual(set(variants), {
+            'original', 'webp', 'thumbnail', 'thumbnail_webp', 'medium',
+            'medium_webp'})
+        with Image.open(variants['thumbnail_webp']) as image:
+            self.assertEqual(image.format, 'WEBP')
+
+
+class MediaRootMixin:
+    """Upload into a temporary media root."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'test123')
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5,
+            price=Decimal('1.00'))
+
+    def upload(self, data=None, name='photo.jpg'):
+        upload = SimpleUploadedFile(name, data or jpeg_with_exif())
+        return self.client.post(
+            image_upload_url(self.recipe.id), {'image': upload},
+            format='multipart')
+
+
+@override_settings(RECIPE_IMAGES={
+    'BACKEND': 'database', 'SIZES': SIZES, 'WEBP': False, 'MAX_ATTEMPTS': 2,
+})
+class DatabaseBackendTests(MediaRootMixin, TestCase):
+    """Test queueing images in the database."""
+
+    def test_upload_returns_pending(self):
+        """Test an upload is queued and answered right away."""
+        res = self.upload()
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['image_status'], ImageStatus.PENDING)
+        self.assertIsNone(res.data['image'])
+        self.assertEqual(res.data['image_variants'], {})
+        self.assertTrue(ImageJob.objects.filter(recipe=self.recipe).exists())
+
+    def test_worker_processes_jobs(self):
+        """Test the worker command records the rendered variants."""
+        self.upload()
+        upload = self.recipe_image_path()
+
+        call_command('process_images', once=True, inline=True,
+                     stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, ImageStatus.READY)
+        with open(self.recipe.image.path, 'rb') as file:
+            digest = hashlib.sha256(file.read()).hexdigest()
+        self.assertIn(digest, self.recipe.image.name)
+        self.assertNotEqual(self.recipe.image.path, upload)
+        uploaded = ImageBlob.objects.get(name=os.path.relpath(
+            upload, self.recipe.image.storage.location))
+        self.assertEqual(uploaded.refcount, 0)
+        self.assertEqual(uploaded.cleaned, self.recipe.image.name)
+        cleaned = ImageBlob.objects.get(name=self.recipe.image.name)
+        self.assertEqual(cleaned.refcount, 1)
+        self.assertEqual(cleaned.variants, self.recipe.image_variants)
+        self.assertEqual(set(self.recipe.image_variants),
+                         {'thumbnail', 'medium'})
+        self.assertFalse(ImageJob.objects.exists())
+        res = self.client.get(reverse(
+            'recipe:recipe-detail', args=[self.recipe.id]))
+        self.assertTrue(res.data['image_variants']['thumbnail'].startswith(
+            'http://testserver/'))
+
+    def test_only_stripped_image_served(self):
+        """Test the upload with its EXIF is never served, its copy is."""
+        self.upload()
+        upload = self.recipe_image_path()
+        location = self.recipe.image.storage.location
+        upload_url = reverse('media', args=[os.path.relpath(upload, location)])
+        self.assertEqual(self.client.get(upload_url).status_code, 404)
+
+        call_command('process_images', once=True, inline=True,
+                     stdout=StringIO())
+
+        self.assertEqual(self.client.get(upload_url).status_code, 404)
+        res = self.client.get(reverse(
+            'recipe:recipe-detail', args=[self.recipe.id]))
+        res = self.client.get(res.data['image'])
+        self.assertIn('immutable', res['Cache-Control'])
+        with Image.open(BytesIO(b''.join(res.streaming_content))) as image:
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_worker_uses_process_pool(self):
+        """Test rendering in the process pool."""
+        self.upload()
+
+        call_command('process_images', once=True, stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, ImageStatus.READY)
+
+    def test_replaced_image_is_skipped(self):
+        """Test a job of an image replaced since is dropped."""
+        self.upload()
+        self.recipe.refresh_from_db()
+        replaced = self.recipe.image.name
+        self.upload(jpeg_with_exif(color='blue'))
+        self.assertEqual(ImageJob.objects.count(), 2)
+
+        call_command('process_images', once=True, inline=True,
+                     stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, ImageStatus.READY)
+        self.assertEqual(ImageBlob.objects.get(name=replaced).cleaned, '')
+        self.assertFalse(ImageJob.objects.exists())
+
+    def test_same_image_reuses_variants(self):
+        """Test an image stored before is ready without processing."""
+        self.upload()
+        call_command('process_images', once=True, inline=True,
+                     stdout=StringIO())
+        self.recipe.refresh_from_db()
+        first = self.recipe
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Stew', time_minutes=5,
+            price=Decimal('1.00'))
+
+        res = self.upload()
+
+        self.assertEqual(res.data['image_status'], ImageStatus.READY)
+        self.assertFalse(ImageJob.objects.exists())
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, first.image.name)
+        self.assertEqual(self.recipe.image_variants, first.image_variants)
+
+    def test_failed_render(self):
+        """Test an image failing to render is retried, then marked."""
+        self.upload()
+        with open(self.recipe_image_path(), 'wb') as file:
+            file.write(b'not an image')
+
+        with self.assertLogs('recipe.images', 'ERROR') as logs:
+            call_command('process_images', once=True, inline=True,
+                         stdout=StringIO())
+
+        self.assertEqual(len(logs.records), 2)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, ImageStatus.FAILED)
+        self.assertFalse(ImageJob.objects.exists())
+
+    def recipe_image_path(self):
+        self.recipe.refresh_from_db()
+        return self.recipe.image.path
+
+
+@override_settings(RECIPE_IMAGES={
+    'BACKEND': 'memory', 'SIZES': SIZES, 'WEBP': False, 'WORKERS': 1,
+})
+class MemoryBackendTests(MediaRootMixin, TransactionTestCase):
+    """Test processing images in background threads and processes."""
+
+    def test_upload_is_processed(self):
+        """Test an upload is processed after the response."""
+        res = self.upload()
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            self.recipe.refresh_from_db()
+            if self.recipe.image_status == ImageStatus.READY:
+                break
+            time.sleep(0.05)
+
+        self.assertEqual(self.recipe.image_status, ImageStatus.READY)
+        self.assertIn('thumbnail', self.recipe.image_variants)
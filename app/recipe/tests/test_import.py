@@ -0,0 +1,241 @@
+"""
+Tests for the recipe import.
+"""
+import datetime
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import ImportStatus, Ingradient, Recipe, RecipeImport, Tags
+
+RECIPES_URL = reverse('recipe:recipe-list')
+IMPORT_URL = reverse('recipe:recipe-import-recipes')
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def ndjson(*records):
+    return ''.join(json.dumps(record) + '\n' for record in records).encode()
+
+
+def recipe(index, **params):
+    return {
+        'title': f'Soup {index}', 'time_minutes': index, 'price': '1.50',
+        'tags': [{'name': 'Vegan'}, {'name': f'Tag {index % 2}'}],
+        'ingradient': ['Salt'], **params,
+    }
+
+
+class ImportCommandTests(TestCase):
+    """Test the import_recipes command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'test123')
+        self.vegan = Tags.objects.create(user=self.user, name='Vegan')
+        handle, self.path = tempfile.mkstemp(suffix='.ndjson')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def _write(self, content):
+        with open(self.path, 'wb') as stream:
+            stream.write(content)
+
+    def _import(self, **options):
+        out, err = StringIO(), StringIO()
+        call_command('import_recipes', self.path, user='user@example.com',
+                     batch_size=2, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def _assert_imported(self):
+        self._write(ndjson(*(recipe(i) for i in range(5))) + b'{broken\n'
+                    + ndjson(recipe(5, time_minutes='soon')))
+
+        out, err = self._import()
+
+        self.assertIn('Imported 5 recipes, 2 failed.', out)
+        self.assertIn('4 records, 4 imported, 0 failed', out)
+        self.assertIn('Record 6: Invalid JSON', err)
+        self.assertIn('Record 7:', err)
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        self.assertEqual([r.title for r in recipes],
+                         [f'Soup {i}' for i in range(5)])
+        self.assertEqual(recipes[1].price, Decimal('1.50'))
+        self.assertEqual(
+            list(recipes[1].tags.order_by('name').values_list('name',
+                                                              flat=True)),
+            ['Tag 1', 'Vegan'])
+        self.assertTrue(recipes[0].tags.filter(pk=self.vegan.pk).exists())
+        self.assertEqual(Tags.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(Ingradient.objects.get(user=self.user).name, 'Salt')
+        self.assertEqual(recipes[0].ingradient.count(), 1)
+
+    def test_import(self):
+        """Test valid records are imported and invalid ones reported."""
+        self._assert_imported()
+
+    def test_import_without_copy(self):
+        """Test the bulk_create fallback of other databases."""
+        with patch('recipe.importer._uses_copy', return_value=False):
+            self._assert_imported()
+
+    def test_invalid_relations_rejected(self):
+        """Test records with invalid tags or ingredients are reported."""
+        self._write(ndjson(
+            recipe(0, tags=[{'name': ''}]), recipe(1, ingradient=5),
+            recipe(2, tags=[{'name': 'x' * 256}]), recipe(3)))
+
+        out, err = self._import()
+
+        self.assertIn('Imported 1 recipes, 3 failed.', out)
+        for number in (1, 2, 3):
+            self.assertIn(f'Record {number}:', err)
+        self.assertEqual(Recipe.objects.get().title, 'Soup 3')
+
+    def test_resume_from_checkpoint(self):
+        """Test a rerun resumes after the last written batch."""
+        self._write(ndjson(*(recipe(i) for i in range(5))))
+        RecipeImport.objects.create(
+            user=self.user, key=os.path.abspath(self.path), position=2,
+            imported=2)
+
+        out, _ = self._import()
+
+        self.assertIn('Resuming after record 2.', out)
+        self.assertIn('Imported 5 recipes', out)
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('title', flat=True)),
+            ['Soup 2', 'Soup 3', 'Soup 4'])
+
+        out, _ = self._import()
+
+        self.assertIn('already done', out)
+        self.assertEqual(Recipe.objects.count(), 3)
+
+    def test_stopped_import_keeps_checkpoint(self):
+        """Test the batches written before an error stay checkpointed."""
+        rows = ''.join(f'Soup {i},{i},1.50\n' for i in range(1000))
+        self._write(f'title,time_minutes,price\n{rows}'.encode() + b'\xff')
+
+        with patch('recipe.importer.invalidate_user') as invalidate:
+            with self.assertRaisesMessage(CommandError,
+                                          'Import stopped after'):
+                self._import(format='csv')
+
+        job = RecipeImport.objects.get()
+        self.assertEqual(job.status, ImportStatus.RUNNING)
+        self.assertIsNone(job.running_since)
+        self.assertGreater(job.position, 0)
+        self.assertEqual(Recipe.objects.count(), job.position)
+        # The cache is invalidated with every batch written.
+        self.assertEqual(invalidate.call_count, job.position // 2)
+
+    def test_running_import_refused(self):
+        """Test a checkpoint is only imported by one process at a time."""
+        self._write(ndjson(recipe(1)))
+        job = RecipeImport.objects.create(
+            user=self.user, key=os.path.abspath(self.path),
+            running_since=timezone.now())
+
+        with self.assertRaisesMessage(CommandError, 'already running'):
+            self._import()
+        self.assertFalse(Recipe.objects.exists())
+
+        # A claim without a batch written for long is taken over.
+        RecipeImport.objects.filter(pk=job.pk).update(
+            updated_at=timezone.now() - datetime.timedelta(hours=1))
+        out, _ = self._import()
+
+        self.assertIn('Imported 1 recipes', out)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportStatus.DONE)
+        self.assertIsNone(job.running_since)
+
+
+class ImportApiTests(TestCase):
+    """Test the import endpoint."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'test123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_import_export_round_trip(self):
+        """Test a CSV export imports back as the same recipes."""
+        source = Recipe.objects.create(
+            user=self.user, title='Stew, "hearty"', time_minutes=90,
+            price=Decimal('12.10'), description='Slow\ncooked')
+        source.tags.add(Tags.objects.create(user=self.user, name='Winter'))
+        self.client.get(RECIPES_URL)
+        export = b''.join(
+            self.client.get(EXPORT_URL, {'format': 'csv'}).streaming_content)
+        source.delete()
+
+        res = self.client.post(IMPORT_URL, {
+            'file': SimpleUploadedFile('recipes.csv', export),
+            'checkpoint': 'winter'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['key'], 'winter')
+        self.assertEqual(res.data['status'], ImportStatus.DONE)
+        self.assertEqual(res.data['imported'], 1)
+        imported = Recipe.objects.get(user=self.user)
+        self.assertEqual(imported.title, 'Stew, "hearty"')
+        self.assertEqual(imported.description, 'Slow\ncooked')
+        self.assertEqual(imported.price, Decimal('12.10'))
+        self.assertEqual(list(imported.tags.values_list('name', flat=True)),
+                         ['Winter'])
+        # Cached lists of the user are invalidated.
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_running_checkpoint_conflicts(self):
+        """Test an upload for a running import is refused."""
+        RecipeImport.objects.create(
+            user=self.user, key='winter', running_since=timezone.now())
+
+        res = self.client.post(IMPORT_URL, {
+            'file': SimpleUploadedFile('recipes.ndjson', ndjson(recipe(1))),
+            'checkpoint': 'winter'})
+
+        self.assertEqual(res.status_code, 409)
+        self.assertEqual(res.data['checkpoint'], 'winter')
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_malformed_csv_rows_reported(self):
+        """Test a CSV row the reader rejects fails alone."""
+        content = (
+            'title,time_minutes,price\n'
+            f'Soup 1,1,1.50\nSoup 2,2,{"9" * 200000}\nSoup 3,3,1.50\n')
+
+        res = self.client.post(IMPORT_URL, {
+            'file': SimpleUploadedFile('recipes.csv', content.encode())})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['imported'], 2)
+        self.assertEqual(res.data['failed'], 1)
+        self.assertEqual(res.data['errors'][0]['record'], 2)
+        self.assertIn('Invalid CSV', res.data['errors'][0]['errors'])
+
+    def test_import_requires_file(self):
+        """Test an upload is required."""
+        res = self.client.post(IMPORT_URL, {'format': 'csv'})
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_import_auth_required(self):
+        """Test imports need an authenticated user."""
+        res = APIClient().post(IMPORT_URL, {})
+
+        self.assertEqual(res.status_code, 401)
@@ -60,7 +60,7 @@ class PrivateIngradientApiTests(TestCase):
         serializer = IngradientSerializer(ingradients, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_ingradients_limited_to_user(self):
         """Test that ingradients for the authenticated user are returned"""
@@ -80,9 +80,9 @@ class PrivateIngradientApiTests(TestCase):
         res = self.client.get(INGRAGIENT_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], ingradient.name)
-        self.assertEqual(res.data[0]['id'], ingradient.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], ingradient.name)
+        self.assertEqual(res.data['results'][0]['id'], ingradient.id)
 
     def test_update_ingradient_successful(self):
         """Test updating an ingradient's name"""
@@ -132,8 +132,8 @@ class PrivateIngradientApiTests(TestCase):
         res = self.client.get(INGRAGIENT_URL, {'assigned_only': 1})
         serializer1 = IngradientSerializer(in1)
         serializer2 = IngradientSerializer(in2)
-        self.assertIn(serializer1.data, res.data)
-        self.assertNotIn(serializer2.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertNotIn(serializer2.data, res.data['results'])
 
     def test_ingradients_assigned_unique(self):
         """Test filtering ingradients by assigned returns unique items"""
@@ -161,4 +161,19 @@ class PrivateIngradientApiTests(TestCase):
         recipe2.ingradient.add(in1)
 
         res = self.client.get(INGRAGIENT_URL, {'assigned_only': 1})
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_ingradients_with_counts(self):
+        """Test listing ingradients with the number of recipes using them"""
+        ingradient = Ingradient.objects.create(user=self.user, name='Salt')
+        Ingradient.objects.create(user=self.user, name='Pepper')
+        recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=10,
+            price=Decimal(10))
+        recipe.ingradient.add(ingradient)
+
+        res = self.client.get(INGRAGIENT_URL, {'with_counts': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        counts = {i['name']: i['recipe_count'] for i in res.data['results']}
+        self.assertEqual(counts, {'Salt': 1, 'Pepper': 0})
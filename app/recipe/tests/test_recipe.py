@@ -2,9 +2,13 @@
 Tests for recipe APIs.
 """
 from decimal import Decimal
+from unittest import mock
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
@@ -20,12 +24,14 @@ from recipe.serializers import (
     RecipeSerializer,
     RecipeDetailSerializer,
 )
+from recipe.tests.helpers import assert_fixed_query_count
 import tempfile
 import os
 from PIL import Image
 
 
 RECIPES_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk')
 
 
 def detail_url(recipe_id):
@@ -89,7 +95,7 @@ class PrivateRecipeApiTests(TestCase):
         recipes = Recipe.objects.all().order_by('-id')
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_list_limited_to_user(self):
         """Test list of recipes is limited to authenticated user."""
@@ -102,7 +108,7 @@ class PrivateRecipeApiTests(TestCase):
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_get_recipe_detail(self):
         """Test get recipe detail."""
@@ -384,6 +390,41 @@ class PrivateRecipeApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.ingradient.count(), 0)
 
+    def test_create_recipe_relations_query_count(self):
+        """Test recipe tags are written with a fixed number of queries."""
+        Tags.objects.create(user=self.user, name='Existing')
+        query_counts = []
+        for size in (2, 20):
+            payload = {
+                'title': 'Soup',
+                'time_minutes': 10,
+                'price': Decimal('1.00'),
+                'tags': [{'name': 'Existing'}] + [
+                    {'name': f'Tag {size} {i}'} for i in range(size)],
+            }
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(RECIPES_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(len(res.data['tags']), size + 1)
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+        self.assertEqual(Tags.objects.filter(name='Existing').count(), 1)
+
+    def test_update_recipe_keeps_omitted_relations(self):
+        """Test updating a recipe keeps relations missing in the payload."""
+        tag = Tags.objects.create(user=self.user, name='Dinner')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag)
+
+        payload = {'title': 'New title', 'ingradient': [{'name': 'Salt'}]}
+        res = self.client.patch(detail_url(recipe.id), payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(recipe.tags.all()), [tag])
+        self.assertEqual(
+            [i.name for i in recipe.ingradient.all()], ['Salt'])
+
     def test_filter_recipes_by_tags(self):
         """Test returning recipes with specific tags."""
         r1 = create_recipe(user=self.user, title='Thai vegetable curry')
@@ -404,9 +445,9 @@ class PrivateRecipeApiTests(TestCase):
         s3 = RecipeSerializer(r3)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
 
     def test_filter_recipes_by_ingredients(self):
         """Test returning recipes with specific ingredients."""
@@ -432,11 +473,208 @@ class PrivateRecipeApiTests(TestCase):
         s3 = RecipeSerializer(r3)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
+
+    def test_filter_recipes_match_all_tags(self):
+        """Test returning recipes having all of the given tags."""
+        tag1 = Tags.objects.create(user=self.user, name='Vegan')
+        tag2 = Tags.objects.create(user=self.user, name='Dinner')
+        r1 = create_recipe(user=self.user, title='Both')
+        r1.tags.add(tag1, tag2)
+        r2 = create_recipe(user=self.user, title='One')
+        r2.tags.add(tag1)
+
+        params = {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [r1.id])
+
+    def test_filter_recipes_match_any_is_unique(self):
+        """Test recipes matching several tags are returned once."""
+        tag1 = Tags.objects.create(user=self.user, name='Vegan')
+        tag2 = Tags.objects.create(user=self.user, name='Dinner')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag1, tag2)
+
+        params = {'tags': f'{tag1.id},{tag2.id}'}
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL, params)
+
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [recipe.id])
+        self.assertFalse(
+            any('DISTINCT' in query['sql'] for query in queries))
+
+    def test_filter_recipes_all_tags_and_ingredients(self):
+        """Test match=all applies to tags and ingredients together."""
+        tag = Tags.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingradient.objects.create(user=self.user, name='Salt')
+        r1 = create_recipe(user=self.user)
+        r1.tags.add(tag)
+        r1.ingradient.add(ingredient)
+        create_recipe(user=self.user).tags.add(tag)
+
+        params = {
+            'tags': f'{tag.id}',
+            'ingredients': f'{ingredient.id}',
+            'match': 'all',
+        }
+        res = self.client.get(RECIPES_URL, params)
+
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [r1.id])
+
+    def test_filter_recipes_invalid_params(self):
+        """Test invalid filter params return a bad request."""
+        res = self.client.get(RECIPES_URL, {'tags': '1', 'match': 'some'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(RECIPES_URL, {'tags': 'a,b'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def _create_recipe_with_relations(self):
+        """Create a recipe with a tag and an ingredient."""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(
+            Tags.objects.create(user=self.user, name=f'Tag {recipe.id}'))
+        recipe.ingradient.add(Ingradient.objects.create(
+            user=self.user, name=f'Ingredient {recipe.id}'))
+        return recipe
+
+    def test_list_query_count_is_fixed(self):
+        """Test listing recipes does not run a query per recipe."""
+        assert_fixed_query_count(
+            self, RECIPES_URL, self._create_recipe_with_relations)
+
+    def test_detail_prefetches_relations(self):
+        """Test recipe detail loads tags and ingredients in bulk."""
+        recipe = self._create_recipe_with_relations()
+        recipe.tags.add(Tags.objects.create(user=self.user, name='Other'))
+
+        with self.assertNumQueries(3):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 2)
+
+    def test_list_cursor_pagination(self):
+        """Test recipes are paginated with cursors and no count query."""
+        recipes = [create_recipe(user=self.user) for _ in range(3)]
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', res.data)
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries))
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [recipes[2].id, recipes[1].id])
+
+        res = self.client.get(res.data['next'])
+
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [recipes[0].id])
+        self.assertIsNone(res.data['next'])
+
+    def test_list_page_number_pagination(self):
+        """Test page numbers are used when a page is requested."""
+        recipes = [create_recipe(user=self.user) for _ in range(3)]
+
+        res = self.client.get(RECIPES_URL, {'page': 2, 'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 3)
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [recipes[0].id])
+
+    def test_list_sparse_fields(self):
+        """Test only the requested fields are selected and returned."""
+        recipe = self._create_recipe_with_relations()
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'],
+                         [{'id': recipe.id, 'title': recipe.title}])
+        recipe_queries = [
+            query['sql'] for query in queries
+            if 'core_recipe' in query['sql']]
+        self.assertEqual(len(recipe_queries), 1)
+        self.assertNotIn('time_minutes', recipe_queries[0])
+
+    def test_list_selects_serialized_columns(self):
+        """Test the list leaves out columns only the detail shows."""
+        self._create_recipe_with_relations()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(RECIPES_URL)
+
+        sql = next(query['sql'] for query in queries
+                   if 'FROM "core_recipe"' in query['sql'])
+        self.assertIn('"time_minutes"', sql)
+        self.assertNotIn('"description"', sql)
+        self.assertNotIn('"search_vector"', sql)
+
+    def test_detail_sparse_fields(self):
+        """Test detail fields can be narrowed too."""
+        recipe = self._create_recipe_with_relations()
+
+        with self.assertNumQueries(1):
+            res = self.client.get(
+                detail_url(recipe.id), {'fields': 'id,description'})
+
+        self.assertEqual(res.data, {
+            'id': recipe.id, 'description': recipe.description})
+
+    def test_expand_relations(self):
+        """Test relations left out of expand are returned as ids."""
+        recipe = self._create_recipe_with_relations()
+        tag = recipe.tags.get()
+        ingredient = recipe.ingradient.get()
+
+        res = self.client.get(RECIPES_URL, {'expand': 'tags'})
+
+        item = res.data['results'][0]
+        self.assertEqual(item['tags'], [{'id': tag.id, 'name': tag.name}])
+        self.assertEqual(item['ingradient'], [ingredient.id])
+
+        res = self.client.get(RECIPES_URL, {'expand': ''})
 
+        item = res.data['results'][0]
+        self.assertEqual(item['tags'], [tag.id])
+        self.assertEqual(item['ingradient'], [ingredient.id])
 
+    def test_sparse_fields_query_count_is_fixed(self):
+        """Test relations returned as ids are still loaded in bulk."""
+        assert_fixed_query_count(
+            self, f'{RECIPES_URL}?fields=id,tags&expand=',
+            self._create_recipe_with_relations)
+
+    def test_unknown_fields_rejected(self):
+        """Test unknown fields and relations are a bad request."""
+        for params in ({'fields': 'id,secret'}, {'expand': 'title'}):
+            res = self.client.get(RECIPES_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sparse_fields_ignored_on_write(self):
+        """Test writes accept and return every field."""
+        payload = {'title': 'Soup', 'time_minutes': 5,
+                   'price': Decimal('2.50'), 'description': 'Hot'}
+
+        res = self.client.post(f'{RECIPES_URL}?fields=id', payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['description'], 'Hot')
+
+
+@override_settings(RECIPE_IMAGES={'BACKEND': 'sync', 'WEBP': False})
 class ImageUploadTest(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -448,6 +686,9 @@ class ImageUploadTest(TestCase):
         self.recipe = create_recipe(user=self.user)
 
     def tearDown(self):
+        self.recipe.refresh_from_db()
+        for name in self.recipe.image_variants.values():
+            default_storage.delete(name)
         self.recipe.image.delete()
 
     def test_upload_image_to_recipe(self):
@@ -461,9 +702,13 @@ class ImageUploadTest(TestCase):
             res = self.client.post(url, payload, format='multipart')
 
         self.recipe.refresh_from_db()
-        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
+        self.assertEqual(res.data['image_status'], 'ready')
+        self.assertIn('thumbnail', res.data['image_variants'])
+        self.assertTrue(default_storage.exists(
+            self.recipe.image_variants['thumbnail']))
 
     def test_upload_image_bad_request(self):
         """Test uploading an invalid image."""
@@ -471,3 +716,122 @@ class ImageUploadTest(TestCase):
         res = self.client.post(url, {'image': 'notimage'}, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkRecipeApiTests(TestCase):
+    """Test the bulk recipe endpoint."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create_update_delete(self):
+        """Test running mixed operations in one request."""
+        to_update = create_recipe(user=self.user, title='Old title')
+        to_delete = create_recipe(user=self.user)
+        payload = [
+            {
+                'title': 'Curry',
+                'time_minutes': 30,
+                'price': '2.50',
+                'tags': [{'name': 'Dinner'}],
+            },
+            {'op': 'update', 'id': to_update.id, 'title': 'New title'},
+            {'op': 'delete', 'id': to_delete.id},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['status'] for item in res.data], [201, 200, 204])
+        created = Recipe.objects.get(id=res.data[0]['data']['id'])
+        self.assertEqual(created.user, self.user)
+        self.assertEqual([t.name for t in created.tags.all()], ['Dinner'])
+        to_update.refresh_from_db()
+        self.assertEqual(to_update.title, 'New title')
+        self.assertFalse(Recipe.objects.filter(id=to_delete.id).exists())
+
+    def test_bulk_reports_item_errors(self):
+        """Test invalid items are reported without stopping the others."""
+        other_user = create_user(email='other@example.com', password='test123')
+        other_recipe = create_recipe(user=other_user)
+        payload = [
+            {'title': 'Missing fields'},
+            {'op': 'delete', 'id': other_recipe.id},
+            {'title': 'Soup', 'time_minutes': 5, 'price': '1.00'},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['status'] for item in res.data], [400, 404, 201])
+        self.assertIn('time_minutes', res.data[0]['errors'])
+        self.assertTrue(Recipe.objects.filter(id=other_recipe.id).exists())
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_create_query_count_is_fixed(self):
+        """Test creating more recipes does not run more queries."""
+        query_counts = []
+        for size in (2, 10):
+            payload = [
+                {
+                    'title': f'Recipe {i}',
+                    'time_minutes': 5,
+                    'price': '1.00',
+                    'tags': [{'name': f'Tag {i}'}],
+                }
+                for i in range(size)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(BULK_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_bulk_create_without_returned_ids(self):
+        """Test recipes get their ids when bulk inserts return none."""
+        payload = [
+            {'title': f'Recipe {i}', 'time_minutes': i, 'price': '1.00',
+             'tags': [{'name': f'Tag {i}'}]}
+            for i in range(1, 6)
+        ]
+        with mock.patch.object(
+                connection.features, 'can_return_rows_from_bulk_insert',
+                False):
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        inserts = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('INSERT INTO "core_recipe"')]
+        # Only SQLite's write lock keeps concurrent rows out of a batch.
+        self.assertEqual(
+            len(inserts), 1 if connection.vendor == 'sqlite' else 5)
+        for item in res.data:
+            recipe = Recipe.objects.get(id=item['data']['id'])
+            self.assertEqual(recipe.title, item['data']['title'])
+            self.assertEqual(
+                [tag.name for tag in recipe.tags.all()],
+                [f'Tag {recipe.time_minutes}'])
+
+    def test_bulk_ignores_list_filters(self):
+        """Test list filters in the query string don't hide saved rows."""
+        payload = [{'title': 'Soup', 'time_minutes': 5, 'price': '1.00'}]
+
+        res = self.client.post(
+            f'{BULK_URL}?tags=999', payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]['status'], 201)
+        self.assertEqual(res.data[0]['data']['title'], 'Soup')
+
+    def test_bulk_requires_list(self):
+        """Test the bulk endpoint rejects a single object."""
+        res = self.client.post(BULK_URL, {'title': 'Soup'}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
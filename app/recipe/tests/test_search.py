@@ -0,0 +1,121 @@
+"""
+Tests for recipe search.
+"""
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tags, Ingradient
+
+SEARCH_URL = reverse('recipe:recipe-search')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        'title': 'Sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeSearchTests(TestCase):
+    """Test searching recipes."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'test123')
+        self.client.force_authenticate(self.user)
+
+    def search(self, text):
+        res = self.client.get(SEARCH_URL, {'q': text})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [recipe['id'] for recipe in res.data['results']]
+
+    def test_search_title_and_description(self):
+        """Test recipes are found by title and description."""
+        r1 = create_recipe(user=self.user, title='Tomato soup')
+        r2 = create_recipe(user=self.user, description='Serve with tomato')
+        create_recipe(user=self.user, title='Pancakes')
+
+        self.assertEqual(self.search('tomato'), [r1.id, r2.id])
+
+    def test_search_tags_and_ingredients(self):
+        """Test recipes are found by tag and ingredient names."""
+        r1 = create_recipe(user=self.user)
+        r1.tags.add(Tags.objects.create(user=self.user, name='Vegan'))
+        r2 = create_recipe(user=self.user)
+        r2.ingradient.add(
+            Ingradient.objects.create(user=self.user, name='Basil'))
+
+        self.assertEqual(self.search('vegan'), [r1.id])
+        self.assertEqual(self.search('basil'), [r2.id])
+
+    def test_search_updates_on_relation_changes(self):
+        """Test the search follows tag changes made through the API."""
+        recipe = create_recipe(user=self.user)
+        url = reverse('recipe:recipe-detail', args=[recipe.id])
+        self.client.patch(url, {'tags': [{'name': 'Spicy'}]}, format='json')
+        self.assertEqual(self.search('spicy'), [recipe.id])
+
+        tag = Tags.objects.get(user=self.user, name='Spicy')
+        tag.name = 'Mild'
+        tag.save()
+
+        self.assertEqual(self.search('spicy'), [])
+        self.assertEqual(self.search('mild'), [recipe.id])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Vectors need Postgres.')
+    def test_vector_computed_once_per_write(self):
+        """Test creating and updating a recipe computes its vector once."""
+        payload = {'title': 'Tomato soup', 'time_minutes': 5,
+                   'price': '1.00', 'tags': [{'name': 'Vegan'}]}
+        with CaptureQueriesContext(connection) as created:
+            res = self.client.post(RECIPES_URL, payload, format='json')
+        url = reverse('recipe:recipe-detail', args=[res.data['id']])
+        with CaptureQueriesContext(connection) as updated:
+            self.client.patch(
+                url, {'title': 'Leek soup', 'tags': [{'name': 'Mild'}]},
+                format='json')
+
+        for queries in (created, updated):
+            self.assertEqual(len([
+                query for query in queries.captured_queries
+                if 'SET "search_vector" =' in query['sql']]), 1)
+        self.assertEqual(self.search('vegan'), [])
+        self.assertEqual(self.search('leek mild'), [res.data['id']])
+
+    def test_search_ranks_title_first(self):
+        """Test title matches rank above description matches."""
+        in_description = create_recipe(
+            user=self.user, description='Lemon zest on top')
+        in_title = create_recipe(user=self.user, title='Lemon tart')
+
+        self.assertEqual(
+            self.search('lemon'), [in_title.id, in_description.id])
+
+    def test_search_limited_to_user(self):
+        """Test other users' recipes are not found."""
+        other_user = get_user_model().objects.create_user(
+            'other@example.com', 'test123')
+        create_recipe(user=other_user, title='Tomato soup')
+
+        self.assertEqual(self.search('tomato'), [])
+
+    def test_search_requires_query(self):
+        """Test searching without a query is a bad request."""
+        res = self.client.get(SEARCH_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
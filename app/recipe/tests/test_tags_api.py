@@ -58,7 +58,7 @@ class PrivateTagsApiTests(TestCase):
         tags = Tags.objects.all().order_by('-name')
         serializer = TagsSerializer(tags, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_tags_limited_to_user(self):
         """Test list of tags is limited to authenticated user."""
@@ -69,9 +69,9 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], tag.name)
-        self.assertEqual(res.data[0]['id'], tag.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
+        self.assertEqual(res.data['results'][0]['id'], tag.id)
 
     def test_update_tag(self):
         """Test updating a tag."""
@@ -111,8 +111,8 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
         serializer1 = TagsSerializer(tag1)
         serializer2 = TagsSerializer(tag2)
-        self.assertIn(serializer1.data, res.data)
-        self.assertNotIn(serializer2.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertNotIn(serializer2.data, res.data['results'])
 
     def test_tags_assigned_unique(self):
         """Test filtering tags by assigned returns unique items."""
@@ -134,4 +134,70 @@ class PrivateTagsApiTests(TestCase):
         recipe2.tags.add(tag1)
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_tags_cursor_pagination(self):
+        """Test tags are paginated by name with cursors."""
+        for name in ['Breakfast', 'Dinner', 'Lunch']:
+            Tags.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {'page_size': 2})
+
+        names = [tag['name'] for tag in res.data['results']]
+        self.assertEqual(names, ['Lunch', 'Dinner'])
+
+        res = self.client.get(res.data['next'])
+
+        names = [tag['name'] for tag in res.data['results']]
+        self.assertEqual(names, ['Breakfast'])
+
+    def test_update_tag_duplicate_name(self):
+        """Test renaming a tag to an existing name returns an error."""
+        Tags.objects.create(user=self.user, name='Dinner')
+        tag = Tags.objects.create(user=self.user, name='Lunch')
+
+        res = self.client.patch(detail_url(tag.id), {'name': 'Dinner'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Lunch')
+
+    def test_tags_with_counts(self):
+        """Test listing tags with the number of recipes using them."""
+        tag1 = Tags.objects.create(user=self.user, name='Vegan')
+        Tags.objects.create(user=self.user, name='Dessert')
+        for title in ['First', 'Second']:
+            Recipe.objects.create(
+                user=self.user, title=title, time_minutes=10,
+                price=Decimal(10)).tags.add(tag1)
+
+        res = self.client.get(TAGS_URL, {'with_counts': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        counts = {t['name']: t['recipe_count'] for t in res.data['results']}
+        self.assertEqual(counts, {'Vegan': 2, 'Dessert': 0})
+
+    def test_tags_with_counts_assigned_only(self):
+        """Test counts can be combined with assigned_only."""
+        tag1 = Tags.objects.create(user=self.user, name='Vegan')
+        Tags.objects.create(user=self.user, name='Dessert')
+        Recipe.objects.create(
+            user=self.user, title='Test Recipe', time_minutes=10,
+            price=Decimal(10)).tags.add(tag1)
+
+        params = {'with_counts': 1, 'assigned_only': 1}
+        with self.assertNumQueries(1):
+            res = self.client.get(TAGS_URL, params)
+
+        self.assertEqual(
+            res.data['results'],
+            [{'id': tag1.id, 'name': 'Vegan', 'recipe_count': 1}])
+
+    def test_tags_sparse_fields(self):
+        """Test tags can be listed with a subset of their fields."""
+        tag = Tags.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.get(TAGS_URL, {'fields': 'name'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [{'name': tag.name}])
@@ -0,0 +1,187 @@
+"""
+Tests for tag and ingredient typeahead.
+"""
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingradient, Recipe, Tags
+from recipe import typeahead
+
+TAGS_URL = reverse('recipe:tags-list')
+INGRADIENT_URL = reverse('recipe:ingradient-list')
+
+NAMES = ['Tomato', 'Tomatillo', 'Potato', 'Basil', 'Tofu', 'Cherry tomato']
+
+
+class NameIndexTests(SimpleTestCase):
+    """Test the in-process name index."""
+
+    def setUp(self):
+        self.index = typeahead.NameIndex(enumerate(NAMES))
+
+    def test_trigrams_match_pg_trgm(self):
+        """Test words are padded and lowercased like pg_trgm does."""
+        self.assertEqual(
+            typeahead.trigrams('Cat'), {'  c', ' ca', 'cat', 'at '})
+
+    def test_prefix(self):
+        """Test prefix matches are case insensitive and in name order."""
+        self.assertEqual(self.index.prefix('TOMA'), [1, 0])
+        self.assertEqual(self.index.prefix('x'), [])
+
+    def test_similar(self):
+        """Test fuzzy matches are ranked by similarity."""
+        ids = [pk for pk, _ in self.index.similar('tomatoe', 0.3)]
+
+        self.assertEqual(ids[0], 0)
+        self.assertIn(5, ids)
+        self.assertNotIn(3, ids)
+
+
+class IndexCacheTests(TestCase):
+    """Test reusing in-process indexes."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'test123')
+        self.cache = typeahead.IndexCache()
+        Ingradient.objects.create(user=self.user, name='Tomato')
+
+    def add_elsewhere(self, name):
+        # bulk_create sends no signals, like a write of another process
+        # whose change marker this process does not see.
+        Ingradient.objects.bulk_create([Ingradient(user=self.user, name=name)])
+
+    @override_settings(RECIPE_TYPEAHEAD={'SHARED_VERSION': False})
+    def test_checks_names_without_shared_version(self):
+        """Test writes of other processes are seen without a shared marker."""
+        self.cache.get(Ingradient, self.user.pk)
+        self.add_elsewhere('Tofu')
+
+        index = self.cache.get(Ingradient, self.user.pk)
+
+        self.assertEqual(len(index.prefix('to')), 2)
+
+    @override_settings(RECIPE_TYPEAHEAD={'SHARED_VERSION': True})
+    def test_trusts_shared_version(self):
+        """Test an index is reused without queries on a shared marker."""
+        self.cache.get(Ingradient, self.user.pk)
+
+        with self.assertNumQueries(0):
+            self.cache.get(Ingradient, self.user.pk)
+
+
+class TypeaheadApiMixin:
+    """Typeahead tests run against one backend."""
+
+    def setUp(self):
+        typeahead.index_cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'test123')
+        self.client.force_authenticate(self.user)
+        for name in NAMES:
+            Ingradient.objects.create(user=self.user, name=name)
+
+    def names(self, res):
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item['name'] for item in res.data]
+
+    def test_prefix(self):
+        """Test prefix matches are returned in name order."""
+        res = self.client.get(INGRADIENT_URL, {'prefix': 'tom'})
+
+        self.assertEqual(self.names(res), ['Tomatillo', 'Tomato'])
+
+    def test_fuzzy(self):
+        """Test a misspelled name finds the closest match first."""
+        res = self.client.get(INGRADIENT_URL, {'q': 'tomatoe'})
+
+        names = self.names(res)
+        self.assertEqual(names[0], 'Tomato')
+        self.assertNotIn('Basil', names)
+
+    def test_limit(self):
+        """Test at most limit items are returned."""
+        res = self.client.get(INGRADIENT_URL, {'q': 'tomato', 'limit': 1})
+
+        self.assertEqual(self.names(res), ['Tomato'])
+
+    def test_limit_bounds(self):
+        """Test limits outside the allowed range are rejected."""
+        for limit in ('0', '51', 'x'):
+            res = self.client.get(
+                INGRADIENT_URL, {'prefix': 't', 'limit': limit})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_limited_to_user(self):
+        """Test other users' names are not matched."""
+        other_user = get_user_model().objects.create_user(
+            'other@example.com', 'test123')
+        Tags.objects.create(user=other_user, name='Tomato')
+        Tags.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.get(TAGS_URL, {'prefix': 'to'})
+
+        self.assertEqual(self.names(res), [])
+
+    def test_follows_changes(self):
+        """Test renamed items are matched by their new name."""
+        ingradient = Ingradient.objects.get(name='Basil')
+        self.client.get(INGRADIENT_URL, {'prefix': 'bas'})
+        ingradient.name = 'Oregano'
+        ingradient.save()
+
+        self.assertEqual(self.names(self.client.get(
+            INGRADIENT_URL, {'prefix': 'bas'})), [])
+        self.assertEqual(self.names(self.client.get(
+            INGRADIENT_URL, {'prefix': 'ore'})), ['Oregano'])
+
+    def test_prefix_and_q_rejected(self):
+        """Test prefix and q can not be combined."""
+        res = self.client.get(INGRADIENT_URL, {'prefix': 't', 'q': 't'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_blank_query(self):
+        """Test a blank query matches nothing."""
+        res = self.client.get(INGRADIENT_URL, {'q': ' '})
+
+        self.assertEqual(self.names(res), [])
+
+
+@override_settings(RECIPE_TYPEAHEAD={'BACKEND': typeahead.BACKEND_MEMORY})
+class MemoryTypeaheadApiTests(TypeaheadApiMixin, TestCase):
+    """Test typeahead with the in-process index."""
+
+    def test_with_counts(self):
+        """Test matches can be narrowed to assigned items with counts."""
+        recipe = Recipe.objects.create(
+            user=self.user, title='Salsa', time_minutes=5,
+            price=Decimal('1.00'))
+        recipe.ingradient.add(Ingradient.objects.get(name='Tomatillo'))
+
+        res = self.client.get(INGRADIENT_URL, {
+            'prefix': 'tom', 'with_counts': 1, 'assigned_only': 1})
+
+        self.assertEqual(self.names(res), ['Tomatillo'])
+        self.assertEqual(res.data[0]['recipe_count'], 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'pg_trgm needs Postgres.')
+@override_settings(RECIPE_TYPEAHEAD={'BACKEND': typeahead.BACKEND_TRIGRAM})
+class TrigramTypeaheadApiTests(TypeaheadApiMixin, TestCase):
+    """Test typeahead with pg_trgm."""
+
+    def setUp(self):
+        if not typeahead.trigram_enabled():
+            self.skipTest('pg_trgm is not installed.')
+        super().setUp()
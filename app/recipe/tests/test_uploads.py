@@ -0,0 +1,135 @@
+"""
+Tests for streaming recipe image uploads.
+"""
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe.uploads import ImageTooLarge, RecipeImageUploadHandler
+
+IMAGES = {'BACKEND': 'sync', 'WEBP': False, 'SIZES': {}}
+
+
+def image_bytes(size=(10, 10), image_format='JPEG'):
+    buffer = BytesIO()
+    Image.new('RGB', size).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def noise_png(size):
+    buffer = BytesIO()
+    Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3)).save(
+        buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@override_settings(RECIPE_IMAGES=IMAGES)
+class StreamingUploadTests(TestCase):
+    """Test the upload-image action checks images while streaming."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.upload_dir = os.path.join(media_root, 'uploads', 'recipe')
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'test123')
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5,
+            price=Decimal('1.00'))
+
+    def upload(self, data, name='photo.jpg'):
+        url = reverse('recipe:recipe-upload-image', args=[self.recipe.id])
+        return self.client.post(
+            url, {'image': SimpleUploadedFile(name, data)},
+            format='multipart')
+
+    def uploaded_files(self):
+        if not os.path.isdir(self.upload_dir):
+            return []
+        return sorted(os.listdir(self.upload_dir))
+
+    def test_valid_image_is_stored(self):
+        """Test a valid image is moved into place from its upload."""
+        res = self.upload(image_bytes())
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.recipe.refresh_from_db()
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+        self.assertEqual(self.uploaded_files(), [])
+
+    def test_upload_written_in_storage_directory(self):
+        """Test uploads stream into the directory they are stored in."""
+        handler = RecipeImageUploadHandler()
+        handler.new_file('image', 'photo.jpg', 'image/jpeg', None)
+        self.addCleanup(handler.upload_interrupted)
+
+        self.assertEqual(
+            os.path.dirname(handler.file.temporary_file_path()),
+            self.upload_dir)
+
+    def test_not_an_image(self):
+        """Test bytes without an image signature are refused."""
+        res = self.upload(b'<html>not an image at all</html>')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)
+        self.assertEqual(self.uploaded_files(), [])
+
+    def test_truncated_header(self):
+        """Test an image whose header never completes is refused."""
+        res = self.upload(image_bytes()[:20])
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.uploaded_files(), [])
+
+    def test_signature_mismatch(self):
+        """Test an image is refused when its bytes lie about the format."""
+        data = b'GIF89a' + image_bytes(image_format='PNG')
+
+        res = self.upload(data, name='photo.gif')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RECIPE_IMAGES={**IMAGES, 'MAX_DIMENSION': 50})
+    def test_dimensions_limited(self):
+        """Test images larger than the dimension limit are refused."""
+        res = self.upload(image_bytes(size=(60, 10)))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.uploaded_files(), [])
+
+    @override_settings(RECIPE_IMAGES={**IMAGES, 'MAX_UPLOAD_SIZE': 4096})
+    def test_size_limited_while_streaming(self):
+        """Test the upload is stopped once it exceeds the size limit."""
+        res = self.upload(noise_png((64, 64)), name='noise.png')
+
+        self.assertEqual(
+            res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(self.uploaded_files(), [])
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(RECIPE_IMAGES={**IMAGES, 'MAX_UPLOAD_SIZE': 4096})
+    def test_size_limited_by_content_length(self):
+        """Test a request announcing an oversized body is refused upfront."""
+        handler = RecipeImageUploadHandler()
+
+        with self.assertRaises(ImageTooLarge):
+            handler.handle_raw_input(None, {}, 1024 * 1024, b'boundary')
@@ -0,0 +1,206 @@
+"""Typeahead matching of tag and ingredient names"""
+
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, OrderedDict, defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connections
+from django.db.models import Count, Max
+from django.db.models.functions import Collate, Lower
+
+from recipe.caching import get_version
+
+BACKEND_AUTO = 'auto'
+BACKEND_TRIGRAM = 'trigram'
+BACKEND_MEMORY = 'memory'
+
+_trigram_enabled = {}
+_word = re.compile(r'[^\W_]+')
+
+
+def _options():
+    return getattr(settings, 'RECIPE_TYPEAHEAD', {})
+
+
+def limits():
+    """Return the default and the largest allowed result limit."""
+    return _options().get('LIMIT', 10), _options().get('MAX_LIMIT', 50)
+
+
+def trigram_enabled(alias='default'):
+    """Return whether pg_trgm is installed on a database."""
+    if alias not in _trigram_enabled:
+        connection = connections[alias]
+        enabled = False
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                enabled = cursor.fetchone() is not None
+        _trigram_enabled[alias] = enabled
+    return _trigram_enabled[alias]
+
+
+def get_backend(alias='default'):
+    """Return the backend answering typeahead queries."""
+    backend = _options().get('BACKEND', BACKEND_AUTO)
+    if backend == BACKEND_AUTO:
+        return BACKEND_TRIGRAM if trigram_enabled(alias) else BACKEND_MEMORY
+    return backend
+
+
+def trigrams(text):
+    """Return the trigrams of text the way pg_trgm extracts them."""
+    result = set()
+    for word in _word.findall(text.lower()):
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class NameIndex:
+    """In memory prefix and trigram index over (id, name) pairs."""
+
+    def __init__(self, items):
+        entries = sorted((name.lower(), pk) for pk, name in items)
+        self.keys = [key for key, _ in entries]
+        self.ids = [pk for _, pk in entries]
+        self.sizes = []
+        postings = defaultdict(list)
+        for position, key in enumerate(self.keys):
+            grams = trigrams(key)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                postings[gram].append(position)
+        self.postings = dict(postings)
+
+    def prefix(self, prefix):
+        """Return ids of names starting with prefix, in name order."""
+        prefix = prefix.lower()
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + '\U0010ffff', start)
+        return self.ids[start:end]
+
+    def similar(self, text, threshold):
+        """Return (id, similarity) of names similar to text, best first."""
+        grams = trigrams(text)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        matches = []
+        for position, count in shared.items():
+            similarity = count / (len(grams) + self.sizes[position] - count)
+            if similarity >= threshold:
+                matches.append(
+                    (-similarity, self.keys[position], self.ids[position]))
+        matches.sort()
+        return [(pk, -score) for score, _, pk in matches]
+
+
+class IndexCache:
+    """Bounded LRU of per user name indexes.
+
+    An index is reused without a query while the user's change marker
+    stays the same, when SHARED_VERSION says the processes share the
+    marker. Otherwise, and once it moved, the count and latest update of
+    the names are compared to decide whether the index is rebuilt, so
+    recipe writes do not force a rebuild.
+    """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size or _options().get('INDEX_USERS', 1000)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model, user_id):
+        """Return the name index of a user's tags or ingredients."""
+        key = (model._meta.label, user_id)
+        version = None
+        if _options().get('SHARED_VERSION', False):
+            version = get_version(user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is not None and version is not None
+                    and entry[0] == version):
+                self._entries.move_to_end(key)
+                return entry[2]
+
+        names = model.objects.filter(user_id=user_id)
+        fingerprint = names.aggregate(
+            count=Count('id'), updated=Max('updated_at'))
+        if entry is not None and entry[1] == fingerprint:
+            index = entry[2]
+        else:
+            index = NameIndex(names.values_list('id', 'name').iterator())
+        with self._lock:
+            self._entries[key] = (version, fingerprint, index)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return index
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+index_cache = IndexCache()
+
+
+def _in_order(queryset, ids, limit):
+    """Return up to limit objects of queryset in the order of ids."""
+    results = []
+    step = max(limit * 4, 100)
+    for start in range(0, len(ids), step):
+        chunk = ids[start:start + step]
+        found = queryset.in_bulk(chunk)
+        results.extend(found[pk] for pk in chunk if pk in found)
+        if len(results) >= limit:
+            break
+    return results[:limit]
+
+
+def prefix_matches(queryset, prefix):
+    """Return the items of queryset with names starting with prefix.
+
+    A range on the (user, lower(name) COLLATE "C", id) indexes, ordered
+    by lowercased name in the byte order the in memory index uses too.
+    """
+    prefix = prefix.lower()
+    return queryset.alias(name_key=Collate(Lower('name'), 'C')).filter(
+        name_key__gte=prefix, name_key__lt=prefix + '\U0010ffff',
+    ).order_by('name_key', 'id')
+
+
+def typeahead(queryset, user_id, limit, prefix=None, text=None):
+    """Return up to limit items of queryset matching prefix or text.
+
+    Prefix matches come in name order, fuzzy matches by trigram
+    similarity. With pg_trgm the query is answered by the trigram GIN
+    indexes, otherwise by a per user index kept in process memory.
+    """
+    threshold = _options().get('SIMILARITY', 0.3)
+    if get_backend(queryset.db) == BACKEND_TRIGRAM:
+        if prefix is not None:
+            queryset = prefix_matches(queryset, prefix)
+        else:
+            # The % operator is what the GIN index serves, the explicit
+            # bound applies thresholds above pg_trgm.similarity_threshold.
+            queryset = queryset.filter(name__trigram_similar=text).annotate(
+                similarity=TrigramSimilarity('name', text),
+            ).filter(similarity__gte=threshold).order_by(
+                '-similarity', Lower('name'), 'id')
+        return list(queryset[:limit])
+
+    index = index_cache.get(queryset.model, user_id)
+    if prefix is not None:
+        return _in_order(queryset, index.prefix(prefix), limit)
+    matches = index.similar(text, threshold)
+    scores = dict(matches)
+    results = _in_order(queryset, [pk for pk, _ in matches], limit)
+    for item in results:
+        item.similarity = scores[item.pk]
+    return results
@@ -0,0 +1,180 @@
+"""Streaming upload handling of recipe images"""
+
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import (
+    TemporaryUploadedFile,
+    UploadedFile,
+)
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from PIL import ImageFile
+from rest_framework import exceptions, serializers
+
+from core.models import Recipe, recipe_image_file_path
+
+# Leading bytes of the accepted formats, WebP is RIFF....WEBP.
+SIGNATURES = {
+    b'\xff\xd8\xff': 'JPEG',
+    b'\x89PNG\r\n\x1a\n': 'PNG',
+    b'GIF87a': 'GIF',
+    b'GIF89a': 'GIF',
+    b'RIFF': 'WEBP',
+}
+HEADER_LENGTH = 12
+PILLOW_FORMATS = {'JPEG': {'JPEG', 'MPO'}, 'PNG': {'PNG'}, 'GIF': {'GIF'},
+                  'WEBP': {'WEBP'}}
+# Room for the multipart boundaries and the other form fields.
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def _options():
+    return getattr(settings, 'RECIPE_IMAGES', {})
+
+
+def max_upload_size():
+    return _options().get('MAX_UPLOAD_SIZE', 10 * 1024 * 1024)
+
+
+class ImageTooLarge(exceptions.APIException):
+    status_code = 413
+    default_code = 'image_too_large'
+
+    def __init__(self):
+        super().__init__(
+            {'image': [f'Images are limited to {max_upload_size()} bytes.']})
+
+
+def _invalid(message):
+    return serializers.ValidationError({'image': [message]})
+
+
+def _sniff(header):
+    """Return the format the leading bytes announce, or None."""
+    for signature, image_format in SIGNATURES.items():
+        if header.startswith(signature):
+            if image_format == 'WEBP' and header[8:12] != b'WEBP':
+                return None
+            return image_format
+    return None
+
+
+class StoredImageUpload(TemporaryUploadedFile):
+    """Temporary upload kept in a directory of the image storage.
+
+    File system storage moves temporary uploads into place, so saving
+    the image is a rename on the same file system instead of a copy.
+    """
+
+    def __init__(self, directory, name, content_type, size, charset,
+                 content_type_extra=None):
+        extension = os.path.splitext(name)[1]
+        file = tempfile.NamedTemporaryFile(
+            prefix='.upload-', suffix=extension, dir=directory)
+        UploadedFile.__init__(
+            self, file, name, content_type, size, charset,
+            content_type_extra)
+
+
+class RecipeImageUploadHandler(FileUploadHandler):
+    """Stream the image of an upload-image request next to its final path.
+
+    The format is checked against the leading bytes and the dimensions
+    against the header as soon as it arrived, and the size is capped
+    while streaming, so bad uploads are refused before the body is read
+    to the end.
+    """
+    field_name_accepted = 'image'
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.file = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        if content_length > max_upload_size() + MULTIPART_OVERHEAD:
+            raise ImageTooLarge()
+
+    def _directory(self, file_name):
+        directory = os.path.dirname(recipe_image_file_path(None, file_name))
+        try:
+            path = Recipe._meta.get_field('image').storage.path(directory)
+        except NotImplementedError:
+            # Remote storage, the upload is sent from a local temp file.
+            return settings.FILE_UPLOAD_TEMP_DIR
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        if field_name != self.field_name_accepted or self.file is not None:
+            raise SkipFile()
+        self.file = StoredImageUpload(
+            self._directory(file_name), self.file_name, self.content_type,
+            0, self.charset, self.content_type_extra)
+        self.sha256 = hashlib.sha256()
+        self.header = b''
+        self.parser = ImageFile.Parser()
+        self.checked = False
+
+    def _abort(self, error):
+        self.file.close()
+        self.file = None
+        raise error
+
+    def _check_header(self, raw_data, start):
+        if len(self.header) < HEADER_LENGTH:
+            self.header += raw_data[:HEADER_LENGTH - len(self.header)]
+            complete = len(self.header) == HEADER_LENGTH
+            if complete and _sniff(self.header) is None:
+                self._abort(_invalid('Upload a JPEG, PNG, GIF or WebP image.'))
+        try:
+            self.parser.feed(raw_data)
+        except Exception:
+            self._abort(_invalid('The image header could not be read.'))
+        image = self.parser.image
+        if image is None:
+            if start + len(raw_data) > _options().get(
+                    'MAX_HEADER_SIZE', 256 * 1024):
+                self._abort(_invalid('The image header could not be read.'))
+            return
+        if image.format not in PILLOW_FORMATS.get(_sniff(self.header), ()):
+            self._abort(_invalid('The image does not match its format.'))
+        width, height = image.size
+        max_dimension = _options().get('MAX_DIMENSION', 10000)
+        if max(width, height) > max_dimension or width * height > (
+                _options().get('MAX_PIXELS', 40_000_000)):
+            self._abort(_invalid(
+                f'Images are limited to {max_dimension} pixels a side.'))
+        # Stop feeding, past the header the parser decodes pixels.
+        self.checked = True
+        self.parser = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.file is None:
+            return raw_data
+        if start + len(raw_data) > max_upload_size():
+            self._abort(ImageTooLarge())
+        if not self.checked:
+            self._check_header(raw_data, start)
+        self.sha256.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.file is None:
+            return None
+        if not self.checked:
+            self._abort(_invalid('The image header could not be read.'))
+        self.file.seek(0)
+        self.file.size = file_size
+        # Saves the content addressed storage a second read of the file.
+        self.file.sha256 = self.sha256.hexdigest()
+        return self.file
+
+    def upload_interrupted(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -15,5 +15,6 @@ router.register('ingradients', views.IngradientViewSet)
 app_name = 'recipe'
 
 urlpatterns = [
+    path('cache-stats/', views.CacheStatsView.as_view(), name='cache-stats'),
     path('', include(router.urls))
 ]
@@ -1,24 +1,112 @@
 """Views for recipe APIs"""
 
+import uuid
+
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
     OpenApiParameter,
     OpenApiTypes)
-from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from django.core.exceptions import FieldDoesNotExist
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
+from django.db.models import Prefetch
+from rest_framework import serializers, viewsets, mixins, status, views
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from core.authentication import CachedTokenAuthentication
+from recipe import fastpath, importer
+from recipe.caching import CachedResponseMixin, cache_stats
+from recipe.export import (
+    WRITERS,
+    CSVRenderer,
+    NDJSONRenderer,
+    export_recipes,
+)
+from recipe.filters import (
+    MATCH_ALL,
+    MATCH_ANY,
+    annotate_recipe_count,
+    filter_assigned,
+    filter_by_related,
+)
+from recipe.images import enqueue as enqueue_image
+from recipe.pagination import (
+    NameCursorPagination,
+    RecipeCursorPagination,
+    RecipePageNumberPagination,
+)
+from recipe.search import search_recipes
+from recipe.typeahead import limits, typeahead
+from recipe.uploads import RecipeImageUploadHandler
 from recipe.serializers import (
     RecipeSerializer,
     RecipeDetailSerializer,
     TagsSerializer,
+    TagsCountSerializer,
     IngradientSerializer,
-    RecipeImageSerializer
+    IngradientCountSerializer,
+    RecipeImageSerializer,
+    RecipeImportSerializer,
+    RecipeImportUploadSerializer,
+)
+from core.models import (
+    ImageStatus,
+    ImportStatus,
+    Ingradient,
+    Recipe,
+    RecipeImport,
+    Tags,
 )
-from core.models import Recipe, Tags, Ingradient
+
+
+def _bulk_error(errors, code=status.HTTP_400_BAD_REQUEST):
+    """Return a bulk operation result for a failed item."""
+    return {'status': code, 'errors': errors}
+
+
+FIELD_SELECTION_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description='Comma separated list of the fields to return',
+    ),
+    OpenApiParameter(
+        'expand',
+        OpenApiTypes.STR,
+        description='Comma separated list of the nested relations to '
+                    'return as objects, the others are returned as IDs. '
+                    'All are expanded when not sent',
+    ),
+]
+
+
+class FieldSelectionViewMixin:
+    """Pass the fields and expand params of reads to the serializer."""
+    field_selection_actions = ('list', 'retrieve', 'search')
+
+    def get_field_selection(self):
+        """Return the fields and expand serializer kwargs of the request."""
+        if self.action not in self.field_selection_actions:
+            return {}
+        selection = {}
+        for param in ('fields', 'expand'):
+            value = self.request.query_params.get(param)
+            if value is None:
+                continue
+            names = [name.strip() for name in value.split(',')]
+            selection[param] = [name for name in names if name]
+        if not selection.get('fields', True):
+            # An empty fields param selects the default fields.
+            del selection['fields']
+        return selection
+
+    def get_serializer(self, *args, **kwargs):
+        return super().get_serializer(
+            *args, **self.get_field_selection(), **kwargs)
 
 
 @extend_schema_view(
@@ -36,34 +124,112 @@ from core.models import Recipe, Tags, Ingradient
                 description='Coma separated\
                     listof IDs ingredients to filter recipes',
             ),
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR, enum=['any', 'all'],
+                description='Return recipes having any (default)\
+                    or all of the given tags and ingredients',
+            ),
+            *FIELD_SELECTION_PARAMETERS,
         ]
-    )
+    ),
+    retrieve=extend_schema(parameters=FIELD_SELECTION_PARAMETERS),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(FieldSelectionViewMixin, CachedResponseMixin,
+                    viewsets.ModelViewSet):
     """View for Reciape APIs."""
     serializer_class = RecipeDetailSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeCursorPagination
+    prefetch_actions = ('list', 'retrieve', 'bulk', 'search')
+    bulk_max_items = 1000
 
     def _params_to_ints(self, qs):
-        return [int(string) for string in qs.split(',')]
+        try:
+            return [int(string) for string in qs.split(',')]
+        except ValueError:
+            raise serializers.ValidationError(
+                {'detail': 'Expected a comma separated list of IDs.'})
+
+    def _get_prefetches(self, serializer):
+        """Return prefetches for the relations the serializer renders."""
+        if self.action not in self.prefetch_actions:
+            return []
+        prefetches = []
+        for field in serializer.fields.values():
+            if isinstance(field, serializers.ListSerializer):
+                child = field.child
+                queryset = child.Meta.model.objects.only(*child.Meta.fields)
+            elif isinstance(field, serializers.ManyRelatedField):
+                # Relations that are not expanded only need their ids.
+                model = Recipe._meta.get_field(field.source).related_model
+                queryset = model.objects.only('id')
+            else:
+                continue
+            prefetches.append(
+                Prefetch(field.source, queryset=queryset.order_by('id')))
+        return prefetches
+
+    def _get_columns(self, serializer):
+        """Return the recipe columns the serializer renders."""
+        columns = {'id'}
+        for field in serializer.fields.values():
+            try:
+                model_field = Recipe._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                continue
+            if model_field.concrete and not model_field.many_to_many:
+                columns.add(model_field.name)
+        return sorted(columns)
 
     def get_queryset(self):
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
+        match = self.request.query_params.get('match', MATCH_ANY)
+        if match not in (MATCH_ANY, MATCH_ALL):
+            raise serializers.ValidationError(
+                {'match': f'Expected {MATCH_ANY} or {MATCH_ALL}.'})
         queryset = self.queryset
         if tags:
             tags_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tags_ids)
+            queryset = filter_by_related(queryset, 'tags', tags_ids, match)
         if ingredients:
             ingredients_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingradient__id__in=ingredients_ids)
-        return queryset.filter(user=self.request.user).order_by(
-            '-id').distinct()
+            queryset = filter_by_related(
+                queryset, 'ingradient', ingredients_ids, match)
+        queryset = queryset.filter(user=self.request.user).order_by('-id')
+        serializer = self.get_serializer_class()(
+            **self.get_field_selection())
+        if self.action in self.field_selection_actions:
+            # Leave out the columns of fields the response does not show.
+            queryset = queryset.only(*self._get_columns(serializer))
+        return queryset.prefetch_related(*self._get_prefetches(serializer))
+
+    def _fast_list(self, request, *args, **kwargs):
+        """List from .values() rows, rendered by a compiled reader."""
+        reader = fastpath.compile_reader(self.get_serializer())
+        if reader is None:
+            return mixins.ListModelMixin.list(self, request, *args, **kwargs)
+        rows = reader.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(reader.render(page))
+        return Response(reader.render(rows))
+
+    def list(self, request, *args, **kwargs):
+        if not fastpath.enabled():
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(
+            self._fast_list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
 
     def get_serializer_class(self):
-        if self.action == 'list':
+        if self.action in ('list', 'search'):
             return RecipeSerializer
         elif self.action == 'upload_image':
             return RecipeImageSerializer
@@ -74,12 +240,189 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
-        """Upload an image to a recipe"""
+        """Upload an image to a recipe, processed in the background"""
         recipe = self.get_object()
+        request.upload_handlers = [RecipeImageUploadHandler(request)]
         serializer = self.get_serializer(recipe, data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        with transaction.atomic():
+            serializer.save(
+                image_status=ImageStatus.PENDING, image_variants={})
+            enqueue_image(serializer.instance)
+        serializer.instance.refresh_from_db(
+            fields=['image', 'image_status', 'image_variants'])
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    def _search(self, request):
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            raise serializers.ValidationError({'q': 'This field is required.'})
+        queryset = search_recipes(self.get_queryset(), text)
+        paginator = RecipePageNumberPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @extend_schema(parameters=[
+        OpenApiParameter(
+            'q', OpenApiTypes.STR, required=True,
+            description='Words to find in titles, descriptions,\
+                tags and ingredients',
+        ),
+    ])
+    @action(methods=['GET'], detail=False, url_path='search')
+    def search(self, request):
+        """Search recipes and return them ranked by relevance."""
+        return self.cached_response(self._search, request)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'format',
+                OpenApiTypes.STR, enum=[*WRITERS],
+                description='Export format, ndjson (default) or csv, also '
+                            'chosen with the Accept header',
+            ),
+        ],
+        responses={(200, 'application/x-ndjson'): OpenApiTypes.STR,
+                   (200, 'text/csv'): OpenApiTypes.STR},
+    )
+    @action(methods=['GET'], detail=False, url_path='export',
+            renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request, format=None):
+        """Stream every recipe of the user, filtered like the list."""
+        export_format = request.accepted_renderer.format
+        queryset = self.get_queryset().order_by('id')
+        response = StreamingHttpResponse(
+            export_recipes(queryset, export_format),
+            content_type=request.accepted_renderer.media_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="recipes.{export_format}"')
+        return response
+
+    @extend_schema(
+        request=RecipeImportUploadSerializer,
+        responses=RecipeImportSerializer,
+    )
+    @action(methods=['POST'], detail=False, url_path='import',
+            parser_classes=[MultiPartParser])
+    def import_recipes(self, request):
+        """Import a file of recipes in the shape of the export.
+
+        An upload sent again with the checkpoint of an interrupted import
+        resumes after its last batch, and is refused while the import is
+        still running.
+        """
+        serializer = RecipeImportUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data['file']
+        import_format = serializer.validated_data.get('format') or (
+            'csv' if upload.name.lower().endswith('.csv') else 'ndjson')
+        key = serializer.validated_data.get('checkpoint') or str(uuid.uuid4())
+        job, _ = RecipeImport.objects.get_or_create(
+            user=request.user, key=key)
+        if job.status != ImportStatus.DONE:
+            try:
+                job = importer.import_recipes(job, upload, import_format)
+            except importer.ImportRunning as exc:
+                return Response(
+                    {'detail': str(exc), 'checkpoint': job.key},
+                    status=status.HTTP_409_CONFLICT)
+            except ValueError as exc:
+                return Response(
+                    {'detail': f'Import stopped after record '
+                               f'{job.position}: {exc}',
+                     'checkpoint': job.key},
+                    status=status.HTTP_400_BAD_REQUEST)
+        return Response(RecipeImportSerializer(job).data)
+
+    def _validate_bulk_item(self, item, instances):
+        """Validate one bulk operation and return (op, data, error)."""
+        if not isinstance(item, dict):
+            return None, None, _bulk_error({'detail': 'Expected an object.'})
+        op = item.get('op', 'create')
+        if op not in ('create', 'update', 'delete'):
+            return op, None, _bulk_error({'op': f'Unknown operation {op}.'})
+        instance = None
+        if op != 'create':
+            instance = instances.pop(item.get('id'), None)
+            if instance is None:
+                return op, None, _bulk_error(
+                    {'id': 'Recipe not found or used more than once.'},
+                    status.HTTP_404_NOT_FOUND)
+        if op == 'delete':
+            return op, instance, None
+
+        serializer = self.get_serializer(
+            instance, data=item, partial=instance is not None)
+        if not serializer.is_valid():
+            return op, None, _bulk_error(serializer.errors)
+        return op, (instance, serializer.validated_data), None
+
+    @action(methods=['POST'], detail=False, url_path='bulk')
+    def bulk(self, request):
+        """Create, update and delete many recipes in one transaction."""
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {'detail': 'Expected a list of operations.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.bulk_max_items:
+            return Response(
+                {'detail': f'At most {self.bulk_max_items} operations.'},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        ids = [
+            item.get('id') for item in items
+            if isinstance(item, dict) and isinstance(item.get('id'), int)
+        ]
+        instances = Recipe.objects.filter(user=request.user).in_bulk(ids)
+        results = [None] * len(items)
+        operations = {'create': [], 'update': [], 'delete': []}
+        for index, item in enumerate(items):
+            op, data, error = self._validate_bulk_item(item, instances)
+            if error is not None:
+                results[index] = error
+            else:
+                operations[op].append((index, data))
+
+        list_serializer = self.get_serializer(many=True)
+        with transaction.atomic():
+            deleted = [recipe.id for _, recipe in operations['delete']]
+            if deleted:
+                Recipe.objects.filter(id__in=deleted).delete()
+            created = list_serializer.create([
+                {**data, 'user': request.user}
+                for _, (_, data) in operations['create']
+            ])
+            updated = list_serializer.update(
+                [instance for _, (instance, _) in operations['update']],
+                [data for _, (_, data) in operations['update']],
+            )
+
+        # Not get_queryset(), the list filters of the query string must
+        # not hide rows that were written.
+        saved = Recipe.objects.filter(
+            user=request.user,
+            id__in=[recipe.id for recipe in created + updated],
+        ).prefetch_related(
+            *self._get_prefetches(list_serializer.child)).in_bulk()
+        for (index, _), recipe in zip(operations['create'], created):
+            results[index] = {
+                'status': status.HTTP_201_CREATED,
+                'data': self.get_serializer(saved[recipe.id]).data,
+            }
+        for (index, _), recipe in zip(operations['update'], updated):
+            results[index] = {
+                'status': status.HTTP_200_OK,
+                'data': self.get_serializer(saved[recipe.id]).data,
+            }
+        for index, recipe in operations['delete']:
+            results[index] = {
+                'status': status.HTTP_204_NO_CONTENT,
+                'id': recipe.id,
+            }
+        return Response(results, status=status.HTTP_200_OK)
 
 
 @extend_schema_view(
@@ -89,36 +432,137 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 'assigned_only',
                 OpenApiTypes.INT, enum=[0, 1],
                 description='Return only recipes assigned to user',
-            )
+            ),
+            OpenApiParameter(
+                'with_counts',
+                OpenApiTypes.INT, enum=[0, 1],
+                description='Add the number of recipes using each item',
+            ),
+            OpenApiParameter(
+                'prefix',
+                OpenApiTypes.STR,
+                description='Return at most limit items whose name starts '
+                            'with prefix, unpaginated',
+            ),
+            OpenApiParameter(
+                'q',
+                OpenApiTypes.STR,
+                description='Return at most limit items with names similar '
+                            'to q, best match first, unpaginated',
+            ),
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description='Number of prefix or q matches to return',
+            ),
+            FIELD_SELECTION_PARAMETERS[0],
         ]
     )
 )
-class BaseRecipeAttrViewSet(mixins.ListModelMixin,
+class BaseRecipeAttrViewSet(FieldSelectionViewMixin,
+                            CachedResponseMixin,
+                            mixins.ListModelMixin,
                             mixins.UpdateModelMixin,
                             mixins.DestroyModelMixin,
                             viewsets.GenericViewSet):
     """View for BaseRecipeAttr APIs."""
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = NameCursorPagination
+
+    def _flag(self, name):
+        try:
+            return bool(int(self.request.query_params.get(name, 0)))
+        except ValueError:
+            raise serializers.ValidationError({name: 'Expected 0 or 1.'})
+
+    def _typeahead_params(self):
+        """Return the prefix and q of a typeahead list, None otherwise."""
+        if self.action != 'list':
+            return None
+        prefix = self.request.query_params.get('prefix')
+        text = self.request.query_params.get('q')
+        if prefix is None and text is None:
+            return None
+        if prefix is not None and text is not None:
+            raise serializers.ValidationError(
+                {'q': 'Use either prefix or q, not both.'})
+        return prefix, text
+
+    def _limit(self):
+        default, maximum = limits()
+        try:
+            limit = int(self.request.query_params.get('limit', default))
+        except ValueError:
+            raise serializers.ValidationError({'limit': 'Expected a number.'})
+        if not 1 <= limit <= maximum:
+            raise serializers.ValidationError(
+                {'limit': f'Expected a number from 1 to {maximum}.'})
+        return limit
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        params = self._typeahead_params()
+        if params is None:
+            return queryset
+        prefix, text = (value and value.strip() for value in params)
+        limit = self._limit()
+        if not (prefix or text):
+            return []
+        return typeahead(
+            queryset, self.request.user.pk, limit, prefix=prefix, text=text)
+
+    def paginate_queryset(self, queryset):
+        if self._typeahead_params() is not None:
+            return None
+        return super().paginate_queryset(queryset)
 
     def get_queryset(self):
-        assigned_only = bool(
-            int(self.request.query_params.get('assigned_only', 0)))
         queryset = self.queryset
-        if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+        if self._flag('with_counts'):
+            queryset = annotate_recipe_count(queryset)
+            if self._flag('assigned_only'):
+                queryset = queryset.filter(recipe_count__gt=0)
+        elif self._flag('assigned_only'):
+            queryset = filter_assigned(queryset, self.recipe_field)
         return queryset.filter(
             user=self.request.user
-            ).order_by('-name').distinct()
+            ).order_by('-name')
+
+    def get_serializer_class(self):
+        if self.action == 'list' and self._flag('with_counts'):
+            return self.count_serializer_class
+        return self.serializer_class
+
+    def perform_update(self, serializer):
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {'name': 'You already have an item with this name.'})
 
 
 class TagsViewSet(BaseRecipeAttrViewSet):
     """"Views for Tags API."""
     serializer_class = TagsSerializer
+    count_serializer_class = TagsCountSerializer
     queryset = Tags.objects.all()
+    recipe_field = 'tags'
 
 
 class IngradientViewSet(BaseRecipeAttrViewSet):
     """View for Ingradient APIs."""
     serializer_class = IngradientSerializer
+    count_serializer_class = IngradientCountSerializer
     queryset = Ingradient.objects.all()
+    recipe_field = 'ingradient'
+
+
+class CacheStatsView(views.APIView):
+    """View for response cache counters."""
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats())
@@ -1,5 +1,8 @@
 """Tests for user API"""
-from django.test import TestCase
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
@@ -10,6 +13,7 @@ from rest_framework import status
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
+IP_RATES = {'login_ip': '2/min', 'login_email': '100/min'}
 
 
 def create_user(**params):
@@ -22,6 +26,9 @@ class PublicUserAPITests(TestCase):
 
     def setUp(self):
         self.client = APIClient()
+        # Throttle counts live in the cache.
+        cache.clear()
+        self.addCleanup(cache.clear)
 
     def test_create_user_success(self):
         """"Test creating user is successfull"""
@@ -128,6 +135,77 @@ class PublicUserAPITests(TestCase):
         self.assertNotIn('token', res.data)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    @override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '100/min', 'login_email': '2/min'}})
+    def test_create_token_throttled_per_email(self):
+        """Test bursts for one email are rejected before hashing."""
+        create_user(email='test@example.com', password='test123')
+        payload = {'email': 'test@example.com', 'password': 'wrong'}
+        for _ in range(2):
+            self.client.post(TOKEN_URL, payload)
+
+        with patch('user.serializers.authenticate',
+                   return_value=None) as authenticate:
+            res = self.client.post(
+                TOKEN_URL, {**payload, 'email': 'TEST@example.com'})
+            other = self.client.post(
+                TOKEN_URL, {'email': 'other@example.com', 'password': 'x'})
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', res)
+        self.assertEqual(other.status_code, status.HTTP_400_BAD_REQUEST)
+        authenticate.assert_called_once()
+
+    @override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '2/min', 'login_email': '100/min'}})
+    def test_create_token_throttled_per_ip(self):
+        """Test bursts from one address are rejected across emails."""
+        for i in range(2):
+            self.client.post(
+                TOKEN_URL, {'email': f'user{i}@example.com', 'password': 'x'})
+
+        res = self.client.post(
+            TOKEN_URL, {'email': 'user2@example.com', 'password': 'x'})
+        other = self.client.post(
+            TOKEN_URL, {'email': 'user2@example.com', 'password': 'x'},
+            REMOTE_ADDR='10.0.0.2')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(other.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(REST_FRAMEWORK={
+        'NUM_PROXIES': 0, 'DEFAULT_THROTTLE_RATES': IP_RATES})
+    def test_ip_throttle_ignores_spoofed_forwarded_for(self):
+        """Test a new X-Forwarded-For per request does not reset the count."""
+        responses = [
+            self.client.post(
+                TOKEN_URL, {'email': f'user{i}@example.com', 'password': 'x'},
+                HTTP_X_FORWARDED_FOR=f'203.0.113.{i}')
+            for i in range(3)
+        ]
+
+        self.assertEqual(responses[-1].status_code,
+                         status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(REST_FRAMEWORK={
+        'NUM_PROXIES': 1, 'DEFAULT_THROTTLE_RATES': IP_RATES})
+    def test_ip_throttle_behind_proxy(self):
+        """Test behind a proxy the address it appended is counted."""
+        for i in range(2):
+            self.client.post(
+                TOKEN_URL, {'email': f'user{i}@example.com', 'password': 'x'},
+                HTTP_X_FORWARDED_FOR=f'203.0.113.{i}, 198.51.100.7')
+
+        res = self.client.post(
+            TOKEN_URL, {'email': 'user2@example.com', 'password': 'x'},
+            HTTP_X_FORWARDED_FOR='198.51.100.7')
+        other = self.client.post(
+            TOKEN_URL, {'email': 'user2@example.com', 'password': 'x'},
+            HTTP_X_FORWARDED_FOR='198.51.100.8')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(other.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_retrive_user_unauthorized(self):
         """Test authentication is required for user."""
         res = self.client.get(ME_URL)
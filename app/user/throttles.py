@@ -0,0 +1,47 @@
+"""Rate limits of the user API."""
+
+import hashlib
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class LoginThrottle(SimpleRateThrottle):
+    """Base of the token request limits.
+
+    Throttles run before the view validates the credentials, so rejected
+    requests cost a cache lookup instead of a password hash.
+    """
+
+    def get_rate(self):
+        # Read per request, not at import, so settings can be overridden.
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+
+class LoginIPThrottle(LoginThrottle):
+    """Limit token requests per client address.
+
+    The address is the one REST_FRAMEWORK['NUM_PROXIES'] tells apart
+    from what clients put in X-Forwarded-For.
+    """
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_ident(request),
+        }
+
+
+class LoginEmailThrottle(LoginThrottle):
+    """Limit token requests per email, whichever address they come from."""
+    scope = 'login_email'
+
+    def get_cache_key(self, request, view):
+        data = request.data
+        email = data.get('email') if hasattr(data, 'get') else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        # Hashed to keep cache keys short and free of client characters.
+        ident = hashlib.sha256(email.strip().lower().encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
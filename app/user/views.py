@@ -1,9 +1,11 @@
 """Views for User API"""
 
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 
+from core.authentication import CachedTokenAuthentication
+from user.throttles import LoginEmailThrottle, LoginIPThrottle
 from user.serializers import (
     UserSerializer,
     AuthtokenSerializer,
@@ -19,12 +21,14 @@ class CreateTokenView(ObtainAuthToken):
     """Create auth token view."""
     serializer_class = AuthtokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES
+    throttle_classes = [LoginIPThrottle, LoginEmailThrottle]
 
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage authenticated user."""
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):